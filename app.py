@@ -1,10 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, session, make_response, send_file
-from flask_socketio import SocketIO, emit
-from database import get_db, run_migrations
+from flask import Flask, render_template, request, redirect, url_for, session, make_response, send_file, Response
+from flask_socketio import SocketIO, emit, join_room, rooms
+from database import (get_db, run_migrations, pool_stats, maintain_db, natural_sort_key,
+                      RESERVATION_POINT_SECONDS, RESERVATION_UNTIL_SQL, FOB_LOOKUP_SQL, SHOWN_RESERVATION_SQL,
+                      RESERVATION_CONFLICTS_SQL, HISTORY_PAGE_SQL, HISTORY_AFTER_SQL,
+                      HISTORY_AFTER_UNDATED_SQL)
+from status_model import StatusModel
+from broadcaster import BroadcastScheduler
+from expiry import DueTimer
+from fragment_cache import FragmentCache
+from compression import CompressionStats, gzip_bytes, deflate_bytes, gzip_chunks
+from temporal import (LOCAL_TZ, local_now, localize, local_day_start_ts, parse_timestamp, format_local, format_rows,
+                      render_local, cache_stats as time_cache_stats)
+from markupsafe import Markup
 from datetime import datetime, timedelta
-import pytz
+import csv
 import hashlib
+import json
 import os
+import threading
 from functools import wraps
 
 # Kiosk authentication (HTTP Basic Auth)
@@ -35,9 +48,8 @@ def get_authenticated_user():
 
 def is_admin_user(username):
     """Check if user is authorized for admin access"""
-    conn = get_db()
-    admin = conn.execute('SELECT * FROM admin_users WHERE LOWER(username) = LOWER(?)', (username,)).fetchone()
-    conn.close()
+    with get_db() as conn:
+        admin = conn.execute('SELECT * FROM admin_users WHERE LOWER(username) = LOWER(?)', (username,)).fetchone()
     return admin is not None
 
 
@@ -45,391 +57,288 @@ app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
 CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*')
-socketio = SocketIO(app, cors_allowed_origins=CORS_ORIGINS)
+
+# JSON responses, CSV exports and Socket.IO boards at least this big are compressed
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+compression_stats = CompressionStats()
+
+# Engine.IO gzips long-polling responses itself; websocket frames are handled in status_frame()
+socketio = SocketIO(app, cors_allowed_origins=CORS_ORIGINS,
+                    http_compression=True, compression_threshold=COMPRESS_MIN_BYTES)
+
+# Dashboard status served from memory; mutations refresh only the fobs they touch
+status_model = StatusModel(get_db)
+
+# Rendered dashboard cards per category, reused until the category changes
+card_cache = FragmentCache()
+
+# Keeps ETags from this run's in-memory counters distinct from a previous run's
+ETAG_PREFIX = os.urandom(4).hex()
+
+def etag_for(*parts):
+    """Strong ETag from version counters and stamps (datetimes as epoch seconds)"""
+    return '-'.join([ETAG_PREFIX] + [str(int(p.timestamp())) if isinstance(p, datetime) else str(p)
+                                     for p in parts])
+
+def conditional_response(etag, build):
+    """Serve build() with a strong ETag, or an empty 304 if the client already has that version.
+
+    Cache-Control: no-cache makes browsers revalidate every time instead of
+    reusing their copy unchecked.
+    """
+    # compress_json() tags gzipped bodies with a -gzip ETag; either copy is current
+    for current in (etag, etag + '-gzip'):
+        if request.if_none_match.contains(current):
+            response = make_response('', 304)
+            response.set_etag(current)
+            break
+    else:
+        response = make_response(build())
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.after_request
+def compress_json(response):
+    """Gzip JSON responses of at least COMPRESS_MIN_BYTES for clients that accept it"""
+    if response.mimetype != 'application/json' or response.status_code != 200 \
+            or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        compression_stats.record('json', len(data), len(data))
+        return response
+    body = gzip_bytes(data, COMPRESS_LEVEL)
+    compression_stats.record('json', len(data), len(body))
+    response.set_data(body)
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag + '-gzip', weak)
+    return response
+
+# Broadcasts requested within this window are coalesced into one emit
+BROADCAST_WINDOW_MS = int(os.environ.get('BROADCAST_WINDOW_MS', '150'))
+
+# Rows fetched and written per chunk by the streaming CSV exports
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '500'))
 
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', '')  # Empty = disable password login
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def compact_database():
-    """Compact the SQLite database to reclaim space"""
-    conn = get_db()
-    conn.execute('VACUUM')
-    conn.close()
-    print("Database compacted successfully")
-
-
 @app.route('/')
 def index():
     """Main page showing all key fobs and their status"""
-    conn = get_db()
-    
-    # Get all active key fobs with their current checkout status
-    query = '''
-        SELECT 
-            kf.id,
-            kf.fob_id,
-            kf.vehicle_name,
-            kf.category,
-            kf.location,
-            kf.is_available,
-            u.first_name,
-            u.last_name,
-            c.checked_out_at,
-            c.id as checkout_id
-        FROM key_fobs kf
-        LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
-        LEFT JOIN users u ON c.user_id = u.id
-        WHERE kf.is_active = 1
-        ORDER BY kf.category, kf.vehicle_name
-    '''
-    
-    all_keys = conn.execute(query).fetchall()
+    # Pure read: expired notes are hidden by the status model and deleted by note_sweeper
+    # Tabs follow the fob_categories registry, so a new category needs no template change
+    categories = [{'name': category, 'payload_key': payload_key,
+                   'cards': card_cache.get(category, status_model.category_stamp(category),
+                                           lambda category=category: render_category_cards(category))}
+                  for category, payload_key in status_model.categories()]
+    return render_template('index.html', categories=categories, okta_mode=bool(OKTA_HEADER))
+
+def render_category_cards(category):
+    """(stamp, cards HTML) for one dashboard category"""
+    stamp, rows = status_model.category_rows(category)
+    return stamp, Markup(render_template('fob_cards.html', keys=rows))
 
-    # Get active reservations (moved up to get chicago_tz)
-    chicago_tz = pytz.timezone('America/Chicago')
-    now = datetime.now(chicago_tz)
-    
-    # Get notes and delete expired ones
-    all_notes = conn.execute("SELECT * FROM notes").fetchall()
-    notes = []
-    expired_note_ids = []
-    
-    for note in all_notes:
-        if note['expires_at']:
-            try:
-                expires = datetime.fromisoformat(note['expires_at'])
-                if expires > now:
-                    notes.append(note)
-                else:
-                    expired_note_ids.append(note['id'])
-            except:
-                notes.append(note)
-        else:
-            notes.append(note)
-    
-    # Delete expired notes from database
-    if expired_note_ids:
-        placeholders = ','.join('?' * len(expired_note_ids))
-        conn.execute(f'DELETE FROM notes WHERE id IN ({placeholders})', expired_note_ids)
-        conn.commit()
-    
-    # Create note map
-    note_map = {}
-    for note in notes:
-        note_map[note['fob_id']] = note
-
-    reservations_query = '''
-        SELECT r.*, u.first_name, u.last_name, kf.id as fob_table_id
-        FROM reservations r
-        LEFT JOIN users u ON r.user_id = u.id
-        JOIN key_fobs kf ON r.fob_id = kf.id
-        WHERE (
-              datetime(r.reserved_datetime) > datetime(?)
-              OR (r.end_datetime IS NOT NULL AND datetime(r.end_datetime) > datetime(?))
-          )
-          AND (
-              r.display_hours_before = 0
-              OR datetime(r.reserved_datetime, '-' || r.display_hours_before || ' hours') <= datetime(?)
-          )
-    '''
-    reservations = conn.execute(reservations_query, (now.isoformat(), now.isoformat(), now.isoformat())).fetchall()
-
-
-    
-    # Format reservation datetimes
-    formatted_reservations = []
-    for res in reservations:
-        res_dict = dict(res)
-        if res_dict['reserved_datetime']:
-            try:
-                dt = datetime.fromisoformat(res_dict['reserved_datetime'])
-                if dt.tzinfo is not None:
-                    dt = dt.astimezone(chicago_tz)
-                res_dict['reserved_datetime'] = dt.strftime('%a, %b %d at %I:%M %p')  # "Fri, Feb 21 at 2:00 PM"
-            except:
-                pass
-        formatted_reservations.append(res_dict)
-
-    # Create a dict of fob_id -> reservation
-    reservation_map = {}
-    for res in reservations:
-        if res['fob_table_id'] not in reservation_map:
-            reservation_map[res['fob_table_id']] = res
-    conn.close()
-    
-    # Format timestamps and group by category
-    chicago_tz = pytz.timezone('America/Chicago')
-    formatted_keys = []
-    
-    for key in all_keys:
-        key_dict = dict(key)
-        if key_dict['checked_out_at']:
-            # Parse the timestamp and convert to Chicago time
-            dt = datetime.fromisoformat(key_dict['checked_out_at'])
-            if dt.tzinfo is None:
-                dt = pytz.UTC.localize(dt)
-            dt_chicago = dt.astimezone(chicago_tz)
-            # Format: Feb 15, 2026 14:33
-            key_dict['checked_out_at'] = dt_chicago.strftime('%b %d, %Y %H:%M')
-            # Add note info
-        if key_dict['id'] in note_map:
-            note = note_map[key_dict['id']]
-            key_dict['note'] = dict(note)
-        else:
-            key_dict['note'] = None
-
-        # Add reservation info
-        if key_dict['id'] in reservation_map:
-            res = reservation_map[key_dict['id']]
-            res_dict = dict(res)
-            # Format reservation datetime to match checkout time format
-            if res_dict.get('reserved_datetime'):
-                try:
-                    dt = datetime.fromisoformat(res_dict['reserved_datetime'])
-                    if dt.tzinfo is not None:
-                        dt = dt.astimezone(chicago_tz)
-                    res_dict['reserved_datetime'] = dt.strftime('%b %d, %Y %H:%M')
-                except:
-                    pass
-            if res_dict.get('end_datetime'):
-                try:
-                    dt = datetime.fromisoformat(res_dict['end_datetime'])
-                    if dt.tzinfo is not None:
-                        dt = dt.astimezone(chicago_tz)
-                    res_dict['end_datetime'] = dt.strftime('%b %d, %Y %H:%M')
-                except:
-                    pass
-            key_dict['reservation'] = res_dict
-        else:
-            key_dict['reservation'] = None
-
-        formatted_keys.append(key_dict)
-    
-     # Group by category with natural sorting
-    import re
-    
-    def natural_sort_key(item):
-        """Sort key that handles numbers naturally"""
-        return [int(text) if text.isdigit() else text.lower() 
-                for text in re.split('([0-9]+)', item['vehicle_name'])]
-    
-    # Group by category with natural sorting
-    squad_cars = sorted([k for k in formatted_keys if k['category'] == 'Squad Cars'], 
-                       key=natural_sort_key)
-    specialized_vehicles = sorted([k for k in formatted_keys if k['category'] == 'Specialized Services Vehicles'],
-                         key=natural_sort_key)
-    cid_vehicles = sorted([k for k in formatted_keys if k['category'] == 'CID Vehicles'], 
-                         key=natural_sort_key)
-    other_vehicles = sorted([k for k in formatted_keys if k['category'] == 'Other Vehicles'], 
-                       key=natural_sort_key)
-    pool_cars = sorted([k for k in formatted_keys if k['category'] == 'Pool Cars'], 
-                       key=natural_sort_key)
-    admin_cars = sorted([k for k in formatted_keys if k['category'] == 'Admin Cars'], 
-                       key=natural_sort_key)
-    # Equipment and Key Rings: Sort by checked-out status first, then alphabetically
-    def status_then_name_sort(item):
-        # Return tuple: (0 if checked out, 1 if available), then natural sort key
-        sort_priority = 0 if item.get('checkout_id') else 1
-        name_parts = [int(text) if text.isdigit() else text.lower() 
-                     for text in re.split('([0-9]+)', item['vehicle_name'])]
-        return (sort_priority, name_parts)
-    
-    equipment = sorted([k for k in formatted_keys if k['category'] == 'Equipment'], 
-                      key=status_then_name_sort)
-    key_rings = sorted([k for k in formatted_keys if k['category'] == 'Key Rings'], 
-                       key=status_then_name_sort)
-
-    
-    return render_template('index.html',
-                      squad_cars=squad_cars,
-                      specialized_vehicles=specialized_vehicles,
-                      cid_vehicles=cid_vehicles,
-                      other_vehicles=other_vehicles,
-                      pool_cars=pool_cars,
-                      admin_cars=admin_cars,
-                      equipment=equipment,
-                      key_rings=key_rings,
-                      okta_mode=bool(OKTA_HEADER))
 def get_current_status():
     """Get current equipment status - shared logic for API and WebSocket broadcasts"""
-    conn = get_db()
-    
-    # Get all active key fobs with their current checkout status
-    query = '''
-        SELECT 
-            kf.id,
-            kf.fob_id,
-            kf.vehicle_name,
-            kf.category,
-            kf.location,
-            kf.is_available,
-            u.first_name,
-            u.last_name,
-            c.checked_out_at,
-            c.id as checkout_id
-        FROM key_fobs kf
-        LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
-        LEFT JOIN users u ON c.user_id = u.id
-        WHERE kf.is_active = 1
-        ORDER BY kf.category, kf.vehicle_name
-    '''
-    
-    all_keys = conn.execute(query).fetchall()
-    
-    chicago_tz = pytz.timezone('America/Chicago')
-    now = datetime.now(chicago_tz)
-    
-    # Get notes and filter expired ones
-    all_notes = conn.execute("SELECT * FROM notes").fetchall()
-    notes = []
-    for note in all_notes:
-        if note['expires_at']:
-            try:
-                expires = datetime.fromisoformat(note['expires_at'])
-                if expires > now:
-                    notes.append(note)
-            except:
-                notes.append(note)
-        else:
-            notes.append(note)
-    
-    # Create note map
-    note_map = {}
-    for note in notes:
-        note_map[note['fob_id']] = note
-
-    # Get active reservations
-    reservations_query = '''
-        SELECT r.*, u.first_name, u.last_name, kf.id as fob_table_id
-        FROM reservations r
-        LEFT JOIN users u ON r.user_id = u.id
-        JOIN key_fobs kf ON r.fob_id = kf.id
-        WHERE (
-              datetime(r.reserved_datetime) > datetime(?)
-              OR (r.end_datetime IS NOT NULL AND datetime(r.end_datetime) > datetime(?))
-          )
-          AND (
-              r.display_hours_before = 0
-              OR datetime(r.reserved_datetime, '-' || r.display_hours_before || ' hours') <= datetime(?)
-          )
-        ORDER BY r.reserved_datetime ASC
-    '''
-    reservations = conn.execute(reservations_query, (now.isoformat(), now.isoformat(), now.isoformat())).fetchall()
-    
-    # Format reservation datetimes
-    formatted_reservations = []
-    for res in reservations:
-        res_dict = dict(res)
-        if res_dict['reserved_datetime']:
-            try:
-                dt = datetime.fromisoformat(res_dict['reserved_datetime'])
-                if dt.tzinfo is not None:
-                    dt = dt.astimezone(chicago_tz)
-                res_dict['reserved_datetime'] = dt.strftime('%a, %b %d at %I:%M %p')
-            except:
-                pass
-        formatted_reservations.append(res_dict)
-
-    # Create a dict of fob_id -> reservation
-    reservation_map = {}
-    for res in reservations:
-        if res['fob_table_id'] not in reservation_map:
-            reservation_map[res['fob_table_id']] = res
-    conn.close()
-    
-    # Format timestamps
-    formatted_keys = []
-    
-    for key in all_keys:
-        key_dict = dict(key)
-        if key_dict['checked_out_at']:
-            dt = datetime.fromisoformat(key_dict['checked_out_at'])
-            if dt.tzinfo is None:
-                dt = pytz.UTC.localize(dt)
-            dt_chicago = dt.astimezone(chicago_tz)
-            key_dict['checked_out_at'] = dt_chicago.strftime('%b %d, %Y %H:%M')
-        # Add reservation info
-        if key_dict['id'] in reservation_map:
-            res = reservation_map[key_dict['id']]
-            res_dict = dict(res)
-            # Format reservation datetime to match checkout time format
-            if res_dict.get('reserved_datetime'):
-                try:
-                    dt = datetime.fromisoformat(res_dict['reserved_datetime'])
-                    if dt.tzinfo is not None:
-                        dt = dt.astimezone(chicago_tz)
-                    res_dict['reserved_datetime'] = dt.strftime('%b %d, %Y %H:%M')
-                except:
-                    pass
-            key_dict['reservation'] = res_dict
-        else:
-            key_dict['reservation'] = None
-        # Add note info
-        if key_dict['id'] in note_map:
-            note = note_map[key_dict['id']]
-            key_dict['note'] = dict(note)
-        else:
-            key_dict['note'] = None
-        formatted_keys.append(key_dict)
-    
-    # Natural sort and group by category
-    import re
-    
-    def natural_sort_key(item):
-        return [int(text) if text.isdigit() else text.lower() 
-                for text in re.split('([0-9]+)', item['vehicle_name'])]
-    
-    squad_cars = sorted([k for k in formatted_keys if k['category'] == 'Squad Cars'], 
-                       key=natural_sort_key)
-    specialized_vehicles = sorted([k for k in formatted_keys if k['category'] == 'Specialized Services Vehicles'],
-                         key=natural_sort_key)
-    cid_vehicles = sorted([k for k in formatted_keys if k['category'] == 'CID Vehicles'], 
-                         key=natural_sort_key)
-    other_vehicles = sorted([k for k in formatted_keys if k['category'] == 'Other Vehicles'], 
-                       key=natural_sort_key)
-    pool_cars = sorted([k for k in formatted_keys if k['category'] == 'Pool Cars'], 
-                       key=natural_sort_key)
-    admin_cars = sorted([k for k in formatted_keys if k['category'] == 'Admin Cars'], 
-                       key=natural_sort_key)
-    # Equipment and Key Rings: Sort by checked-out status first, then alphabetically
-    def status_then_name_sort(item):
-        # Return tuple: (0 if checked out, 1 if available), then natural sort key
-        sort_priority = 0 if item.get('checkout_id') else 1
-        name_parts = [int(text) if text.isdigit() else text.lower() 
-                     for text in re.split('([0-9]+)', item['vehicle_name'])]
-        return (sort_priority, name_parts)
-    
-    equipment = sorted([k for k in formatted_keys if k['category'] == 'Equipment'], 
-                      key=status_then_name_sort)
-    key_rings = sorted([k for k in formatted_keys if k['category'] == 'Key Rings'], 
-                       key=status_then_name_sort)
-    
-    return {
-        'squad_cars': squad_cars,
-        'specialized_vehicles': specialized_vehicles,
-        'cid_vehicles': cid_vehicles,
-        'other_vehicles': other_vehicles,
-        'pool_cars': pool_cars,
-        'admin_cars': admin_cars,
-        'equipment': equipment,
-        'key_rings': key_rings,
-        'active_reservations': formatted_reservations
-    }
+    return status_model.snapshot()
+
+def broadcast_status(*fob_ids):
+    """Apply changed fobs to the status model and schedule a push to dashboards"""
+    status_model.refresh_fobs(fob_ids)
+    broadcaster.request()
+
+def send_status_changes():
+    """Emit everything that changed since the last broadcast; returns True if anything was sent"""
+    delta = status_model.take_delta()
+    if delta is None:
+        # Model was reloaded - dashboards need the whole board
+        status = get_current_status()
+        socketio.emit('status_update', status, to='plain')
+        socketio.emit(*status_frame(status), to='deflate')
+        return True
+    if delta['fobs'] or delta['removed'] or delta['order']:
+        socketio.emit('fob_changed', delta, to=['plain', 'deflate'])
+        return True
+    return False
+
+broadcaster = BroadcastScheduler(send_status_changes, socketio.start_background_task, socketio.sleep,
+                                 window=BROADCAST_WINDOW_MS / 1000)
+
+def sweep_expired_notes():
+    """Delete notes whose expiry has passed; returns the next expiry (epoch seconds) or None.
+
+    Notes with an expiry but no UTC offset never expire, as on the dashboard.
+    """
+    now = local_now()
+    now_ts = int(now.timestamp())
+    expired = []
+    later = []  # due later within the current second
+    with get_db() as conn:
+        for note in conn.execute('SELECT id, fob_id, expires_at FROM notes WHERE expires_ts <= ?', (now_ts,)):
+            expires = parse_timestamp(note['expires_at'], naive='keep')
+            if expires is None or expires.tzinfo is None:
+                continue
+            if expires <= now:
+                expired.append(note)
+            else:
+                later.append(expires.timestamp())
+        if expired:
+            placeholders = ','.join('?' * len(expired))
+            conn.execute(f'DELETE FROM notes WHERE id IN ({placeholders})', [n['id'] for n in expired])
+        next_due = conn.execute('SELECT MIN(expires_ts) FROM notes WHERE expires_ts > ?', (now_ts,)).fetchone()[0]
+    if expired:
+        broadcast_status(*(n['fob_id'] for n in expired))
+    return min(later + ([next_due] if next_due is not None else []), default=None)
+
+note_sweeper = DueTimer(sweep_expired_notes, socketio.start_background_task, socketio.sleep,
+                        name='note expiry sweep')
+
+def advance_board_timeline():
+    """Push reservation windows opening, starting and ending (and notes expiring) as they happen"""
+    if status_model.advance():
+        broadcaster.request()
+    return status_model.next_transition()
+
+board_timer = DueTimer(advance_board_timeline, socketio.start_background_task, socketio.sleep,
+                       name='board timeline')
+status_model.on_timeline = board_timer.schedule
+
+def schedule_note_expiry(expires_at):
+    """Arm the sweeper for a note just written with this expires_at"""
+    expires = parse_timestamp(expires_at, naive='keep')
+    if expires is not None and expires.tzinfo is not None:
+        note_sweeper.schedule(expires.timestamp())
+
+# Kiosks keep a local copy of the user and fob directory so scans resolve
+# without a round trip. Fobs carry only what identifies them; checkout
+# state, notes and reservations are still looked up live.
+DIRECTORY_FOB_COLUMNS = 'id, fob_id, vehicle_name, category, location, is_active'
+directory_lock = threading.Lock()
+directory_seq = 0  # bumped on every users/key_fobs change pushed to kiosks
+
+def read_directory(conn, user_ids=None, fob_ids=None):
+    """(users, fobs) rows for the kiosk directory, optionally limited to some ids"""
+    rows = {}
+    for name, sql, ids in (('users', 'SELECT * FROM users', user_ids),
+                           ('fobs', f'SELECT {DIRECTORY_FOB_COLUMNS} FROM key_fobs', fob_ids)):
+        params = []
+        if ids is not None:
+            params = [int(i) for i in ids]
+            if not params:
+                rows[name] = []
+                continue
+            sql += f' WHERE id IN ({",".join("?" * len(params))})'
+        rows[name] = [dict(row) for row in conn.execute(sql, params)]
+    return rows['users'], rows['fobs']
+
+def directory_changed(user_ids=(), fob_ids=()):
+    """Push the changed users/fobs to kiosks, which apply them to their local directory.
+
+    The delta carries base/seq like fob_changed; a kiosk that sees a gap
+    fetches /api/directory again.
+    """
+    global directory_seq
+    with get_db() as conn:
+        users, fobs = read_directory(conn, user_ids, fob_ids)
+    with directory_lock:
+        directory_seq += 1
+        delta = {'server': ETAG_PREFIX, 'base': directory_seq - 1, 'seq': directory_seq,
+                 'users': users, 'fobs': fobs}
+    socketio.emit('directory_changed', delta, to='kiosks')
+
+def status_frame(status):
+    """(event, payload) for a full board to a dashboard that can inflate.
+
+    Boards of at least COMPRESS_MIN_BYTES go as a binary status_update_z
+    frame holding the deflated JSON.
+    """
+    data = json.dumps(status, separators=(',', ':')).encode('utf-8')
+    if len(data) < COMPRESS_MIN_BYTES:
+        compression_stats.record('socket', len(data), len(data))
+        return 'status_update', status
+    body = deflate_bytes(data, COMPRESS_LEVEL)
+    compression_stats.record('socket', len(data), len(body))
+    return 'status_update_z', body
+
+@socketio.on('connect')
+def handle_connect():
+    """Send the full board to a dashboard when it connects.
+
+    Dashboards that connect with ?deflate=1 join the 'deflate' room and get
+    compressed boards; everyone else (older pages) stays in 'plain'. Kiosk
+    GUIs connect with ?kiosk=1 and basic auth and only join 'kiosks'.
+    """
+    if request.args.get('kiosk') == '1':
+        # Kiosks only follow directory changes; they don't render the board
+        auth = request.authorization
+        if not auth or auth.username != KIOSK_USER or auth.password != KIOSK_PASS:
+            return False
+        join_room('kiosks')
+        return
+    deflate = request.args.get('deflate') == '1'
+    join_room('deflate' if deflate else 'plain')
+    status = get_current_status()
+    emit(*(status_frame(status) if deflate else ('status_update', status)))
+
+@socketio.on('resync')
+def handle_resync():
+    """Dashboard missed a fob_changed delta - send it the full board again"""
+    status = get_current_status()
+    emit(*(status_frame(status) if 'deflate' in rooms() else ('status_update', status)))
 
 @app.route('/api/status')
 @require_kiosk_auth
 def api_status():
     """API endpoint to get current key status as JSON (requires kiosk auth)"""
-    return get_current_status()
+    return conditional_response(etag_for('status', *status_model.status_stamp()), get_current_status)
+
+
+@app.route('/admin/api/status/check')
+def api_status_check():
+    """Compare the in-memory status board with the database and repair any drift"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
+    
+    mismatched = status_model.check_consistency(repair=True)
+    if mismatched:
+        broadcaster.request()
+    return {'consistent': not mismatched, 'mismatched_fob_ids': mismatched,
+            'version': status_model.version, 'stats': status_model.stats}
+
+@app.route('/admin/api/status/stats')
+def api_status_stats():
+    """Status model and broadcast counters"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
+    
+    return {'version': status_model.version, 'model': status_model.stats,
+            'broadcast': dict(broadcaster.stats, window_ms=BROADCAST_WINDOW_MS),
+            'card_cache': card_cache.snapshot_stats(),
+            'compression': dict(compression_stats.snapshot(), min_bytes=COMPRESS_MIN_BYTES),
+            'time_cache': time_cache_stats(),
+            'note_sweeper': dict(note_sweeper.stats, due=note_sweeper.due),
+            'board_timer': dict(board_timer.stats, due=board_timer.due),
+            'db_pool': pool_stats()}
 
 
 @app.route('/api/vehicle/<int:fob_id>')
 def api_vehicle_detail(fob_id):
     """Get vehicle details including assignments and recent history"""
+    return conditional_response(etag_for('fob', fob_id, status_model.fob_stamp(fob_id)),
+                                lambda: vehicle_detail(fob_id))
+
+def vehicle_detail(fob_id):
     conn = get_db()
-    chicago_tz = pytz.timezone('America/Chicago')
     
     # Get fob details
     fob = conn.execute('SELECT * FROM key_fobs WHERE id = ?', (fob_id,)).fetchone()
@@ -459,30 +368,8 @@ def api_vehicle_detail(fob_id):
         LIMIT 10
     ''', (fob_id,)).fetchall()
     
-    formatted_history = []
-    for h in history:
-        h_dict = dict(h)
-        if h_dict['checked_out_at']:
-            try:
-                dt = datetime.fromisoformat(h_dict['checked_out_at'])
-                if dt.tzinfo is None:
-                    dt = pytz.UTC.localize(dt)
-                dt = dt.astimezone(chicago_tz)
-                h_dict['checked_out_at'] = dt.strftime('%b %d, %Y %I:%M %p')
-            except:
-                pass
-        if h_dict['checked_in_at']:
-            try:
-                dt = datetime.fromisoformat(h_dict['checked_in_at'])
-                if dt.tzinfo is None:
-                    dt = pytz.UTC.localize(dt)
-                dt = dt.astimezone(chicago_tz)
-                h_dict['checked_in_at'] = dt.strftime('%b %d, %Y %I:%M %p')
-            except:
-                pass
-        formatted_history.append(h_dict)
-    
-    fob_dict['history'] = formatted_history
+    fob_dict['history'] = format_rows(history, {'checked_out_at': '%b %d, %Y %I:%M %p',
+                                                 'checked_in_at': '%b %d, %Y %I:%M %p'})
     conn.close()
     return fob_dict
 
@@ -490,8 +377,9 @@ def api_vehicle_detail(fob_id):
 @require_kiosk_auth
 def api_notify():
     """Receive notification from kiosk that status changed"""
-    # Broadcast update to all connected clients
-    socketio.emit('status_update', get_current_status())
+    # The kiosk API already applied its change to the status model; drift from
+    # other writers is caught by the periodic consistency check
+    broadcaster.request()
     return {'status': 'ok'}
 
 @app.route('/api/user/register', methods=['POST'])
@@ -507,7 +395,6 @@ def register_user():
     if not card_id or not first_name or not last_name:
         return {'error': 'Missing required fields'}, 400
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     # Check if card already exists
@@ -521,13 +408,14 @@ def register_user():
         conn.execute('''
             INSERT INTO users (card_id, first_name, last_name, registered_at, is_active)
             VALUES (?, ?, ?, ?, 1)
-        ''', (card_id, first_name, last_name, datetime.now(chicago_tz).isoformat()))
+        ''', (card_id, first_name, last_name, local_now().isoformat()))
         conn.commit()
 
         # Get the newly created user BEFORE closing connection
         user = conn.execute('SELECT * FROM users WHERE card_id = ? COLLATE NOCASE', (card_id,)).fetchone()
         user_dict = dict(user)
         conn.close()
+        directory_changed(user_ids=[user_dict['id']])
 
         return {
             'status': 'success', 
@@ -552,7 +440,6 @@ def register_equipment():
     if not fob_id or not vehicle_name:
         return {'error': 'Missing required fields'}, 400
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     # Check if fob already exists
@@ -573,14 +460,17 @@ def register_equipment():
     # Insert new equipment
     try:
         conn.execute('''
-            INSERT INTO key_fobs (fob_id, vehicle_name, category, location, registered_at, is_active)
-            VALUES (?, ?, ?, ?, ?, 1)
-        ''', (fob_id, vehicle_name, category, location, datetime.now(chicago_tz).isoformat()))
+            INSERT INTO key_fobs (fob_id, vehicle_name, sort_key, category, location, registered_at, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, 1)
+        ''', (fob_id, vehicle_name, natural_sort_key(vehicle_name), category, location,
+              local_now().isoformat()))
         conn.commit()
         # Get the newly created equipment
         equipment = conn.execute('SELECT * FROM key_fobs WHERE fob_id = ? COLLATE NOCASE', (fob_id,)).fetchone()
         equipment_dict = dict(equipment)
         conn.close()
+        status_model.refresh_fobs([equipment_dict['id']])
+        directory_changed(fob_ids=[equipment_dict['id']])
         return {
             'status': 'success',
             'message': 'Equipment registered successfully', 
@@ -602,7 +492,6 @@ def api_checkout():
     if not user_id or not fob_id:
         return {'error': 'Missing user_id or fob_id'}, 400
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     try:
@@ -610,12 +499,12 @@ def api_checkout():
         conn.execute('''
             INSERT INTO checkouts (user_id, fob_id, kiosk_id, checked_out_at)
             VALUES (?, ?, ?, ?)
-        ''', (user_id, fob_id, data.get('kiosk_id', 'station'), datetime.now(chicago_tz).isoformat()))
+        ''', (user_id, fob_id, data.get('kiosk_id', 'station'), local_now().isoformat()))
         conn.commit()
         conn.close()
         
         # Broadcast update
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         
         return {'status': 'success', 'message': 'Checked out successfully'}, 201
     except Exception as e:
@@ -633,7 +522,6 @@ def api_checkin():
     if not fob_id:
         return {'error': 'Missing fob_id'}, 400
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     try:
@@ -649,12 +537,12 @@ def api_checkin():
             UPDATE checkouts
             SET checked_in_at = ?
             WHERE fob_id = ? AND checked_in_at IS NULL
-        ''', (datetime.now(chicago_tz).isoformat(), fob['id']))
+        ''', (local_now().isoformat(), fob['id']))
         conn.commit()
         conn.close()
         
         # Broadcast update
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob['id'])
         
         return {'status': 'success', 'message': 'Checked in successfully'}, 200
     except Exception as e:
@@ -675,7 +563,6 @@ def api_mark_unavailable():
     if not fob_id:
         return {'error': 'Missing fob_id'}, 400
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     try:
@@ -690,12 +577,12 @@ def api_mark_unavailable():
             conn.execute('''
                 INSERT INTO notes (fob_id, note_text, created_at)
                 VALUES (?, ?, ?)
-            ''', (fob_id, f'UNAVAILABLE: {reason}', datetime.now(chicago_tz).isoformat()))
+            ''', (fob_id, f'UNAVAILABLE: {reason}', local_now().isoformat()))
         
         conn.commit()
         conn.close()
         
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         
         return {'status': 'success', 'message': 'Marked as unavailable'}, 200
     except Exception as e:
@@ -729,13 +616,24 @@ def api_mark_available():
         conn.commit()
         conn.close()
         
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         
         return {'status': 'success', 'message': 'Marked as available'}, 200
     except Exception as e:
         conn.close()
         return {'error': str(e)}, 500
 
+def fob_details(conn, fob):
+    """A fob row from FOB_LOOKUP_SQL with its note and the reservation being shown added"""
+    fob = dict(fob)
+    note = conn.execute('SELECT * FROM notes WHERE fob_id = ?', (fob['id'],)).fetchone()
+    # The first upcoming reservation whose display window has opened
+    now_ts = int(local_now().timestamp())
+    reservation = conn.execute(SHOWN_RESERVATION_SQL, (fob['id'], now_ts, now_ts)).fetchone()
+    fob['note'] = dict(note) if note else None
+    fob['reservation'] = dict(reservation) if reservation else None
+    return fob
+
 @app.route('/api/lookup', methods=['POST'])
 @require_kiosk_auth
 def api_lookup():
@@ -749,7 +647,6 @@ def api_lookup():
         return {'error': 'Missing type or id'}, 400
     
     conn = get_db()
-    chicago_tz = pytz.timezone('America/Chicago')
     
     try:
         if lookup_type == 'user':
@@ -766,62 +663,13 @@ def api_lookup():
                 return {'found': False}, 200
                 
         elif lookup_type == 'fob':
-            # Look up equipment by fob_id with checkout status
-            result = conn.execute('''
-                SELECT kf.*, c.id as checkout_id, c.checked_out_at, 
-                       u.first_name, u.last_name, u.id as user_id
-                FROM key_fobs kf
-                LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
-                LEFT JOIN users u ON c.user_id = u.id
-                WHERE kf.fob_id = ? COLLATE NOCASE AND kf.is_active = 1
-            ''', (identifier,)).fetchone()
-            
-            # Get note if exists
-            note = None
-            reservation = None
-            if result:
-                note_row = conn.execute('''
-                    SELECT * FROM notes WHERE fob_id = ?
-                ''', (result['id'],)).fetchone()
-                if note_row:
-                    note = dict(note_row)
-                
-                # Get active reservation if exists
-                chicago_tz = pytz.timezone('America/Chicago')
-                now = datetime.now(chicago_tz)
-                
-                reservation_rows = conn.execute('''
-                    SELECT r.*, u.first_name, u.last_name
-                    FROM reservations r
-                    LEFT JOIN users u ON r.user_id = u.id
-                    WHERE r.fob_id = ?
-                    ORDER BY r.reserved_datetime ASC
-                ''', (result['id'],)).fetchall()
-                
-                # Check which reservations are active
-                for res in reservation_rows:
-                    try:
-                        res_dt = datetime.fromisoformat(res['reserved_datetime'])
-                        display_start = res_dt - timedelta(hours=res['display_hours_before'])
-                        print(f"  Reserved time: {res_dt}")
-                        print(f"  Display start: {display_start}")
-                        print(f"  Current time: {now}")
-                        print(f"  res_dt > now: {res_dt > now}")
-                        print(f"  display_start <= now: {display_start <= now}")
-                        if res_dt > now and display_start <= now:
-                            reservation = dict(res)
-                            print(f"  ✓ ACTIVE RESERVATION FOUND!")
-                            break
-                    except Exception as e:
-                        print(f"  ERROR: {e}")
-                        pass
-            
+            # Look up equipment by fob_id with checkout status, note and reservation
+            result = conn.execute(FOB_LOOKUP_SQL + 'WHERE kf.fob_id = ? COLLATE NOCASE AND kf.is_active = 1',
+                                  (identifier,)).fetchone()
+            fob_dict = fob_details(conn, result) if result else None
             conn.close()
             
-            if result:
-                fob_dict = dict(result)
-                fob_dict['note'] = note
-                fob_dict['reservation'] = reservation
+            if fob_dict:
                 return {'found': True, 'type': 'fob', 'data': fob_dict}, 200
             else:
                 return {'found': False}, 200
@@ -853,6 +701,50 @@ def api_lookup():
         conn.close()
         return {'error': str(e)}, 500
 
+@app.route('/api/scan/resolve', methods=['POST'])
+@require_kiosk_auth
+def api_scan_resolve():
+    """Everything a kiosk needs about a scan in one round trip.
+
+    Cards win over fobs, like /api/lookup 'scan'. A user comes with the fobs
+    they hold; a fob with its open checkout and holder, note and the
+    reservation being shown, as /api/lookup 'fob' returns it.
+    """
+    data = request.get_json() or {}
+    identifier = data.get('id')
+    if not identifier:
+        return {'error': 'Missing id'}, 400
+    
+    with get_db() as conn:
+        user = conn.execute('SELECT * FROM users WHERE card_id = ? COLLATE NOCASE ORDER BY is_active DESC LIMIT 1',
+                            (identifier,)).fetchone()
+        if user:
+            user = dict(user)
+            user['holdings'] = [dict(row) for row in conn.execute('''
+                SELECT c.id as checkout_id, c.checked_out_at, kf.id, kf.fob_id, kf.vehicle_name, kf.category
+                FROM checkouts c JOIN key_fobs kf ON c.fob_id = kf.id
+                WHERE c.user_id = ? AND c.checked_in_at IS NULL
+                ORDER BY c.checked_out_at
+            ''', (user['id'],))]
+            return {'found': True, 'type': 'user', 'data': user}, 200
+        fob = conn.execute(FOB_LOOKUP_SQL + 'WHERE kf.fob_id = ? COLLATE NOCASE ORDER BY kf.is_active DESC LIMIT 1',
+                           (identifier,)).fetchone()
+        if fob:
+            return {'found': True, 'type': 'fob', 'data': fob_details(conn, fob)}, 200
+    return {'found': False}, 200
+
+@app.route('/api/directory')
+@require_kiosk_auth
+def api_directory():
+    """Every user and fob for a kiosk's local scan directory"""
+    def build():
+        with directory_lock:
+            seq = directory_seq
+        with get_db() as conn:
+            users, fobs = read_directory(conn)
+        return {'server': ETAG_PREFIX, 'seq': seq, 'users': users, 'fobs': fobs}
+    return conditional_response(etag_for('directory', directory_seq), build)
+
 @app.route('/api/search/users', methods=['POST'])
 @require_kiosk_auth
 def api_search_users():
@@ -880,6 +772,9 @@ def api_search_users():
 @require_kiosk_auth
 def api_list_equipment():
     """List all active equipment with checkout status"""
+    return conditional_response(etag_for('equipment', status_model.writes), list_equipment)
+
+def list_equipment():
     conn = get_db()
     
     try:
@@ -890,7 +785,7 @@ def api_list_equipment():
             LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
             LEFT JOIN users u ON c.user_id = u.id
             WHERE kf.is_active = 1
-            ORDER BY kf.category, kf.vehicle_name
+            ORDER BY kf.category, kf.sort_key
         ''').fetchall()
         conn.close()
         
@@ -955,7 +850,6 @@ def api_bulk_checkout():
     if not user_id or not fob_ids:
         return {'error': 'Missing user_id or fob_ids'}, 400
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     checked_out = []
@@ -978,12 +872,12 @@ def api_bulk_checkout():
                         # Check in from previous user
                         conn.execute('''
                             UPDATE checkouts SET checked_in_at = ? WHERE id = ?
-                        ''', (datetime.now(chicago_tz).isoformat(), existing['id']))
+                        ''', (local_now().isoformat(), existing['id']))
                         # Check out to new user
                         conn.execute('''
                             INSERT INTO checkouts (user_id, fob_id, kiosk_id, checked_out_at)
                             VALUES (?, ?, ?, ?)
-                        ''', (user_id, fob_id, kiosk_id, datetime.now(chicago_tz).isoformat()))
+                        ''', (user_id, fob_id, kiosk_id, local_now().isoformat()))
                         checked_out.append(fob_id)
                     # else: already checked out to this user, skip
                 else:
@@ -991,7 +885,7 @@ def api_bulk_checkout():
                     conn.execute('''
                         INSERT INTO checkouts (user_id, fob_id, kiosk_id, checked_out_at)
                         VALUES (?, ?, ?, ?)
-                    ''', (user_id, fob_id, kiosk_id, datetime.now(chicago_tz).isoformat()))
+                    ''', (user_id, fob_id, kiosk_id, local_now().isoformat()))
                     checked_out.append(fob_id)
                     
             except Exception as e:
@@ -1001,7 +895,7 @@ def api_bulk_checkout():
         conn.close()
         
         # Broadcast update
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(*fob_ids)
         
         return {
             'status': 'success',
@@ -1025,7 +919,6 @@ def api_barns_transfer():
     if not fob_id:
         return {'error': 'Missing fob_id'}, 400
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     try:
@@ -1043,6 +936,7 @@ def api_barns_transfer():
             barns_user = conn.execute('''
                 SELECT * FROM users WHERE card_id = ? COLLATE NOCASE
             ''', ('BARNS',)).fetchone()
+            directory_changed(user_ids=[barns_user['id']])
         
         # Check current checkout status
         current_checkout = conn.execute('''
@@ -1053,19 +947,19 @@ def api_barns_transfer():
             # Check in from current user
             conn.execute('''
                 UPDATE checkouts SET checked_in_at = ? WHERE id = ?
-            ''', (datetime.now(chicago_tz).isoformat(), current_checkout['id']))
+            ''', (local_now().isoformat(), current_checkout['id']))
         
         # Check out to The Barns
         conn.execute('''
             INSERT INTO checkouts (user_id, fob_id, kiosk_id, checked_out_at)
             VALUES (?, ?, ?, ?)
-        ''', (barns_user['id'], fob_id, kiosk_id, datetime.now(chicago_tz).isoformat()))
+        ''', (barns_user['id'], fob_id, kiosk_id, local_now().isoformat()))
         
         conn.commit()
         conn.close()
         
         # Broadcast update
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         
         return {'status': 'success', 'message': 'Transferred to The Barns'}, 200
         
@@ -1073,6 +967,151 @@ def api_barns_transfer():
         conn.close()
         return {'error': str(e)}, 500
 
+# Offline kiosk journal replay. Kiosks that lose the server keep taking
+# checkouts, checkins, Barns transfers and unavailable marks in a local
+# journal and replay it here in order once they reconnect. Each operation
+# carries an idempotency key (replays of the same key return the recorded
+# result) and the time it happened at the kiosk, which becomes its
+# checkout/checkin time.
+JOURNAL_OPS = ('checkout', 'checkin', 'barns_transfer', 'mark_unavailable')
+
+def get_barns_user_id(conn):
+    """users.id of The Barns pseudo-user, created on first use"""
+    row = conn.execute('SELECT id FROM users WHERE card_id = ? COLLATE NOCASE', ('BARNS',)).fetchone()
+    if row:
+        return row['id']
+    user_id = conn.execute('INSERT INTO users (card_id, first_name, last_name, is_active) VALUES (?, ?, ?, ?)',
+                           ('BARNS', 'The', 'Barns', 1)).lastrowid
+    conn.commit()
+    directory_changed(user_ids=[user_id])
+    return user_id
+
+def _replay_checkout(conn, fob_id, user_id, kiosk_id, occurred_at, occurred):
+    current = conn.execute('''
+        SELECT c.id, c.user_id, c.checked_out_at, u.first_name, u.last_name
+        FROM checkouts c LEFT JOIN users u ON c.user_id = u.id
+        WHERE c.fob_id = ? AND c.checked_in_at IS NULL
+    ''', (fob_id,)).fetchone()
+    message = None
+    if current:
+        holder = f"{current['first_name']} {current['last_name']}"
+        if current['user_id'] == user_id:
+            return 'duplicate', f'Already checked out to {holder}'
+        since = parse_timestamp(current['checked_out_at'])
+        if since is not None and since > occurred:
+            return 'conflict', f"Checked out to {holder} at {current['checked_out_at']}, after this offline checkout"
+        conn.execute('UPDATE checkouts SET checked_in_at = ? WHERE id = ?', (occurred_at, current['id']))
+        message = f'Was still checked out to {holder}; checked in and transferred'
+    conn.execute('INSERT INTO checkouts (user_id, fob_id, kiosk_id, checked_out_at) VALUES (?, ?, ?, ?)',
+                 (user_id, fob_id, kiosk_id, occurred_at))
+    return 'applied', message
+
+def replay_journal_op(conn, kiosk_id, op, payload, occurred_at):
+    """Apply one journaled kiosk operation at its kiosk time; returns (status, message, key_fobs.id)"""
+    occurred = parse_timestamp(occurred_at, naive='keep')
+    if op not in JOURNAL_OPS:
+        return 'rejected', f'Unknown operation {op!r}', None
+    if occurred is None or occurred.tzinfo is None:
+        return 'rejected', 'occurred_at must be an ISO timestamp with a UTC offset', None
+    fob = conn.execute('SELECT id FROM key_fobs WHERE id = ?', (payload.get('fob_id'),)).fetchone()
+    if not fob:
+        return 'rejected', 'Fob not found', None
+    fob_id = fob['id']
+
+    if op == 'checkout':
+        # Foreign keys are off, so an unknown user would still close out the current holder
+        user = conn.execute('SELECT id FROM users WHERE id = ? AND is_active = 1', (payload.get('user_id'),)).fetchone()
+        if not user:
+            return 'rejected', 'User not found', fob_id
+        status, message = _replay_checkout(conn, fob_id, user['id'], kiosk_id, occurred_at, occurred)
+    elif op == 'barns_transfer':
+        status, message = _replay_checkout(conn, fob_id, get_barns_user_id(conn), kiosk_id, occurred_at, occurred)
+    elif op == 'checkin':
+        current = conn.execute('SELECT id, checked_out_at FROM checkouts WHERE fob_id = ? AND checked_in_at IS NULL',
+                               (fob_id,)).fetchone()
+        since = parse_timestamp(current['checked_out_at']) if current else None
+        if not current:
+            status, message = 'duplicate', 'Already checked in'
+        elif since is not None and since > occurred:
+            status, message = 'conflict', f"Checked out again at {current['checked_out_at']}, after this offline checkin"
+        else:
+            conn.execute('UPDATE checkouts SET checked_in_at = ? WHERE id = ?', (occurred_at, current['id']))
+            status, message = 'applied', None
+    else:
+        conn.execute('UPDATE key_fobs SET is_available = 0 WHERE id = ?', (fob_id,))
+        if payload.get('reason'):
+            conn.execute('DELETE FROM notes WHERE fob_id = ?', (fob_id,))
+            conn.execute('INSERT INTO notes (fob_id, note_text, created_at) VALUES (?, ?, ?)',
+                         (fob_id, f"UNAVAILABLE: {payload['reason']}", occurred_at))
+        status, message = 'applied', None
+    return status, message, fob_id
+
+@app.route('/api/journal/replay', methods=['POST'])
+@require_kiosk_auth
+def api_journal_replay():
+    """Apply a kiosk's offline journal in order; returns one result per operation.
+
+    Each operation commits together with its kiosk_ops record, so a replay
+    that is cut off part way can simply be sent again; an operation that is
+    already recorded returns its stored result.
+    """
+    data = request.get_json() or {}
+    kiosk_id = data.get('kiosk_id', 'station')
+    results = []
+    touched = set()
+    for entry in data.get('ops', []):
+        key = entry.get('key')
+        if not key:
+            results.append({'key': None, 'status': 'rejected', 'message': 'Missing key'})
+            continue
+        conn = get_db()
+        try:
+            done = conn.execute('SELECT status, message FROM kiosk_ops WHERE op_key = ?', (key,)).fetchone()
+            if done:
+                results.append({'key': key, 'status': done['status'], 'message': done['message']})
+                continue
+            try:
+                status, message, fob_id = replay_journal_op(conn, kiosk_id, entry.get('op'),
+                                                            entry.get('payload') or {}, entry.get('occurred_at'))
+            except Exception as e:
+                conn.rollback()
+                status, message, fob_id = 'rejected', str(e), None
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO kiosk_ops (op_key, kiosk_id, op, fob_id, occurred_at, status, message, replayed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, kiosk_id, str(entry.get('op')), fob_id, entry.get('occurred_at'), status, message,
+                  local_now().isoformat()))
+            if cursor.rowcount == 0:
+                # An overlapping replay (a retried POST) recorded this key first: undo ours, report theirs
+                conn.rollback()
+                done = conn.execute('SELECT status, message FROM kiosk_ops WHERE op_key = ?', (key,)).fetchone()
+                results.append({'key': key, 'status': done['status'], 'message': done['message']})
+                continue
+            conn.commit()
+        finally:
+            conn.close()
+        if status == 'applied':
+            touched.add(fob_id)
+        results.append({'key': key, 'status': status, 'message': message})
+    if touched:
+        broadcast_status(*touched)
+    return {'results': results}, 200
+
+@app.route('/admin/api/journal/conflicts')
+def api_journal_conflicts():
+    """Recent replayed kiosk operations that were not applied cleanly"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
+    
+    with get_db() as conn:
+        rows = conn.execute('''
+            SELECT o.*, kf.vehicle_name FROM kiosk_ops o
+            LEFT JOIN key_fobs kf ON o.fob_id = kf.id
+            WHERE o.status IN ('conflict', 'rejected') OR o.message IS NOT NULL
+            ORDER BY o.replayed_at DESC LIMIT 100
+        ''').fetchall()
+    return {'ops': [dict(row) for row in rows]}
+
 @app.route('/api/user/replace_card', methods=['POST'])
 @require_kiosk_auth
 def api_replace_card():
@@ -1103,6 +1142,7 @@ def api_replace_card():
         ''', (new_card_id, user_id))
         conn.commit()
         conn.close()
+        directory_changed(user_ids=[user_id])
         
         return {'status': 'success', 'message': 'Card replaced'}, 200
         
@@ -1143,6 +1183,8 @@ def api_equipment_replace_fob():
         
         conn.commit()
         conn.close()
+        status_model.refresh_fobs([equipment_id])
+        directory_changed(fob_ids=[equipment_id])
         
         return {'success': True}, 200
         
@@ -1170,7 +1212,7 @@ def api_delete_note():
         conn.close()
         
         # Broadcast update
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         
         return {'status': 'success', 'message': 'Note deleted'}, 200
         
@@ -1192,7 +1234,6 @@ def api_add_note():
     if not fob_id or not note_text:
         return {'error': 'Missing fob_id or note_text'}, 400
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     try:
@@ -1203,13 +1244,14 @@ def api_add_note():
         conn.execute('''
             INSERT INTO notes (fob_id, note_text, created_at, created_by, expires_at)
             VALUES (?, ?, ?, ?, ?)
-        ''', (fob_id, note_text, datetime.now(chicago_tz).isoformat(), created_by, expires_at))
+        ''', (fob_id, note_text, local_now().isoformat(), created_by, expires_at))
         
         conn.commit()
         conn.close()
         
         # Broadcast update
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
+        schedule_note_expiry(expires_at)
         
         return {'status': 'success', 'message': 'Note added'}, 201
         
@@ -1260,7 +1302,6 @@ def inspect_cleanliness(fob_id):
         return "Vehicle not found", 404
 
     if request.method == 'POST':
-        chicago_tz = pytz.timezone('America/Chicago')
         exterior_clean = 1 if request.form.get('exterior_clean') == '1' else 0
         interior_vacuumed = 1 if request.form.get('interior_vacuumed') == '1' else 0
         wiped_dashboard = 1 if request.form.get('wiped_dashboard') else 0
@@ -1280,14 +1321,21 @@ def inspect_cleanliness(fob_id):
                 comments)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
-            fob_id, username, datetime.now(chicago_tz).isoformat(),
+            fob_id, username, local_now().isoformat(),
             exterior_clean, interior_vacuumed,
             wiped_dashboard, wiped_center_console, wiped_windows,
             wiped_interior_doors, wiped_backseats, wiped_keyboard_mdc,
             comments
         ))
-        conn.commit()
         inspection_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        
+        # Mark any pending assignments as completed
+        conn.execute('''
+            UPDATE inspection_assignments 
+            SET completed_at = ?, completed_inspection_id = ?
+            WHERE fob_id = ? AND inspection_type = ? AND completed_at IS NULL
+        ''', (local_now().isoformat(), inspection_id, fob_id, 'cleanliness'))
+        conn.commit()
         conn.close()
         
         # Check for issues and email quartermaster
@@ -1307,23 +1355,13 @@ def inspect_cleanliness(fob_id):
                 vehicle_name=fob['vehicle_name'],
                 inspection_type='cleanliness',
                 inspector=username,
-                inspected_at=datetime.now(chicago_tz).strftime('%B %d, %Y at %I:%M %p'),
+                inspected_at=local_now().strftime('%B %d, %Y at %I:%M %p'),
                 issues=issues,
                 comments=comments,
                 fob_id=fob_id,
                 inspection_id=inspection_id
             )
         
-        # Mark any pending assignments as completed
-        conn = get_db()
-        conn.execute('''
-            UPDATE inspection_assignments 
-            SET completed_at = ?, completed_inspection_id = ?
-            WHERE fob_id = ? AND inspection_type = ? AND completed_at IS NULL
-        ''', (datetime.now(chicago_tz).isoformat(), inspection_id, fob_id, 'cleanliness'))
-        conn.commit()
-        conn.close()
-        
         return render_template('inspection_success.html', vehicle_name=fob['vehicle_name'], inspection_type='Monthly Cleanliness')
 
     conn.close()
@@ -1346,7 +1384,6 @@ def inspect_quarterly(fob_id):
         return "Vehicle not found", 404
 
     if request.method == 'POST':
-        chicago_tz = pytz.timezone('America/Chicago')
         fields = [
             'registration_current', 'tires_inflated', 'compartment_clean',
             'light_bar_working', 'mdc_working', 'radio_working', 'radar_working',
@@ -1365,7 +1402,7 @@ def inspect_quarterly(fob_id):
             'window_punch', 'spit_hood', 'citation_book', 'parking_ticket_book'
         ]
         
-        values = [fob_id, username, datetime.now(chicago_tz).isoformat()]
+        values = [fob_id, username, local_now().isoformat()]
         for field in fields:
             val = request.form.get(field)
             if val == '1':
@@ -1380,8 +1417,15 @@ def inspect_quarterly(fob_id):
         field_names = 'fob_id, inspector, inspected_at, ' + ', '.join(fields) + ', comments'
         
         conn.execute(f'INSERT INTO quarterly_inspections ({field_names}) VALUES ({placeholders})', values)
-        conn.commit()
         inspection_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        
+        # Mark any pending assignments as completed
+        conn.execute('''
+            UPDATE inspection_assignments 
+            SET completed_at = ?, completed_inspection_id = ?
+            WHERE fob_id = ? AND inspection_type = ? AND completed_at IS NULL
+        ''', (local_now().isoformat(), inspection_id, fob_id, 'quarterly'))
+        conn.commit()
         conn.close()
         
         # Build field values dict to check for issues
@@ -1452,23 +1496,13 @@ def inspect_quarterly(fob_id):
                 vehicle_name=fob['vehicle_name'],
                 inspection_type='quarterly',
                 inspector=username,
-                inspected_at=datetime.now(chicago_tz).strftime('%B %d, %Y at %I:%M %p'),
+                inspected_at=local_now().strftime('%B %d, %Y at %I:%M %p'),
                 issues=issues,
                 comments=comments,
                 fob_id=fob_id,
                 inspection_id=inspection_id
             )
         
-        # Mark any pending assignments as completed
-        conn2 = get_db()
-        conn2.execute('''
-            UPDATE inspection_assignments 
-            SET completed_at = ?, completed_inspection_id = ?
-            WHERE fob_id = ? AND inspection_type = ? AND completed_at IS NULL
-        ''', (datetime.now(chicago_tz).isoformat(), inspection_id, fob_id, 'quarterly'))
-        conn2.commit()
-        conn2.close()
-        
         return render_template('inspection_success.html', vehicle_name=fob['vehicle_name'], inspection_type='Quarterly Inventory')
 
     conn.close()
@@ -1480,7 +1514,6 @@ def api_assignments():
     if not session.get('admin'):
         return {'error': 'Unauthorized'}, 401
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     rows = conn.execute('''
         SELECT ia.*, kf.vehicle_name
@@ -1490,28 +1523,7 @@ def api_assignments():
     ''').fetchall()
     conn.close()
     
-    result = []
-    for row in rows:
-        r = dict(row)
-        if r['assigned_at']:
-            try:
-                dt = datetime.fromisoformat(r['assigned_at'])
-                if dt.tzinfo is not None:
-                    dt = dt.astimezone(chicago_tz)
-                r['assigned_at'] = dt.strftime('%b %d, %Y')
-            except:
-                pass
-        if r['completed_at']:
-            try:
-                dt = datetime.fromisoformat(r['completed_at'])
-                if dt.tzinfo is not None:
-                    dt = dt.astimezone(chicago_tz)
-                r['completed_at'] = dt.strftime('%b %d, %Y')
-            except:
-                pass
-        result.append(r)
-    
-    return result
+    return format_rows(rows, {'assigned_at': '%b %d, %Y', 'completed_at': '%b %d, %Y'}, naive='keep')
 
 @app.route('/admin/assignment/delete/<int:assignment_id>')
 def delete_inspection_assignment(assignment_id):
@@ -1534,7 +1546,6 @@ def assign_inspection(fob_id):
     from email_utils import send_inspection_assignment
     
     assigned_by = session.get('username', 'Admin')
-    chicago_tz = pytz.timezone('America/Chicago')
     
     conn = get_db()
     fob = conn.execute('SELECT * FROM key_fobs WHERE id = ?', (fob_id,)).fetchone()
@@ -1553,7 +1564,7 @@ def assign_inspection(fob_id):
             (fob_id, inspection_type, assigned_to, assigned_by, assigned_at, due_date)
             VALUES (?, ?, ?, ?, ?, ?)
         ''', (fob_id, inspection_type, assigned_to, assigned_by, 
-               datetime.now(chicago_tz).isoformat(), due_date))
+               local_now().isoformat(), due_date))
         conn.commit()
         conn.close()
         
@@ -1574,7 +1585,7 @@ def assign_inspection(fob_id):
                          (assigned_by,)).fetchall()
     
     # Also get OKTA admins from recent sessions if available
-    today = datetime.now(chicago_tz).strftime('%Y-%m-%d')
+    today = local_now().strftime('%Y-%m-%d')
     conn.close()
     
     return render_template('assign_inspection.html', 
@@ -1603,257 +1614,255 @@ def admin_dashboard():
         if not session.get('admin'):
             return redirect('/admin/login')
     
-    conn = get_db()
-    
-    # Get all users
-    users_raw = conn.execute('SELECT * FROM users ORDER BY last_name ASC, first_name ASC').fetchall()
-    
-    # Format user registration timestamps
-    chicago_tz = pytz.timezone('America/Chicago')
-    users = []
-    for user in users_raw:
-        user_dict = dict(user)
-        if user_dict['registered_at']:
-            try:
-                dt = datetime.fromisoformat(user_dict['registered_at'])
-                # Old timestamps without timezone are in UTC, new ones have timezone
-                if dt.tzinfo is None:
-                    dt = pytz.UTC.localize(dt).astimezone(chicago_tz)
-                else:
-                    dt = dt.astimezone(chicago_tz)
-                user_dict['registered_at'] = dt.strftime('%Y-%m-%d %I:%M:%S %p')
-            except:
-                pass
-        users.append(user_dict)
-    
-    # Get all key fobs
-    fobs_raw = conn.execute('SELECT * FROM key_fobs').fetchall()
+    # Each tab loads its own data from the /admin/api/* endpoints below
+    return render_template('admin.html')
 
-    # Get ALL notes for admin (including expired)
-    now = datetime.now(chicago_tz)
-    all_notes = conn.execute('SELECT * FROM notes').fetchall()
+# Timestamps in the admin tables
+ADMIN_TIME_FORMAT = '%Y-%m-%d %I:%M:%S %p'
 
-    note_map = {}
-    for note in all_notes:
-        note_map[note['fob_id']] = note
-    # Natural sort by vehicle_name
-    import re
-    def natural_sort_key(item):
-        return [int(text) if text.isdigit() else text.lower() 
-                for text in re.split('([0-9]+)', item['vehicle_name'])]
-    
-    fobs_raw = sorted(fobs_raw, key=natural_sort_key)
-    
-    # Format fob registration timestamps
-    fobs = []
-    for fob in fobs_raw:
-        fob_dict = dict(fob)
-        # Add note if exists
-        if fob_dict['id'] in note_map:
-            fob_dict['note'] = dict(note_map[fob_dict['id']])
-        else:
-            fob_dict['note'] = None
-        if fob_dict['registered_at']:
-            try:
-                dt = datetime.fromisoformat(fob_dict['registered_at'])
-                # Old timestamps without timezone are in UTC, new ones have timezone
-                if dt.tzinfo is None:
-                    dt = pytz.UTC.localize(dt).astimezone(chicago_tz)
-                else:
-                    dt = dt.astimezone(chicago_tz)
-                fob_dict['registered_at'] = dt.strftime('%Y-%m-%d %I:%M:%S %p')
-            except:
-                pass
-        fobs.append(fob_dict)
-    
-    # Get recent checkout history with filters
-    hist_start_date = request.args.get('hist_start_date')
-    hist_end_date = request.args.get('hist_end_date')
-    hist_fob_id = request.args.get('hist_fob_id')
-    hist_user_id = request.args.get('hist_user_id')
-    hist_limit = request.args.get('hist_limit', '50')
-    
-    history_query = '''
-        SELECT 
-            u.first_name || " " || u.last_name as user_name,
-            kf.vehicle_name,
-            c.checked_out_at,
-            c.checked_in_at,
-            c.kiosk_id
-        FROM checkouts c
-        JOIN users u ON c.user_id = u.id
-        JOIN key_fobs kf ON c.fob_id = kf.id
-        WHERE 1=1
-    '''
-    
-    params = []
-    
-    if hist_start_date:
-        history_query += ' AND date(substr(c.checked_out_at, 1, 10)) >= date(?)'
-        params.append(hist_start_date)
-    
-    if hist_end_date:
-        history_query += ' AND date(substr(c.checked_out_at, 1, 10)) <= date(?)'
-        params.append(hist_end_date)
-    
-    if hist_fob_id:
-        history_query += ' AND kf.id = ?'
-        params.append(int(hist_fob_id))
-    
-    if hist_user_id:
-        history_query += ' AND u.id = ?'
-        params.append(int(hist_user_id))
-    
-    history_query += ' ORDER BY c.checked_out_at DESC'
-    
-    if hist_limit and hist_limit != 'all':
-        history_query += f' LIMIT {int(hist_limit)}'
-    
-    history_raw = conn.execute(history_query, params).fetchall()
+def _page_args(default_per_page=50, max_per_page=200):
+    """(page, per_page) from the query string; raises ValueError on junk"""
+    page = max(1, int(request.args.get('page', 1)))
+    per_page = max(1, min(int(request.args.get('per_page', default_per_page)), max_per_page))
+    return page, per_page
+
+def _sort_direction():
+    return 'DESC' if request.args.get('dir', 'asc').lower() == 'desc' else 'ASC'
+
+@app.route('/admin/api/options')
+def api_admin_options():
+    """Id/name lists for the admin filter dropdowns"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
     
-    # Format timestamps - they're already in Central time with offset
-    history = []
-    for entry in history_raw:
-        entry_dict = dict(entry)
-        
-        # Just parse and format - don't convert timezone
-        if entry_dict['checked_out_at']:
-            try:
-                dt_str = entry_dict['checked_out_at']
-                # Remove timezone info for parsing, then format
-                dt = datetime.fromisoformat(dt_str.split('+')[0].split('-06:00')[0])
-                entry_dict['checked_out_at'] = dt.strftime('%Y-%m-%d %I:%M:%S %p')
-            except:
-                pass
-        
-        if entry_dict['checked_in_at']:
-            try:
-                dt_str = entry_dict['checked_in_at']
-                # Remove timezone info for parsing, then format
-                dt = datetime.fromisoformat(dt_str.split('+')[0].split('-06:00')[0])
-                entry_dict['checked_in_at'] = dt.strftime('%Y-%m-%d %I:%M:%S %p')
-            except:
-                pass
-        
-        history.append(entry_dict)
+    with get_db() as conn:
+        fobs = conn.execute('''
+            SELECT kf.id, kf.vehicle_name, kf.category, kf.is_active, COALESCE(fc.is_vehicle, 0) as is_vehicle
+            FROM key_fobs kf
+            LEFT JOIN fob_categories fc ON fc.name = kf.category
+            ORDER BY kf.sort_key
+        ''').fetchall()
+        users = conn.execute(
+            'SELECT id, first_name, last_name FROM users ORDER BY last_name ASC, first_name ASC'
+        ).fetchall()
+    return {
+        'fobs': [dict(f, is_vehicle=bool(f['is_vehicle'])) for f in fobs],
+        'users': [dict(u) for u in users],
+    }
 
-    # Get active reservations
-    chicago_tz = pytz.timezone('America/Chicago')
-    now = datetime.now(chicago_tz)
+USER_SORTS = {
+    'name': 'last_name COLLATE NOCASE {dir}, first_name COLLATE NOCASE {dir}',
+    'card': 'card_id COLLATE NOCASE {dir}',
+    'registered': 'registered_at {dir}',
+    'status': 'is_active {dir}, last_name COLLATE NOCASE, first_name COLLATE NOCASE',
+}
+
+@app.route('/admin/api/users')
+def api_admin_users():
+    """Users tab: search (card or name), sort and pagination"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
+    try:
+        page, per_page = _page_args()
+    except ValueError:
+        return {'error': 'Invalid page'}, 400
+    order = USER_SORTS.get(request.args.get('sort', 'name'), USER_SORTS['name']).format(dir=_sort_direction())
+    
+    where, params = '', []
+    q = request.args.get('q', '').strip()
+    if q:
+        where = " WHERE card_id LIKE ? OR first_name LIKE ? OR last_name LIKE ? OR first_name || ' ' || last_name LIKE ?"
+        params = [f'%{q}%'] * 4
+    
+    with get_db() as conn:
+        total = conn.execute('SELECT COUNT(*) FROM users' + where, params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT * FROM users{where} ORDER BY {order} LIMIT ? OFFSET ?',
+            params + [per_page, (page - 1) * per_page]
+        ).fetchall()
+    
+    items = format_rows(rows, {'registered_at': ADMIN_TIME_FORMAT})
+    return {'items': items, 'total': total, 'page': page, 'per_page': per_page}
+
+FOB_SORTS = {
+    'name': 'kf.sort_key {dir}',
+    'fob_id': 'kf.fob_id COLLATE NOCASE {dir}',
+    'category': 'kf.category {dir}, kf.sort_key',
+    'location': 'kf.location COLLATE NOCASE {dir}, kf.sort_key',
+    'registered': 'kf.registered_at {dir}',
+    'status': 'kf.is_active {dir}, kf.sort_key',
+}
+
+@app.route('/admin/api/fobs')
+def api_admin_fobs():
+    """Key Fobs tab: category filter, search, sort and pagination, with each fob's note"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
+    try:
+        page, per_page = _page_args()
+    except ValueError:
+        return {'error': 'Invalid page'}, 400
+    order = FOB_SORTS.get(request.args.get('sort', 'name'), FOB_SORTS['name']).format(dir=_sort_direction())
+    
+    where, params = ' WHERE 1=1', []
+    category = request.args.get('category')
+    if category and category != 'all':
+        where += ' AND kf.category = ?'
+        params.append(category)
+    q = request.args.get('q', '').strip()
+    if q:
+        where += ' AND (kf.fob_id LIKE ? OR kf.vehicle_name LIKE ? OR kf.location LIKE ?)'
+        params += [f'%{q}%'] * 3
+    
+    with get_db() as conn:
+        total = conn.execute('SELECT COUNT(*) FROM key_fobs kf' + where, params).fetchone()[0]
+        rows = conn.execute(f'''
+            SELECT kf.*, COALESCE(fc.is_vehicle, 0) as is_vehicle
+            FROM key_fobs kf
+            LEFT JOIN fob_categories fc ON fc.name = kf.category
+            {where} ORDER BY {order} LIMIT ? OFFSET ?
+        ''', params + [per_page, (page - 1) * per_page]).fetchall()
+        
+        notes = {}
+        if rows:
+            placeholders = ','.join('?' * len(rows))
+            notes = {n['fob_id']: dict(n) for n in conn.execute(
+                f'SELECT * FROM notes WHERE fob_id IN ({placeholders})', [r['id'] for r in rows])}
+    
+    items = [dict(row,
+                  registered_at=format_local(row['registered_at'], ADMIN_TIME_FORMAT),
+                  note=notes.get(row['id']),
+                  is_vehicle=bool(row['is_vehicle'])) for row in rows]
+    return {'items': items, 'total': total, 'page': page, 'per_page': per_page}
+
+@app.route('/admin/api/reservations')
+def api_admin_reservations():
+    """Active reservations, or one keyset page of past reservations (scope=past) with filters"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
     
-    reservations_query = '''
+    now_ts = int(local_now().timestamp())
+    query = '''
         SELECT r.*, u.first_name, u.last_name, kf.vehicle_name
         FROM reservations r
         LEFT JOIN users u ON r.user_id = u.id
         JOIN key_fobs kf ON r.fob_id = kf.id
-        ORDER BY r.reserved_datetime ASC
     '''
-    reservations_raw = conn.execute(reservations_query).fetchall()
     
-    # Filter and format reservation datetimes
-    reservations = []
-    for res in reservations_raw:
-        res_dict = dict(res)
-        if res_dict['reserved_datetime']:
-            try:
-                dt = datetime.fromisoformat(res_dict['reserved_datetime'])
-                if dt.tzinfo is not None:
-                    dt = dt.astimezone(chicago_tz)
-                
-                # Include if future start OR has future end_datetime
-                end_dt = None
-                if res_dict.get('end_datetime'):
-                    try:
-                        end_dt = datetime.fromisoformat(res_dict['end_datetime'])
-                        if end_dt.tzinfo is not None:
-                            end_dt = end_dt.astimezone(chicago_tz)
-                        res_dict['end_datetime'] = end_dt.strftime('%a, %b %d at %I:%M %p')
-                    except:
-                        pass
-                
-                if dt > now or (end_dt and end_dt > now):
-                    res_dict['reserved_datetime'] = dt.strftime('%a, %b %d at %I:%M %p')
-                    reservations.append(res_dict)
-            except:
-                pass
-
-    # Get past reservations with filters
-    past_start_date = request.args.get('past_start_date')
-    past_end_date = request.args.get('past_end_date')
-    past_fob_id = request.args.get('past_fob_id')
-    past_user_id = request.args.get('past_user_id')
-    past_limit = request.args.get('past_limit', '25')
+    if request.args.get('scope') != 'past':
+        # Not started yet, or not ended yet
+        query += ' WHERE r.reserved_ts > ? OR r.end_ts > ? ORDER BY +r.reserved_ts ASC'
+        with get_db() as conn:
+            rows = conn.execute(query, (now_ts, now_ts)).fetchall()
+        items = format_rows(rows, {'reserved_datetime': '%a, %b %d at %I:%M %p',
+                                   'end_datetime': '%a, %b %d at %I:%M %p'})
+        return {'items': items}
+    
+    # Reservations whose reserved_datetime the trigger could not parse have no
+    # reserved_ts and are left out, as unparseable ones always were, so every
+    # cursor is built from a number
+    query += ' WHERE r.reserved_ts IS NOT NULL AND r.reserved_ts <= ?'
+    params = [now_ts]
+    try:
+        limit = int(request.args.get('past_limit', '25'))
+    except ValueError:
+        limit = 100  # 'all' from older bookmarks; further pages load on demand
+    limit = max(1, min(limit, 100))
+    try:
+        if request.args.get('past_start_date'):
+            query += ' AND r.reserved_ts >= ?'
+            params.append(local_day_start_ts(request.args['past_start_date']))
+        if request.args.get('past_end_date'):
+            query += ' AND r.reserved_ts < ?'
+            params.append(local_day_start_ts(request.args['past_end_date'], days=1))
+        if request.args.get('past_fob_id'):
+            query += ' AND r.fob_id = ?'
+            params.append(int(request.args['past_fob_id']))
+        if request.args.get('past_user_id'):
+            query += ' AND r.user_id = ?'
+            params.append(int(request.args['past_user_id']))
+        if request.args.get('cursor'):
+            after_ts, after_id = (int(part) for part in request.args['cursor'].split('.'))
+            query += ' AND (r.reserved_ts, r.id) < (?, ?)'
+            params.extend([after_ts, after_id])
+    except ValueError:
+        return {'error': 'Invalid filter or cursor'}, 400
+    
+    query += ' ORDER BY r.reserved_ts DESC, r.id DESC LIMIT ?'
+    params.append(limit + 1)
+    with get_db() as conn:
+        rows = conn.execute(query, params).fetchall()
+    
+    items = format_rows(rows[:limit], {'reserved_datetime': '%a, %b %d at %I:%M %p'})
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = f"{rows[limit - 1]['reserved_ts']}.{rows[limit - 1]['id']}"
+    return {'items': items, 'next_cursor': next_cursor}
+
+HISTORY_PAGE_SIZES = (50, 100, 250, 500)
+
+def _history_cursor(row):
+    """Opaque keyset cursor for the row after which the next page starts ('undated.<id>' past the dated rows)"""
+    ts = row['checked_out_ts']
+    return f"{'undated' if ts is None else ts}.{row['id']}"
+
+@app.route('/admin/api/history')
+def api_history():
+    """One page of checkout history, newest first, with keyset pagination on (checked_out_ts, id)"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
     
-
-    past_reservations_query = '''
-        SELECT r.*, u.first_name, u.last_name, kf.vehicle_name
-        FROM reservations r
-        LEFT JOIN users u ON r.user_id = u.id
-        JOIN key_fobs kf ON r.fob_id = kf.id
-        ORDER BY r.reserved_datetime DESC
-    '''
-    past_reservations_raw = conn.execute(past_reservations_query).fetchall()
+    hist_start_date = request.args.get('hist_start_date')
+    hist_end_date = request.args.get('hist_end_date')
+    hist_fob_id = request.args.get('hist_fob_id')
+    hist_user_id = request.args.get('hist_user_id')
+    cursor = request.args.get('cursor')
+    try:
+        limit = int(request.args.get('hist_limit', '50'))
+    except ValueError:
+        limit = HISTORY_PAGE_SIZES[-1]  # 'all' from older bookmarks
+    limit = max(1, min(limit, HISTORY_PAGE_SIZES[-1]))
     
-    # Filter and format past reservation datetimes
-    past_reservations = []
-    for res in past_reservations_raw:
-        res_dict = dict(res)
-        if res_dict['reserved_datetime']:
-            try:
-                dt = datetime.fromisoformat(res_dict['reserved_datetime'])
-                
-                # Only include past reservations
-                if dt <= now:
-                    # Apply date filters
-                    if past_start_date and dt.date() < datetime.strptime(past_start_date, '%Y-%m-%d').date():
-                        continue
-                    if past_end_date and dt.date() > datetime.strptime(past_end_date, '%Y-%m-%d').date():
-                        continue
-                    
-                    # Apply fob filter
-                    if past_fob_id and res_dict['fob_id'] != int(past_fob_id):
-                        continue
-                    
-                    # Apply user filter
-                    if past_user_id and res_dict['user_id'] != int(past_user_id):
-                        continue
-                    
-                    if dt.tzinfo is not None:
-                        dt = dt.astimezone(chicago_tz)
-                    res_dict['reserved_datetime'] = dt.strftime('%a, %b %d at %I:%M %p')
-                    past_reservations.append(res_dict)
-            except:
-                pass
+    conditions = ''
+    params = []
     
-    # Apply limit
-    if past_limit and past_limit != 'all':
-        past_reservations = past_reservations[:int(past_limit)]
-
-
+    try:
+        if hist_start_date:
+            conditions += ' AND c.checked_out_ts >= ?'
+            params.append(local_day_start_ts(hist_start_date))
+        if hist_end_date:
+            conditions += ' AND c.checked_out_ts < ?'
+            params.append(local_day_start_ts(hist_end_date, days=1))
+        if hist_fob_id:
+            conditions += ' AND kf.id = ?'
+            params.append(int(hist_fob_id))
+        if hist_user_id:
+            conditions += ' AND u.id = ?'
+            params.append(int(hist_user_id))
+        if cursor:
+            after_ts, after_id = cursor.split('.')
+            if after_ts == 'undated':
+                conditions += HISTORY_AFTER_UNDATED_SQL
+                params.append(int(after_id))
+            else:
+                conditions += HISTORY_AFTER_SQL
+                params.extend([int(after_ts), int(after_id)])
+    except ValueError:
+        return {'error': 'Invalid filter or cursor'}, 400
     
-    # Filter and format past reservation datetimes
-    past_reservations = []
-    for res in past_reservations_raw:
-        res_dict = dict(res)
-        if res_dict['reserved_datetime']:
-            try:
-                dt = datetime.fromisoformat(res_dict['reserved_datetime'])
-                # Only include past reservations
-                if dt <= now:
-                    if dt.tzinfo is not None:
-                        dt = dt.astimezone(chicago_tz)
-                    res_dict['reserved_datetime'] = dt.strftime('%a, %b %d at %I:%M %p')
-                    past_reservations.append(res_dict)
-            except:
-                pass
+    # Fetch one extra row to know whether another page exists
+    params.append(limit + 1)
     
-    return render_template('admin.html', users=users, fobs=fobs, history=history, 
-                          reservations=reservations, past_reservations=past_reservations)
-
+    with get_db() as conn:
+        rows = conn.execute(HISTORY_PAGE_SQL.format(conditions=conditions), params).fetchall()
     
-    conn.close()
+    entries = format_rows(rows[:limit], {'checked_out_at': ADMIN_TIME_FORMAT,
+                                         'checked_in_at': ADMIN_TIME_FORMAT})
     
-    return render_template('admin.html', users=users, fobs=fobs, history=history, reservations=reservations)
+    return {
+        'entries': entries,
+        'next_cursor': _history_cursor(rows[limit - 1]) if len(rows) > limit else None,
+    }
 
 @app.route('/admin/user/deactivate/<int:user_id>')
 def deactivate_user(user_id):
@@ -1865,6 +1874,7 @@ def deactivate_user(user_id):
     conn.execute('UPDATE users SET is_active = 0 WHERE id = ?', (user_id,))
     conn.commit()
     conn.close()
+    directory_changed(user_ids=[user_id])
     
     return redirect(url_for('admin_dashboard'))
 
@@ -1878,6 +1888,7 @@ def activate_user(user_id):
     conn.execute('UPDATE users SET is_active = 1 WHERE id = ?', (user_id,))
     conn.commit()
     conn.close()
+    directory_changed(user_ids=[user_id])
     
     return redirect(url_for('admin_dashboard'))
 
@@ -1891,6 +1902,8 @@ def deactivate_fob(fob_id):
     conn.execute('UPDATE key_fobs SET is_active = 0 WHERE id = ?', (fob_id,))
     conn.commit()
     conn.close()
+    status_model.refresh_fobs([fob_id])
+    directory_changed(fob_ids=[fob_id])
     
     return redirect(url_for('admin_dashboard'))
 
@@ -1904,6 +1917,8 @@ def activate_fob(fob_id):
     conn.execute('UPDATE key_fobs SET is_active = 1 WHERE id = ?', (fob_id,))
     conn.commit()
     conn.close()
+    status_model.refresh_fobs([fob_id])
+    directory_changed(fob_ids=[fob_id])
     
     return redirect(url_for('admin_dashboard'))
 
@@ -1918,7 +1933,6 @@ def admin_mark_unavailable(fob_id):
     
     if request.method == 'POST':
         reason = request.form.get('reason', '').strip()
-        chicago_tz = pytz.timezone('America/Chicago')
         
         conn.execute('UPDATE key_fobs SET is_available = 0 WHERE id = ?', (fob_id,))
         
@@ -1932,11 +1946,11 @@ def admin_mark_unavailable(fob_id):
         conn.execute('''
             INSERT INTO notes (fob_id, note_text, created_at)
             VALUES (?, ?, ?)
-        ''', (fob_id, f'UNAVAILABLE: {full_reason}', datetime.now(chicago_tz).isoformat()))
+        ''', (fob_id, f'UNAVAILABLE: {full_reason}', local_now().isoformat()))
         
         conn.commit()
         conn.close()
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         return redirect(url_for('admin_dashboard'))
     
     conn.close()
@@ -1955,7 +1969,7 @@ def admin_mark_available(fob_id):
     conn.commit()
     conn.close()
     
-    socketio.emit('status_update', get_current_status())
+    broadcast_status(fob_id)
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/admin/fob/barns_transfer/<int:fob_id>')
@@ -1964,7 +1978,6 @@ def admin_barns_transfer(fob_id):
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     try:
@@ -1982,6 +1995,7 @@ def admin_barns_transfer(fob_id):
             barns_user = conn.execute(
                 'SELECT * FROM users WHERE card_id = ? COLLATE NOCASE', ('BARNS',)
             ).fetchone()
+            directory_changed(user_ids=[barns_user['id']])
         
         # Check current checkout status
         current_checkout = conn.execute(
@@ -1991,19 +2005,19 @@ def admin_barns_transfer(fob_id):
         if current_checkout:
             conn.execute(
                 'UPDATE checkouts SET checked_in_at = ? WHERE id = ?',
-                (datetime.now(chicago_tz).isoformat(), current_checkout['id'])
+                (local_now().isoformat(), current_checkout['id'])
             )
         
         # Check out to The Barns
         conn.execute(
             'INSERT INTO checkouts (user_id, fob_id, kiosk_id, checked_out_at) VALUES (?, ?, ?, ?)',
-            (barns_user['id'], fob_id, 'admin', datetime.now(chicago_tz).isoformat())
+            (barns_user['id'], fob_id, 'admin', local_now().isoformat())
         )
         
         conn.commit()
         conn.close()
         
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         return redirect(url_for('admin_dashboard') + '#fobs')
         
     except Exception as e:
@@ -2016,9 +2030,6 @@ def api_inspections():
     if not session.get('admin'):
         return {'error': 'Unauthorized'}, 401
     
-    conn = get_db()
-    chicago_tz = pytz.timezone('America/Chicago')
-    
     inspection_type = request.args.get('type', 'cleanliness')
     fob_id = request.args.get('fob_id')
     start_date = request.args.get('start_date')
@@ -2034,33 +2045,27 @@ def api_inspections():
     '''
     params = []
     
-    if fob_id:
-        query += ' AND i.fob_id = ?'
-        params.append(fob_id)
-    if start_date:
-        query += ' AND date(i.inspected_at) >= ?'
-        params.append(start_date)
-    if end_date:
-        query += ' AND date(i.inspected_at) <= ?'
-        params.append(end_date)
-    
-    query += ' ORDER BY i.inspected_at DESC LIMIT 200'
+    try:
+        if fob_id:
+            query += ' AND i.fob_id = ?'
+            params.append(int(fob_id))
+        if start_date:
+            query += ' AND i.inspected_ts >= ?'
+            params.append(local_day_start_ts(start_date))
+        if end_date:
+            query += ' AND i.inspected_ts < ?'
+            params.append(local_day_start_ts(end_date, days=1))
+    except ValueError:
+        return {'error': 'Invalid filter'}, 400
+    
+    query += ' ORDER BY i.inspected_ts DESC LIMIT 200'
     
+    conn = get_db()
     rows = conn.execute(query, params).fetchall()
     conn.close()
     
     result = []
-    for row in rows:
-        r = dict(row)
-        if r['inspected_at']:
-            try:
-                dt = datetime.fromisoformat(r['inspected_at'])
-                if dt.tzinfo is not None:
-                    dt = dt.astimezone(chicago_tz)
-                r['inspected_at'] = dt.strftime('%Y-%m-%d %I:%M %p')
-            except:
-                pass
-        
+    for r in format_rows(rows, {'inspected_at': '%Y-%m-%d %I:%M %p'}, naive='keep'):
         # For quarterly, count issues (fields that are 0 but should be 1)
         if inspection_type == 'quarterly':
             issue_fields = [
@@ -2093,7 +2098,6 @@ def view_inspection(inspection_type, inspection_id):
         return redirect(url_for('admin_login'))
     
     conn = get_db()
-    chicago_tz = pytz.timezone('America/Chicago')
     
     table = 'cleanliness_inspections' if inspection_type == 'cleanliness' else 'quarterly_inspections'
     row = conn.execute(f'''
@@ -2107,145 +2111,199 @@ def view_inspection(inspection_type, inspection_id):
     if not row:
         return "Inspection not found", 404
     
-    r = dict(row)
-    if r['inspected_at']:
-        try:
-            dt = datetime.fromisoformat(r['inspected_at'])
-            if dt.tzinfo is not None:
-                dt = dt.astimezone(chicago_tz)
-            r['inspected_at'] = dt.strftime('%A, %B %d, %Y at %I:%M %p')
-        except:
-            pass
+    r, = format_rows([row], {'inspected_at': '%A, %B %d, %Y at %I:%M %p'}, naive='keep')
     
     return render_template('inspection_detail.html', inspection=r, inspection_type=inspection_type)
 
+# Export column spec per inspection type: (CSV header, column, format).
+# Only these columns are selected; 'yes_no' renders a checkbox column.
+INSPECTION_EXPORT_COLUMNS = {
+    'cleanliness': [
+        ('Exterior Clean', 'exterior_clean', 'yes_no'),
+        ('Interior Vacuumed', 'interior_vacuumed', 'yes_no'),
+        ('Dashboard', 'wiped_dashboard', 'yes_no'),
+        ('Center Console', 'wiped_center_console', 'yes_no'),
+        ('Windows', 'wiped_windows', 'yes_no'),
+        ('Interior Doors', 'wiped_interior_doors', 'yes_no'),
+        ('Backseats', 'wiped_backseats', 'yes_no'),
+        ('Keyboard/MDC', 'wiped_keyboard_mdc', 'yes_no'),
+    ],
+    'quarterly': [
+        ('Registration Current', 'registration_current', 'yes_no'),
+        ('Tires Inflated', 'tires_inflated', 'yes_no'),
+        ('Compartment Clean', 'compartment_clean', 'yes_no'),
+        ('Light Bar Working', 'light_bar_working', 'yes_no'),
+        ('MDC Working', 'mdc_working', 'yes_no'),
+        ('Radio Working', 'radio_working', 'yes_no'),
+        ('RADAR Working', 'radar_working', 'yes_no'),
+        ('Scanner Working', 'scanner_working', 'yes_no'),
+        ('AXON Camera', 'axon_camera_working', 'yes_no'),
+        ('Spotlight', 'spotlight_working', 'yes_no'),
+        ('Seat Belts', 'seatbelts_working', 'yes_no'),
+        ('Headlights', 'headlights_working', 'yes_no'),
+        ('Trunk Clean', 'trunk_clean', 'yes_no'),
+        ('Spare Tire', 'spare_tire_inflated', 'yes_no'),
+        ('AR-15', 'ar15_present', 'yes_no'),
+        ('Backpack', 'backpack_present', 'yes_no'),
+        ('Phone Charger', 'phone_charger_present', 'yes_no'),
+        ('Evidence Bag', 'evidence_bag_present', 'yes_no'),
+        ('AED', 'aed_present', 'yes_no'),
+        ('Tuning Forks', 'tuning_forks_present', 'yes_no'),
+        ('Ice Scraper', 'ice_scraper_present', 'yes_no'),
+        ('FA: Large Gloves', 'firstaid_large_gloves', 'yes_no'),
+        ('FA: Cloth Tape', 'firstaid_cloth_tape', 'yes_no'),
+        ('FA: Trauma Shears', 'firstaid_trauma_shears', 'yes_no'),
+        ('FA: Bandaids', 'firstaid_bandaids', 'yes_no'),
+        ('FA: Gauze', 'firstaid_gauze', 'yes_no'),
+        ('FA: Alcohol Prep', 'firstaid_alcohol_prep', 'yes_no'),
+        ('FA: Tourniquets', 'firstaid_tourniquets', 'yes_no'),
+        ('FA: Chest Seals', 'firstaid_chest_seals', 'yes_no'),
+        ('FA: S-Roll Gauze', 'firstaid_sroll_gauze', 'yes_no'),
+        ('Bio Hazard Kit', 'bio_hazard_kit', 'yes_no'),
+        ('Printer Paper', 'printer_paper', 'yes_no'),
+        ('Tape Measure', 'tape_measure', 'yes_no'),
+        ('Emergency Blanket', 'emergency_blanket', 'yes_no'),
+        ('Fire Extinguisher', 'fire_extinguisher', 'yes_no'),
+        ('Traffic Vest', 'traffic_vest', 'yes_no'),
+        ('RIPP Restraint', 'ripp_restraint', 'yes_no'),
+        ('Red Cone', 'red_cone', 'yes_no'),
+        ('Barrier Tape', 'barrier_tape', 'yes_no'),
+        ('Pet Carrier', 'pet_carrier', 'yes_no'),
+        ('Red Paint', 'red_paint', 'yes_no'),
+        ('Code 100 Mask', 'code100_mask', 'yes_no'),
+        ('Riot Baton', 'riot_baton', 'yes_no'),
+        ('Sani Wipes', 'sani_wipes', 'yes_no'),
+        ('Sharps Container', 'sharps_container', 'yes_no'),
+        ('Stop Sticks', 'stop_sticks', 'yes_no'),
+        ('Water Rescue Bag', 'water_rescue_bag', 'yes_no'),
+        ('Window Punch', 'window_punch', 'yes_no'),
+        ('Spit Hood', 'spit_hood', 'yes_no'),
+        ('Citation Book', 'citation_book', 'yes_no'),
+        ('Parking Ticket Book', 'parking_ticket_book', 'yes_no'),
+    ],
+}
+
+def _stream_csv(header, query, params, to_row, **writer_options):
+    """Yield a CSV export in chunks of EXPORT_CHUNK_ROWS rows, holding one chunk in memory at a time"""
+    from io import StringIO
+    
+    buffer = StringIO()
+    writer = csv.writer(buffer, **writer_options)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    
+    conn = get_db()
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(to_row(row) for row in rows)
+            yield buffer.getvalue()
+            socketio.sleep(0)  # let kiosk requests run between chunks
+    finally:
+        conn.close()
+
+def csv_response(chunks, filename):
+    """Streamed CSV download, gzip-encoded when the client accepts it"""
+    response = Response(chunks, mimetype='text/csv')
+    if 'gzip' in request.accept_encodings:
+        response.response = gzip_chunks(chunks, COMPRESS_LEVEL,
+                                        lambda raw, sent: compression_stats.record('csv', raw, sent))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+def _export_filters(ts_column, start_date, end_date, id_filters=()):
+    """WHERE conditions and params for an export's local date range and exact id matches.
+
+    Raises ValueError on a malformed date or id. Exports call this before they
+    start streaming: once the CSV is under way an error can't become a 400.
+    """
+    conditions = ''
+    params = []
+    if start_date:
+        # Central time, start of day
+        conditions += f' AND {ts_column} >= ?'
+        params.append(local_day_start_ts(start_date))
+    if end_date:
+        # Central time, through the end of the day
+        conditions += f' AND {ts_column} < ?'
+        params.append(local_day_start_ts(end_date, days=1))
+    for column, value in id_filters:
+        if value:
+            conditions += f' AND {column} = ?'
+            params.append(int(value))
+    return conditions, params
+
 @app.route('/admin/export/inspections')
 def export_inspections():
     """Export inspections as CSV"""
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     
-    conn = get_db()
-    chicago_tz = pytz.timezone('America/Chicago')
     
     inspection_type = request.args.get('type', 'cleanliness')
     fob_id = request.args.get('fob_id')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    table = 'cleanliness_inspections' if inspection_type == 'cleanliness' else 'quarterly_inspections'
+    if inspection_type != 'cleanliness':
+        inspection_type = 'quarterly'
+    table = f'{inspection_type}_inspections'
+    columns = INSPECTION_EXPORT_COLUMNS[inspection_type]
     
     query = f'''
-        SELECT i.*, kf.vehicle_name
+        SELECT i.inspected_at, kf.vehicle_name, i.inspector,
+            {', '.join('i.' + field for _, field, _ in columns)},
+            i.comments
         FROM {table} i
         JOIN key_fobs kf ON i.fob_id = kf.id
         WHERE 1=1
     '''
-    params = []
-    
-    if fob_id:
-        query += ' AND i.fob_id = ?'
-        params.append(fob_id)
-    if start_date:
-        query += ' AND date(i.inspected_at) >= ?'
-        params.append(start_date)
-    if end_date:
-        query += ' AND date(i.inspected_at) <= ?'
-        params.append(end_date)
-    
-    query += ' ORDER BY i.inspected_at DESC'
-    
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    
-    import csv
-    from io import StringIO
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    if inspection_type == 'cleanliness':
-        writer.writerow(['Date', 'Vehicle', 'Inspector', 'Exterior Clean',
-                        'Interior Vacuumed', 'Dashboard', 'Center Console',
-                        'Windows', 'Interior Doors', 'Backseats', 'Keyboard/MDC', 'Comments'])
-        for row in rows:
-            r = dict(row)
-            if r['inspected_at']:
-                try:
-                    dt = datetime.fromisoformat(r['inspected_at'])
-                    if dt.tzinfo is not None:
-                        dt = dt.astimezone(chicago_tz)
-                    r['inspected_at'] = dt.strftime('%Y-%m-%d %I:%M %p')
-                except:
-                    pass
-            writer.writerow([
-                r['inspected_at'], r['vehicle_name'], r['inspector'],
-                'Yes' if r['exterior_clean'] else 'No',
-                'Yes' if r['interior_vacuumed'] else 'No',
-                'Yes' if r['wiped_dashboard'] else 'No',
-                'Yes' if r['wiped_center_console'] else 'No',
-                'Yes' if r['wiped_windows'] else 'No',
-                'Yes' if r['wiped_interior_doors'] else 'No',
-                'Yes' if r['wiped_backseats'] else 'No',
-                'Yes' if r['wiped_keyboard_mdc'] else 'No',
-                r['comments'] or ''
-            ])
+    try:
+        conditions, params = _export_filters('i.inspected_ts', start_date, end_date, [('i.fob_id', fob_id)])
+    except ValueError:
+        return {'error': 'Invalid filter'}, 400
+    
+    query += conditions + ' ORDER BY i.inspected_ts DESC'
+    
+    def to_row(row):
+        # One pass over distinct values: parse and render directly rather than fill the shared format cache
+        inspected = parse_timestamp(row['inspected_at'], naive='keep')
+        values = [row['inspected_at'] if inspected is None else render_local(inspected, '%Y-%m-%d %I:%M %p'),
+                  row['vehicle_name'], row['inspector']]
+        for _, field, fmt in columns:
+            values.append(('Yes' if row[field] else 'No') if fmt == 'yes_no' else row[field])
+        values.append(row['comments'] or '')
+        return values
+    
+    header = ['Date', 'Vehicle', 'Inspector'] + [title for title, _, _ in columns] + ['Comments']
+    return csv_response(_stream_csv(header, query, params, to_row), f'{inspection_type}_inspections.csv')
+
+def _history_csv_row(entry):
+    """One export row, with times converted to Central and the checkout duration"""
+    out_dt = parse_timestamp(entry['checked_out_at'])
+    checked_out = entry['checked_out_at'] if out_dt is None else render_local(out_dt, ADMIN_TIME_FORMAT)
+    
+    if entry['checked_in_at']:
+        in_dt = parse_timestamp(entry['checked_in_at'])
+        if in_dt is None or out_dt is None:
+            checked_in = 'Error'
+            duration = 'N/A'
+        else:
+            checked_in = render_local(in_dt, ADMIN_TIME_FORMAT)
+            duration = str(int((in_dt - out_dt).total_seconds() / 60))
     else:
-        writer.writerow(['Date', 'Vehicle', 'Inspector',
-                        'Registration Current', 'Tires Inflated', 'Compartment Clean',
-                        'Light Bar Working', 'MDC Working', 'Radio Working', 'RADAR Working',
-                        'Scanner Working', 'AXON Camera', 'Spotlight', 'Seat Belts',
-                        'Headlights', 'Trunk Clean', 'Spare Tire',
-                        'AR-15', 'Backpack', 'Phone Charger', 'Evidence Bag', 'AED',
-                        'Tuning Forks', 'Ice Scraper',
-                        'FA: Large Gloves', 'FA: Cloth Tape', 'FA: Trauma Shears',
-                        'FA: Bandaids', 'FA: Gauze', 'FA: Alcohol Prep',
-                        'FA: Tourniquets', 'FA: Chest Seals', 'FA: S-Roll Gauze',
-                        'Bio Hazard Kit', 'Printer Paper', 'Tape Measure',
-                        'Emergency Blanket', 'Fire Extinguisher', 'Traffic Vest',
-                        'RIPP Restraint', 'Red Cone', 'Barrier Tape', 'Pet Carrier',
-                        'Red Paint', 'Code 100 Mask', 'Riot Baton', 'Sani Wipes',
-                        'Sharps Container', 'Stop Sticks', 'Water Rescue Bag',
-                        'Window Punch', 'Spit Hood', 'Citation Book', 'Parking Ticket Book',
-                        'Comments'])
-        for row in rows:
-            r = dict(row)
-            if r['inspected_at']:
-                try:
-                    dt = datetime.fromisoformat(r['inspected_at'])
-                    if dt.tzinfo is not None:
-                        dt = dt.astimezone(chicago_tz)
-                    r['inspected_at'] = dt.strftime('%Y-%m-%d %I:%M %p')
-                except:
-                    pass
-            yn = lambda f: 'Yes' if r.get(f) else 'No'
-            writer.writerow([
-                r['inspected_at'], r['vehicle_name'], r['inspector'],
-                yn('registration_current'), yn('tires_inflated'), yn('compartment_clean'),
-                yn('light_bar_working'), yn('mdc_working'), yn('radio_working'), yn('radar_working'),
-                yn('scanner_working'), yn('axon_camera_working'), yn('spotlight_working'),
-                yn('seatbelts_working'), yn('headlights_working'), yn('trunk_clean'), yn('spare_tire_inflated'),
-                yn('ar15_present'), yn('backpack_present'), yn('phone_charger_present'),
-                yn('evidence_bag_present'), yn('aed_present'), yn('tuning_forks_present'), yn('ice_scraper_present'),
-                yn('firstaid_large_gloves'), yn('firstaid_cloth_tape'), yn('firstaid_trauma_shears'),
-                yn('firstaid_bandaids'), yn('firstaid_gauze'), yn('firstaid_alcohol_prep'),
-                yn('firstaid_tourniquets'), yn('firstaid_chest_seals'), yn('firstaid_sroll_gauze'),
-                yn('bio_hazard_kit'), yn('printer_paper'), yn('tape_measure'),
-                yn('emergency_blanket'), yn('fire_extinguisher'), yn('traffic_vest'),
-                yn('ripp_restraint'), yn('red_cone'), yn('barrier_tape'), yn('pet_carrier'),
-                yn('red_paint'), yn('code100_mask'), yn('riot_baton'), yn('sani_wipes'),
-                yn('sharps_container'), yn('stop_sticks'), yn('water_rescue_bag'),
-                yn('window_punch'), yn('spit_hood'), yn('citation_book'), yn('parking_ticket_book'),
-                r['comments'] or ''
-            ])
-    
-    output.seek(0)
-    from flask import Response
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename={inspection_type}_inspections.csv'}
-    )
+        checked_in = 'Still out'
+        duration = ''
+    
+    return [entry['user_name'], entry['card_id'], entry['vehicle_name'], entry['fob_id'],
+            checked_out, checked_in, duration, entry['kiosk_id']]
 
 @app.route('/admin/export/history')
 def export_history():
@@ -2259,8 +2317,6 @@ def export_history():
     fob_id = request.args.get('hist_fob_id') or request.args.get('fob_id')
     user_id = request.args.get('hist_user_id') or request.args.get('user_id')
     
-    conn = get_db()
-    
     # Build query with filters
     query = '''
         SELECT 
@@ -2277,83 +2333,13 @@ def export_history():
         WHERE 1=1
     '''
     
-    params = []
-    
-    chicago_tz = pytz.timezone('America/Chicago')
-    
-    if start_date:
-        # Parse date as Central time (start of day)
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-        start_dt = chicago_tz.localize(start_dt)
-        query += ' AND datetime(c.checked_out_at) >= datetime(?)'
-        params.append(start_dt.isoformat())
-    
-    if end_date:
-        # Parse date as Central time (end of day)
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-        end_dt = chicago_tz.localize(end_dt.replace(hour=23, minute=59, second=59))
-        query += ' AND datetime(c.checked_out_at) <= datetime(?)'
-        params.append(end_dt.isoformat())
-    
-    if fob_id:
-        query += ' AND kf.id = ?'
-        params.append(int(fob_id))
-    
-    if user_id:
-        query += ' AND u.id = ?'
-        params.append(int(user_id))
-    
-    
-    query += ' ORDER BY c.checked_out_at DESC'
-    
-
-    history = conn.execute(query, params).fetchall()
-    conn.close()
-    
-    # Build CSV
-    csv_lines = []
-    csv_lines.append("User Name,Card ID,Vehicle,Fob ID,Checked Out,Checked In,Duration (minutes),Kiosk")
-    
-    
-    chicago_tz = pytz.timezone('America/Chicago')
-    
-    for entry in history:
-        # Parse and convert checkout time to Central
-        try:
-            out_dt = datetime.fromisoformat(entry['checked_out_at'])
-            if out_dt.tzinfo is None:
-                out_dt = pytz.UTC.localize(out_dt)
-            out_dt = out_dt.astimezone(chicago_tz)
-            checked_out = out_dt.strftime('%Y-%m-%d %I:%M:%S %p')
-        except:
-            checked_out = entry['checked_out_at']
-        
-        # Parse and convert checkin time to Central
-        if entry['checked_in_at']:
-            try:
-                in_dt = datetime.fromisoformat(entry['checked_in_at'])
-                if in_dt.tzinfo is None:
-                    in_dt = pytz.UTC.localize(in_dt)
-                in_dt = in_dt.astimezone(chicago_tz)
-                checked_in = in_dt.strftime('%Y-%m-%d %I:%M:%S %p')
-                
-                # Calculate duration
-                duration_seconds = (in_dt - out_dt).total_seconds()
-                duration = str(int(duration_seconds / 60))
-            except:
-                checked_in = 'Error'
-                duration = 'N/A'
-        else:
-            checked_in = 'Still out'
-            duration = ''
-        
-        csv_lines.append(f'"{entry["user_name"]}","{entry["card_id"]}","{entry["vehicle_name"]}","{entry["fob_id"]}","{checked_out}","{checked_in}","{duration}","{entry["kiosk_id"]}"')
-    
-    csv_content = '\n'.join(csv_lines)
+    try:
+        conditions, params = _export_filters('c.checked_out_ts', start_date, end_date,
+                                             [('kf.id', fob_id), ('u.id', user_id)])
+    except ValueError:
+        return {'error': 'Invalid filter'}, 400
     
-    # Create response with CSV
-    response = make_response(csv_content)
-    response.headers['Content-Type'] = 'text/csv'
+    query += conditions + ' ORDER BY c.checked_out_ts DESC'
     
     # Add filter info to filename
     filename_parts = ['checkout_history']
@@ -2361,9 +2347,10 @@ def export_history():
         filename_parts.append(f'{start_date or "start"}_to_{end_date or "end"}')
     filename_parts.append(datetime.now().strftime("%Y%m%d_%H%M%S"))
     
-    response.headers['Content-Disposition'] = f'attachment; filename={"-".join(filename_parts)}.csv'
-    
-    return response
+    header = ['User Name', 'Card ID', 'Vehicle', 'Fob ID', 'Checked Out', 'Checked In', 'Duration (minutes)', 'Kiosk']
+    chunks = _stream_csv(header, query, params, _history_csv_row,
+                         quoting=csv.QUOTE_ALL, lineterminator='\n')
+    return csv_response(chunks, f'{"-".join(filename_parts)}.csv')
 
 @app.route('/admin/user/add', methods=['POST'])
 def add_user():
@@ -2377,9 +2364,10 @@ def add_user():
     
     conn = get_db()
     try:
-        conn.execute('INSERT INTO users (card_id, first_name, last_name) VALUES (?, ?, ?)',
-                    (card_id, first_name, last_name))
+        cursor = conn.execute('INSERT INTO users (card_id, first_name, last_name) VALUES (?, ?, ?)',
+                              (card_id, first_name, last_name))
         conn.commit()
+        directory_changed(user_ids=[cursor.lastrowid])
     except:
         pass  # Card ID already exists, ignore
     conn.close()
@@ -2399,9 +2387,11 @@ def add_fob():
     
     conn = get_db()
     try:
-        conn.execute('INSERT INTO key_fobs (fob_id, vehicle_name, category, location) VALUES (?, ?, ?, ?)',
-                    (fob_id, vehicle_name, category, location))
+        cursor = conn.execute('INSERT INTO key_fobs (fob_id, vehicle_name, sort_key, category, location) VALUES (?, ?, ?, ?, ?)',
+                    (fob_id, vehicle_name, natural_sort_key(vehicle_name), category, location))
         conn.commit()
+        status_model.refresh_fobs([cursor.lastrowid])
+        directory_changed(fob_ids=[cursor.lastrowid])
     except:
         pass  # Fob ID already exists, ignore
     conn.close()
@@ -2424,6 +2414,8 @@ def edit_user(user_id):
                     (first_name, last_name, user_id))
         conn.commit()
         conn.close()
+        status_model.refresh_users([user_id])
+        directory_changed(user_ids=[user_id])
         return redirect(url_for('admin_dashboard') + '#users')
     
     user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
@@ -2446,10 +2438,12 @@ def edit_fob(fob_id):
         model = request.form.get('model') or None
         year = request.form.get('year') or None
         
-        conn.execute('UPDATE key_fobs SET vehicle_name = ?, category = ?, location = ?, make = ?, model = ?, year = ? WHERE id = ?',
-                    (vehicle_name, category, location, make, model, year, fob_id))
+        conn.execute('UPDATE key_fobs SET vehicle_name = ?, sort_key = ?, category = ?, location = ?, make = ?, model = ?, year = ? WHERE id = ?',
+                    (vehicle_name, natural_sort_key(vehicle_name), category, location, make, model, year, fob_id))
         conn.commit()
         conn.close()
+        status_model.refresh_fobs([fob_id])
+        directory_changed(fob_ids=[fob_id])
         return redirect(url_for('admin_dashboard') + '#fobs')
     
     fob = conn.execute('SELECT * FROM key_fobs WHERE id = ?', (fob_id,)).fetchone()
@@ -2481,6 +2475,7 @@ def add_assignment(fob_id):
         )
         conn.commit()
         conn.close()
+        status_model.refresh_fobs([fob_id])  # vehicle details list assignments
     
     return redirect(f'/admin/fob/edit/{fob_id}#assignments')
 
@@ -2494,6 +2489,7 @@ def delete_assignment(assignment_id, fob_id):
     conn.execute('DELETE FROM vehicle_assignments WHERE id = ?', (assignment_id,))
     conn.commit()
     conn.close()
+    status_model.refresh_fobs([fob_id])
     
     return redirect(f'/admin/fob/edit/{fob_id}#assignments')
 
@@ -2514,6 +2510,7 @@ def replace_user(user_id):
                     (new_card_id, user_id))
         conn.commit()
         conn.close()
+        directory_changed(user_ids=[user_id])
         return redirect(url_for('admin_dashboard') + '#users')
     
     conn.close()
@@ -2549,6 +2546,8 @@ def replace_fob(fob_id):
                         (new_fob_id, fob_id))
             conn.commit()
             conn.close()
+            status_model.refresh_fobs([fob_id])
+            directory_changed(fob_ids=[fob_id])
             return redirect(url_for('admin_dashboard') + '#fobs')
         except Exception as e:
             conn.close()
@@ -2562,6 +2561,83 @@ def replace_fob(fob_id):
     conn.close()
     return render_template('replace_fob.html', fob=fob)
 
+def find_reservation_conflicts(conn, fob_ids, start_ts, end_ts=None, exclude_id=None):
+    """Existing reservations on any of `fob_ids` (int key_fobs.ids) that overlap [start_ts, end_ts)"""
+    if not fob_ids:
+        return []
+    if end_ts is None:
+        end_ts = start_ts + RESERVATION_POINT_SECONDS
+    query = RESERVATION_CONFLICTS_SQL.format(placeholders=','.join('?' * len(fob_ids)))
+    params = list(fob_ids) + [start_ts, end_ts, exclude_id]
+    
+    conflicts = format_rows(conn.execute(query, params).fetchall(),
+                            {'reserved_datetime': '%a, %b %d at %I:%M %p', 'end_datetime': '%a, %b %d at %I:%M %p'})
+    for conflict in conflicts:
+        conflict['reserved_for'] = (f"{conflict['first_name']} {conflict['last_name']}" if conflict['first_name']
+                                    else conflict['reserved_for_name'])
+    return conflicts
+
+@app.route('/admin/api/reservations/available')
+def api_available_fobs():
+    """Active fobs with no reservation overlapping the requested window, best candidates first"""
+    if not session.get('admin'):
+        return {'error': 'Unauthorized'}, 401
+    
+    try:
+        start = localize(datetime.strptime(request.args['start'], '%Y-%m-%dT%H:%M'))
+        end = request.args.get('end')
+        end = localize(datetime.strptime(end, '%Y-%m-%dT%H:%M')) if end else None
+    except (KeyError, ValueError):
+        return {'error': 'start (and optional end) must be YYYY-MM-DDTHH:MM'}, 400
+    start_ts = int(start.timestamp())
+    end_ts = int(end.timestamp()) if end else start_ts + RESERVATION_POINT_SECONDS
+    if end_ts <= start_ts:
+        return {'error': 'end must be after start'}, 400
+    
+    query = f'''
+        SELECT kf.id, kf.vehicle_name, kf.sort_key, kf.category, kf.is_available, c.id as checkout_id,
+               (SELECT MIN(n.reserved_ts) FROM reservations n
+                WHERE n.fob_id = kf.id AND n.reserved_ts >= ?) as next_reserved_ts
+        FROM key_fobs kf
+        LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
+        WHERE kf.is_active = 1
+          AND NOT EXISTS (
+              SELECT 1 FROM reservations r
+              WHERE r.fob_id = kf.id AND {RESERVATION_UNTIL_SQL} > ? AND r.reserved_ts < ?
+          )
+    '''
+    params = [end_ts, start_ts, end_ts]
+    category = request.args.get('category')
+    if category:
+        query += ' AND kf.category = ?'
+        params.append(category)
+    
+    with get_db() as conn:
+        rows = conn.execute(query, params).fetchall()
+    
+    # Prefer items that are in service and on the board now, then the ones
+    # that stay free longest after the window so the reservation can run over
+    def rank(row):
+        free_after = (row['next_reserved_ts'] - end_ts) if row['next_reserved_ts'] else float('inf')
+        return (not row['is_available'], row['checkout_id'] is not None, -free_after,
+                row['sort_key'] or '')
+    
+    fobs = []
+    for row in sorted(rows, key=rank):
+        fob = {
+            'id': row['id'],
+            'vehicle_name': row['vehicle_name'],
+            'category': row['category'],
+            'is_available': bool(row['is_available']),
+            'checked_out': row['checkout_id'] is not None,
+            'free_until': None,
+        }
+        if row['next_reserved_ts']:
+            free_until = datetime.fromtimestamp(row['next_reserved_ts'], LOCAL_TZ)
+            fob['free_until'] = free_until.strftime('%a, %b %d at %I:%M %p')
+        fobs.append(fob)
+    return {'fobs': fobs}
+
 @app.route('/admin/fob/reserve/<int:fob_id>', methods=['GET', 'POST'])
 def reserve_fob(fob_id):
     """Create a reservation for a fob"""
@@ -2581,20 +2657,27 @@ def reserve_fob(fob_id):
         created_by = session.get('username', 'admin')
         
         # Convert datetime to Central time
-        chicago_tz = pytz.timezone('America/Chicago')
         dt = datetime.strptime(reserved_datetime, '%Y-%m-%dT%H:%M')
-        dt = chicago_tz.localize(dt)
+        dt = localize(dt)
         
         # Convert end_datetime if provided
         end_dt_iso = None
         if end_datetime:
             try:
                 end_dt = datetime.strptime(end_datetime, '%Y-%m-%dT%H:%M')
-                end_dt = chicago_tz.localize(end_dt)
+                end_dt = localize(end_dt)
                 end_dt_iso = end_dt.isoformat()
             except:
                 pass
         
+        # Warn about overlapping reservations before saving; the admin can still override
+        end_ts = int(datetime.fromisoformat(end_dt_iso).timestamp()) if end_dt_iso else None
+        conflicts = find_reservation_conflicts(conn, [fob_id], int(dt.timestamp()), end_ts)
+        if conflicts and request.form.get('on_conflict') != 'force':
+            users = conn.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY last_name, first_name').fetchall()
+            conn.close()
+            return render_template('reserve_fob.html', fob=fob, users=users, conflicts=conflicts)
+        
         conn.execute('''
             INSERT INTO reservations (fob_id, user_id, reserved_for_name, reserved_datetime, display_hours_before, reason, created_by, end_datetime)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -2603,7 +2686,7 @@ def reserve_fob(fob_id):
         conn.close()
         
         # Broadcast update
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         return redirect(url_for('admin_dashboard') + '#reservations')
     
     users = conn.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY last_name, first_name').fetchall()
@@ -2616,11 +2699,16 @@ def new_reservation():
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
+    error = None
     if request.method == 'POST':
-        fob_id = request.form.get('fob_id')
+        try:
+            fob_id = int(request.form.get('fob_id', ''))
+        except ValueError:
+            error = 'Select a valid item to reserve'
+    
+    if request.method == 'POST' and error is None:
         user_id = request.form.get('user_id') or None
         reserved_for_name = request.form.get('reserved_for_name')
         reserved_datetime = request.form.get('reserved_datetime')
@@ -2630,17 +2718,28 @@ def new_reservation():
         created_by = session.get('username', 'admin')
         
         dt = datetime.strptime(reserved_datetime, '%Y-%m-%dT%H:%M')
-        dt = chicago_tz.localize(dt)
+        dt = localize(dt)
         
         end_dt_iso = None
         if end_datetime:
             try:
                 end_dt = datetime.strptime(end_datetime, '%Y-%m-%dT%H:%M')
-                end_dt = chicago_tz.localize(end_dt)
+                end_dt = localize(end_dt)
                 end_dt_iso = end_dt.isoformat()
             except:
                 pass
         
+        # Warn about overlapping reservations before saving; the admin can still override
+        end_ts = int(datetime.fromisoformat(end_dt_iso).timestamp()) if end_dt_iso else None
+        conflicts = find_reservation_conflicts(conn, [fob_id], int(dt.timestamp()), end_ts)
+        if conflicts and request.form.get('on_conflict') != 'force':
+            fobs = conn.execute('''
+                SELECT * FROM key_fobs WHERE is_active = 1 ORDER BY category, sort_key
+            ''').fetchall()
+            users = conn.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY last_name, first_name').fetchall()
+            conn.close()
+            return render_template('new_reservation.html', fobs=fobs, users=users, conflicts=conflicts)
+        
         conn.execute('''
             INSERT INTO reservations (fob_id, user_id, reserved_for_name, reserved_datetime,
                 end_datetime, display_hours_before, reason, created_by)
@@ -2650,15 +2749,15 @@ def new_reservation():
         conn.commit()
         conn.close()
         
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
         return redirect(url_for('admin_dashboard') + '#reservations')
     
     fobs = conn.execute('''
-        SELECT * FROM key_fobs WHERE is_active = 1 ORDER BY category, vehicle_name
+        SELECT * FROM key_fobs WHERE is_active = 1 ORDER BY category, sort_key
     ''').fetchall()
     users = conn.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY last_name, first_name').fetchall()
     conn.close()
-    return render_template('new_reservation.html', fobs=fobs, users=users)
+    return render_template('new_reservation.html', fobs=fobs, users=users, error=error)
 
 @app.route('/admin/reservation/bulk', methods=['GET', 'POST'])
 def bulk_reserve():
@@ -2666,11 +2765,16 @@ def bulk_reserve():
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
+    error = None
     if request.method == 'POST':
-        fob_ids = request.form.getlist('fob_ids')
+        try:
+            fob_ids = [int(f) for f in request.form.getlist('fob_ids')]
+        except ValueError:
+            error = 'One of the selected items is not valid'
+    
+    if request.method == 'POST' and error is None:
         user_id = request.form.get('user_id') or None
         reserved_for_name = request.form.get('reserved_for_name')
         reserved_datetime = request.form.get('reserved_datetime')
@@ -2684,29 +2788,48 @@ def bulk_reserve():
             return redirect(url_for('bulk_reserve'))
         
         dt = datetime.strptime(reserved_datetime, '%Y-%m-%dT%H:%M')
-        dt = chicago_tz.localize(dt)
+        dt = localize(dt)
         
         end_dt_iso = None
         if end_datetime:
             try:
                 end_dt = datetime.strptime(end_datetime, '%Y-%m-%dT%H:%M')
-                end_dt = chicago_tz.localize(end_dt)
+                end_dt = localize(end_dt)
                 end_dt_iso = end_dt.isoformat()
             except:
                 pass
         
+        # Report overlaps before inserting anything; the admin can skip those items or override
+        end_ts = int(datetime.fromisoformat(end_dt_iso).timestamp()) if end_dt_iso else None
+        conflicts = find_reservation_conflicts(conn, fob_ids, int(dt.timestamp()), end_ts)
+        on_conflict = request.form.get('on_conflict')
+        if conflicts and on_conflict not in ('skip', 'force'):
+            fobs = conn.execute('''
+                SELECT kf.*, c.id as checkout_id
+                FROM key_fobs kf
+                LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
+                WHERE kf.is_active = 1
+                ORDER BY kf.category, kf.sort_key
+            ''').fetchall()
+            users = conn.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY last_name, first_name').fetchall()
+            conn.close()
+            return render_template('bulk_reserve.html', fobs=fobs, users=users, conflicts=conflicts)
+        if on_conflict == 'skip':
+            conflicting = {c['fob_id'] for c in conflicts}
+            fob_ids = [f for f in fob_ids if f not in conflicting]
+        
         for fob_id in fob_ids:
             conn.execute('''
                 INSERT INTO reservations (fob_id, user_id, reserved_for_name, reserved_datetime, 
                     end_datetime, display_hours_before, reason, created_by)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (int(fob_id), user_id, reserved_for_name, dt.isoformat(),
+            ''', (fob_id, user_id, reserved_for_name, dt.isoformat(),
                    end_dt_iso, display_hours_before, reason, created_by))
         
         conn.commit()
         conn.close()
         
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(*fob_ids)
         return redirect(url_for('admin_dashboard') + '#reservations')
     
     fobs = conn.execute('''
@@ -2714,11 +2837,11 @@ def bulk_reserve():
         FROM key_fobs kf
         LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
         WHERE kf.is_active = 1
-        ORDER BY kf.category, kf.vehicle_name
+        ORDER BY kf.category, kf.sort_key
     ''').fetchall()
     users = conn.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY last_name, first_name').fetchall()
     conn.close()
-    return render_template('bulk_reserve.html', fobs=fobs, users=users)
+    return render_template('bulk_reserve.html', fobs=fobs, users=users, error=error)
 
 @app.route('/admin/reservation/edit/<int:reservation_id>', methods=['GET', 'POST'])
 def edit_reservation(reservation_id):
@@ -2726,7 +2849,6 @@ def edit_reservation(reservation_id):
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     
-    chicago_tz = pytz.timezone('America/Chicago')
     conn = get_db()
     
     res_raw = conn.execute('''
@@ -2749,17 +2871,30 @@ def edit_reservation(reservation_id):
         reason = request.form.get('reason')
         
         dt = datetime.strptime(reserved_datetime, '%Y-%m-%dT%H:%M')
-        dt = chicago_tz.localize(dt)
+        dt = localize(dt)
         
         end_dt_iso = None
         if end_datetime:
             try:
                 end_dt = datetime.strptime(end_datetime, '%Y-%m-%dT%H:%M')
-                end_dt = chicago_tz.localize(end_dt)
+                end_dt = localize(end_dt)
                 end_dt_iso = end_dt.isoformat()
             except:
                 pass
         
+        # Same overlap warning as a new reservation, ignoring the one being edited
+        end_ts = int(datetime.fromisoformat(end_dt_iso).timestamp()) if end_dt_iso else None
+        conflicts = find_reservation_conflicts(conn, [res_raw['fob_id']], int(dt.timestamp()), end_ts,
+                                               exclude_id=reservation_id)
+        if conflicts and request.form.get('on_conflict') != 'force':
+            # Show the submitted values again rather than the stored ones
+            res = dict(res_raw, user_id=int(user_id) if user_id else None, reserved_for_name=reserved_for_name,
+                       reserved_datetime_input=reserved_datetime, end_datetime_input=end_datetime,
+                       display_hours_before=display_hours_before, reason=reason)
+            users = conn.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY last_name, first_name').fetchall()
+            conn.close()
+            return render_template('edit_reservation.html', res=res, users=users, conflicts=conflicts)
+        
         conn.execute('''
             UPDATE reservations 
             SET user_id=?, reserved_for_name=?, reserved_datetime=?, end_datetime=?,
@@ -2770,29 +2905,14 @@ def edit_reservation(reservation_id):
         conn.commit()
         conn.close()
         
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(res_raw['fob_id'])
         return redirect(url_for('admin_dashboard') + '#reservations')
     
     # Format datetimes for input fields
     res = dict(res_raw)
-    try:
-        dt = datetime.fromisoformat(res['reserved_datetime'])
-        if dt.tzinfo is not None:
-            dt = dt.astimezone(chicago_tz)
-        res['reserved_datetime_input'] = dt.strftime('%Y-%m-%dT%H:%M')
-    except:
-        res['reserved_datetime_input'] = res['reserved_datetime']
-    
-    if res.get('end_datetime'):
-        try:
-            end_dt = datetime.fromisoformat(res['end_datetime'])
-            if end_dt.tzinfo is not None:
-                end_dt = end_dt.astimezone(chicago_tz)
-            res['end_datetime_input'] = end_dt.strftime('%Y-%m-%dT%H:%M')
-        except:
-            res['end_datetime_input'] = res['end_datetime']
-    else:
-        res['end_datetime_input'] = ''
+    res['reserved_datetime_input'] = format_local(res['reserved_datetime'], '%Y-%m-%dT%H:%M', naive='keep')
+    res['end_datetime_input'] = (format_local(res['end_datetime'], '%Y-%m-%dT%H:%M', naive='keep')
+                                 if res.get('end_datetime') else '')
     
     users = conn.execute('SELECT * FROM users WHERE is_active = 1 ORDER BY last_name, first_name').fetchall()
     conn.close()
@@ -2805,12 +2925,13 @@ def delete_reservation(reservation_id):
         return redirect(url_for('admin_login'))
     
     conn = get_db()
+    res = conn.execute('SELECT fob_id FROM reservations WHERE id = ?', (reservation_id,)).fetchone()
     conn.execute('DELETE FROM reservations WHERE id = ?', (reservation_id,))
     conn.commit()
     conn.close()
     
     # Broadcast update
-    socketio.emit('status_update', get_current_status())
+    broadcast_status(res['fob_id'] if res else None)
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/admin/fob/barcode/<int:fob_id>')
@@ -2967,7 +3088,6 @@ def add_note(fob_id):
         expires_at = request.form.get('expires_at')  # Get expiration from form
         created_by = session.get('username', 'admin')
         
-        chicago_tz = pytz.timezone('America/Chicago')
         
         # Convert expires_at to Chicago timezone if provided
         expires_at_iso = None
@@ -2976,7 +3096,7 @@ def add_note(fob_id):
                 # Parse the datetime-local input (format: YYYY-MM-DDTHH:MM)
                 dt = datetime.strptime(expires_at, '%Y-%m-%dT%H:%M')
                 # Localize to Chicago timezone
-                dt_chicago = chicago_tz.localize(dt)
+                dt_chicago = localize(dt)
                 expires_at_iso = dt_chicago.isoformat()
             except:
                 pass  # If parsing fails, leave as None
@@ -2988,10 +3108,11 @@ def add_note(fob_id):
         conn.execute('''
             INSERT INTO notes (fob_id, note_text, created_at, created_by, expires_at)
             VALUES (?, ?, ?, ?, ?)
-        ''', (fob_id, note_text, datetime.now(chicago_tz).isoformat(), created_by, expires_at_iso))
+        ''', (fob_id, note_text, local_now().isoformat(), created_by, expires_at_iso))
         
         conn.commit()
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
+        schedule_note_expiry(expires_at_iso)
         conn.close()
         return redirect(url_for('admin_dashboard') + '#fobs')
     
@@ -3007,7 +3128,7 @@ def delete_note(fob_id):
     conn = get_db()
     conn.execute('DELETE FROM notes WHERE fob_id = ?', (fob_id,))
     conn.commit()
-    socketio.emit('status_update', get_current_status())
+    broadcast_status(fob_id)
     conn.close()
     
     return redirect(url_for('admin_dashboard') + '#fobs')
@@ -3027,7 +3148,6 @@ def edit_note(fob_id):
         expires_at = request.form.get('expires_at')  # Optional
         created_by = session.get('username', 'admin')
         
-        chicago_tz = pytz.timezone('America/Chicago')
         
         # Parse expiration if provided
         expiration_iso = None
@@ -3035,7 +3155,7 @@ def edit_note(fob_id):
             try:
                 # Parse datetime string (format: YYYY-MM-DDTHH:MM from HTML datetime-local input)
                 dt = datetime.fromisoformat(expires_at)
-                dt_aware = chicago_tz.localize(dt)
+                dt_aware = localize(dt)
                 expiration_iso = dt_aware.isoformat()
             except:
                 pass
@@ -3047,10 +3167,11 @@ def edit_note(fob_id):
         conn.execute('''
             INSERT INTO notes (fob_id, note_text, created_at, created_by, expires_at)
             VALUES (?, ?, ?, ?, ?)
-        ''', (fob_id, note_text, datetime.now(chicago_tz).isoformat(), created_by, expiration_iso))
+        ''', (fob_id, note_text, local_now().isoformat(), created_by, expiration_iso))
         
         conn.commit()
-        socketio.emit('status_update', get_current_status())
+        broadcast_status(fob_id)
+        schedule_note_expiry(expiration_iso)
         conn.close()
         return redirect(url_for('admin_dashboard') + '#fobs')
     
@@ -3064,34 +3185,52 @@ def expire_note(fob_id):
         return redirect(url_for('admin_login'))
     
     conn = get_db()
-    chicago_tz = pytz.timezone('America/Chicago')
-    now = datetime.now(chicago_tz).isoformat()
+    now = local_now().isoformat()
     
     # Update the note's expiration to now
     conn.execute('UPDATE notes SET expires_at = ? WHERE fob_id = ?', (now, fob_id))
     conn.commit()
-    socketio.emit('status_update', get_current_status())
+    broadcast_status(fob_id)
+    schedule_note_expiry(now)
     conn.close()
     
     return redirect(url_for('admin_dashboard') + '#fobs')
 
 
-# Schedule database compacting weekly
+# Online database maintenance: WAL checkpoint + incremental vacuum
 from threading import Thread
 import time
 
-def compact_db_weekly():
-    """Background task to compact database weekly"""
+DB_MAINTENANCE_INTERVAL = int(os.environ.get('DB_MAINTENANCE_INTERVAL', '300'))  # seconds
+
+def maintain_db_periodically():
+    """Background task to checkpoint the WAL and reclaim free pages without blocking kiosks"""
     while True:
-        time.sleep(604800)  # Sleep for 7 days (in seconds)
+        time.sleep(DB_MAINTENANCE_INTERVAL)
         try:
-            compact_database()
+            maintain_db()
         except Exception as e:
-            print(f"Error compacting database: {e}")
+            print(f"Error during database maintenance: {e}")
 
-# Start background compacting thread
-compact_thread = Thread(target=compact_db_weekly, daemon=True)
-compact_thread.start()
+# Start background maintenance thread
+maintenance_thread = Thread(target=maintain_db_periodically, daemon=True)
+maintenance_thread.start()
+
+STATUS_CHECK_INTERVAL = int(os.environ.get('STATUS_CHECK_INTERVAL', '300'))  # seconds, 0 = admin endpoint only
+
+def check_status_periodically():
+    """Background task to repair board drift from writes that bypassed the status model"""
+    while True:
+        time.sleep(STATUS_CHECK_INTERVAL)
+        try:
+            if status_model.check_consistency(repair=True):
+                broadcaster.request()
+        except Exception as e:
+            print(f"Error during status consistency check: {e}")
+
+if STATUS_CHECK_INTERVAL > 0:
+    status_check_thread = Thread(target=check_status_periodically, daemon=True)
+    status_check_thread.start()
 
 @app.route('/admin/admins')
 def manage_admin_users():
@@ -3103,24 +3242,8 @@ def manage_admin_users():
     admins_raw = conn.execute('SELECT * FROM admin_users ORDER BY username').fetchall()
     conn.close()
     
-    # Convert timestamps to Chicago time
-    chicago_tz = pytz.timezone('America/Chicago')
-    admins = []
-    for admin in admins_raw:
-        admin_dict = dict(admin)
-        if admin_dict.get('created_at'):
-            try:
-                # Parse the UTC timestamp
-                dt = datetime.fromisoformat(admin_dict['created_at'])
-                # If no timezone, assume UTC
-                if dt.tzinfo is None:
-                    dt = pytz.UTC.localize(dt)
-                # Convert to Chicago time
-                dt_chicago = dt.astimezone(chicago_tz)
-                admin_dict['created_at'] = dt_chicago.strftime('%b %d, %Y %H:%M')
-            except:
-                pass  # Keep original if parsing fails
-        admins.append(admin_dict)
+    # created_at is naive UTC from CURRENT_TIMESTAMP
+    admins = format_rows(admins_raw, {'created_at': '%b %d, %Y %H:%M'})
 
     return render_template('manage_admins.html', admins=admins)
 
@@ -3160,6 +3283,10 @@ def delete_admin_user(admin_id):
 # Run migrations on startup
 run_migrations()
 
+# Clear notes that expired while the server was down, load the board and arm both timers
+note_sweeper.run_now()
+board_timer.run_now()
+
 # Start reminder scheduler
 import threading
 def check_reminders():
@@ -3169,9 +3296,9 @@ def check_reminders():
     
     while True:
         try:
-            chicago_tz = pytz.timezone('America/Chicago')
-            now = datetime.now(chicago_tz)
+            now = local_now()
             reminder_date = (now + timedelta(days=7)).strftime('%Y-%m-%d')
+            next_date = (now + timedelta(days=8)).strftime('%Y-%m-%d')
             
             conn = get_db()
             # Find assignments due in 7 days that haven't been completed or reminded
@@ -3179,10 +3306,10 @@ def check_reminders():
                 SELECT ia.*, kf.vehicle_name
                 FROM inspection_assignments ia
                 JOIN key_fobs kf ON ia.fob_id = kf.id
-                WHERE date(ia.due_date) = ?
+                WHERE ia.due_date >= ? AND ia.due_date < ?
                 AND ia.completed_at IS NULL
                 AND ia.reminder_sent = 0
-            ''', (reminder_date,)).fetchall()
+            ''', (reminder_date, next_date)).fetchall()
             
             for assignment in assignments:
                 send_inspection_reminder(
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Benchmark temporal.py against the per-row pytz code it replaced.
+
+Generates synthetic timestamps in both stored shapes (naive UTC from
+CURRENT_TIMESTAMP and Chicago-offset values written by the app), checks that
+the old and new code render them identically, then times:
+
+- history export: checked-out/checked-in rendering and duration per row
+- inspection export: inspected_at rendering per row (naive values kept as stored)
+- admin page: one 500-row list formatted repeatedly with format_rows
+
+Usage: python bench_temporal.py [rows] [page_repeats]   (defaults 100000, 200)
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from temporal import LOCAL_TZ, parse_timestamp, render_local, format_local, format_rows, cache_stats
+
+ADMIN_TIME_FORMAT = '%Y-%m-%d %I:%M:%S %p'
+INSPECTION_FORMAT = '%Y-%m-%d %I:%M %p'
+
+
+def make_rows(count, seed=1):
+    """(checked_out_at, checked_in_at) pairs over a year; about a third naive UTC, a tenth still out"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for _ in range(count):
+        out = start + timedelta(seconds=rng.randrange(365 * 86400))
+        back = out + timedelta(minutes=rng.randrange(5, 600))
+        if rng.random() < 0.33:
+            pair = (out.strftime('%Y-%m-%d %H:%M:%S'), back.strftime('%Y-%m-%d %H:%M:%S'))
+        else:
+            pair = (out.astimezone(LOCAL_TZ).isoformat(), back.astimezone(LOCAL_TZ).isoformat())
+        rows.append(pair if rng.random() > 0.1 else (pair[0], None))
+    return rows
+
+
+# --- the code as it was before temporal.py ---------------------------------
+
+def old_history_times(checked_out_at, checked_in_at):
+    chicago_tz = pytz.timezone('America/Chicago')
+    try:
+        out_dt = datetime.fromisoformat(checked_out_at)
+        if out_dt.tzinfo is None:
+            out_dt = pytz.UTC.localize(out_dt)
+        out_dt = out_dt.astimezone(chicago_tz)
+        checked_out = out_dt.strftime(ADMIN_TIME_FORMAT)
+    except:
+        checked_out = checked_out_at
+    if checked_in_at:
+        try:
+            in_dt = datetime.fromisoformat(checked_in_at)
+            if in_dt.tzinfo is None:
+                in_dt = pytz.UTC.localize(in_dt)
+            in_dt = in_dt.astimezone(chicago_tz)
+            checked_in = in_dt.strftime(ADMIN_TIME_FORMAT)
+            duration = str(int((in_dt - out_dt).total_seconds() / 60))
+        except:
+            checked_in = 'Error'
+            duration = 'N/A'
+    else:
+        checked_in = 'Still out'
+        duration = ''
+    return checked_out, checked_in, duration
+
+
+def old_inspected_at(value):
+    chicago_tz = pytz.timezone('America/Chicago')
+    try:
+        dt = datetime.fromisoformat(value)
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(chicago_tz)
+        return dt.strftime(INSPECTION_FORMAT)
+    except:
+        return value
+
+
+def old_registered_at(rows):
+    chicago_tz = pytz.timezone('America/Chicago')
+    result = []
+    for row in rows:
+        row = dict(row)
+        if row['registered_at']:
+            try:
+                dt = datetime.fromisoformat(row['registered_at'])
+                if dt.tzinfo is None:
+                    dt = pytz.UTC.localize(dt).astimezone(chicago_tz)
+                else:
+                    dt = dt.astimezone(chicago_tz)
+                row['registered_at'] = dt.strftime(ADMIN_TIME_FORMAT)
+            except:
+                pass
+        result.append(row)
+    return result
+
+
+# --- the code as it is now --------------------------------------------------
+
+def new_history_times(checked_out_at, checked_in_at):
+    """The time handling of app._history_csv_row"""
+    out_dt = parse_timestamp(checked_out_at)
+    checked_out = checked_out_at if out_dt is None else render_local(out_dt, ADMIN_TIME_FORMAT)
+    if checked_in_at:
+        in_dt = parse_timestamp(checked_in_at)
+        if in_dt is None or out_dt is None:
+            return checked_out, 'Error', 'N/A'
+        return checked_out, render_local(in_dt, ADMIN_TIME_FORMAT), str(int((in_dt - out_dt).total_seconds() / 60))
+    return checked_out, 'Still out', ''
+
+
+def new_inspected_at(value):
+    """The inspected_at column of app.export_inspections"""
+    dt = parse_timestamp(value, naive='keep')
+    return value if dt is None else render_local(dt, INSPECTION_FORMAT)
+
+
+def cached_inspected_at(value):
+    """The same column through the shared format_local cache, for comparison"""
+    return format_local(value, INSPECTION_FORMAT, naive='keep')
+
+
+def timed(label, fn, baseline=None):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    speedup = f'  {baseline / elapsed:5.2f}x' if baseline else ''
+    print(f'  {label:<34}{elapsed * 1000:10.1f} ms{speedup}')
+    return elapsed, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rows = make_rows(count)
+    inspected = [out for out, _ in rows]
+
+    print(f'History export, {count} rows')
+    base, old = timed('pytz per row (before)', lambda: [old_history_times(*r) for r in rows])
+    _, new = timed('parse_timestamp + render_local', lambda: [new_history_times(*r) for r in rows], base)
+    assert old == new, 'history renderings differ'
+
+    print(f'Inspection export, {count} rows')
+    base, old = timed('pytz per row (before)', lambda: [old_inspected_at(v) for v in inspected])
+    _, new = timed('parse_timestamp + render_local', lambda: [new_inspected_at(v) for v in inspected], base)
+    assert old == new, 'inspection renderings differ'
+    format_local.cache_clear()
+    _, cached = timed('format_local (shared cache)', lambda: [cached_inspected_at(v) for v in inspected], base)
+    assert old == cached, 'cached inspection renderings differ'
+    stats = cache_stats()['format']
+    print(f"    format cache after one export: {stats['currsize']}/{stats['maxsize']} entries, "
+          f"{stats['hits']} hits")
+
+    page = [{'registered_at': out} for out, _ in rows[:500]]
+    print(f'Admin page, 500 rows x {repeats}')
+    base, old = timed('pytz per row (before)', lambda: [old_registered_at(page) for _ in range(repeats)])
+    _, new = timed('format_rows', lambda: [format_rows(page, {'registered_at': ADMIN_TIME_FORMAT})
+                                          for _ in range(repeats)], base)
+    assert old == new, 'admin page renderings differ'
+
+
+if __name__ == '__main__':
+    main()
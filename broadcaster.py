@@ -0,0 +1,56 @@
+"""Coalescing scheduler for dashboard status broadcasts.
+
+One user action can trigger several broadcasts within a few hundred
+milliseconds (a bulk checkout followed by the kiosk's /api/notify, or an
+admin edit that touches several fobs). Broadcast requests made within the
+coalescing window are merged and sent as a single emit.
+"""
+import threading
+
+
+class BroadcastScheduler:
+    """Merge broadcast requests that arrive within `window` seconds into one emit"""
+
+    def __init__(self, send, start_task, sleep, window=0.15):
+        self._send = send              # builds and emits the payload; returns True if it emitted
+        self._start_task = start_task  # socketio.start_background_task
+        self._sleep = sleep            # socketio.sleep
+        self.window = window
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self.stats = {'requests': 0, 'flushes': 0, 'emits': 0, 'emits_saved': 0}
+
+    def request(self):
+        """Ask for a broadcast; returns immediately"""
+        with self._lock:
+            self.stats['requests'] += 1
+            if self._scheduled:
+                self.stats['emits_saved'] += 1
+                return
+            if self.window > 0:
+                self._scheduled = True
+        if self.window > 0:
+            self._start_task(self._flush_later)
+        else:
+            self.flush()
+
+    def _flush_later(self):
+        self._sleep(self.window)
+        with self._lock:
+            self._scheduled = False
+        self.flush()
+
+    def flush(self):
+        """Send whatever is pending now"""
+        with self._lock:
+            self.stats['flushes'] += 1
+        try:
+            emitted = self._send()
+        except Exception as e:
+            print(f"Status broadcast error: {e}")
+            return
+        with self._lock:
+            if emitted:
+                self.stats['emits'] += 1
+            else:
+                self.stats['emits_saved'] += 1
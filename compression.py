@@ -0,0 +1,66 @@
+"""Compression for JSON responses, CSV exports and Socket.IO status frames.
+
+Dashboards on the station Wi-Fi pull the full status board, which is large
+and very repetitive. Payloads under a size threshold are sent as-is because
+the framing overhead outweighs the saving.
+"""
+import gzip
+import threading
+import zlib
+
+
+class CompressionStats:
+    """Bytes before and after compression, per channel ('json', 'csv', 'socket')"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def record(self, channel, raw, sent):
+        """Count one payload; raw == sent means it went uncompressed"""
+        with self._lock:
+            counts = self._channels.setdefault(
+                channel, {'compressed': 0, 'skipped': 0, 'bytes_in': 0, 'bytes_out': 0})
+            if sent == raw:
+                counts['skipped'] += 1
+                return
+            counts['compressed'] += 1
+            counts['bytes_in'] += raw
+            counts['bytes_out'] += sent
+
+    def snapshot(self):
+        """Counters per channel with the compressed/raw ratio"""
+        with self._lock:
+            return {channel: dict(counts, ratio=round(counts['bytes_out'] / counts['bytes_in'], 3)
+                                  if counts['bytes_in'] else None)
+                    for channel, counts in self._channels.items()}
+
+
+def gzip_bytes(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def deflate_bytes(data, level):
+    """zlib-wrapped deflate, what the browser's DecompressionStream('deflate') reads"""
+    return zlib.compress(data, level)
+
+
+def gzip_chunks(chunks, level, done=None):
+    """Compress a stream of text chunks into one gzip stream, flushing per chunk.
+
+    done(raw_bytes, sent_bytes) is called once the stream is exhausted.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    raw = sent = 0
+    for chunk in chunks:
+        chunk = chunk.encode('utf-8')
+        raw += len(chunk)
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            sent += len(data)
+            yield data
+    data = compressor.flush()
+    sent += len(data)
+    yield data
+    if done:
+        done(raw, sent)
@@ -1,15 +1,427 @@
 import sqlite3
 import os
+import re
+import threading
+import time
 from datetime import datetime
 
 DATABASE = os.getenv('DB_PATH', 'key_checkout.db')
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
+# PRAGMAs applied to every new connection
+DB_PRAGMAS = [
+    ('journal_mode', os.getenv('DB_JOURNAL_MODE', 'WAL')),
+    ('synchronous', os.getenv('DB_SYNCHRONOUS', 'NORMAL')),
+    ('cache_size', int(os.getenv('DB_CACHE_SIZE', '-16000'))),      # negative = KiB, so 16 MB
+    ('mmap_size', int(os.getenv('DB_MMAP_SIZE', '268435456'))),     # 256 MB
+    ('busy_timeout', int(os.getenv('DB_BUSY_TIMEOUT', '5000'))),    # ms to wait for a lock
+    ('wal_autocheckpoint', int(os.getenv('DB_WAL_AUTOCHECKPOINT', '1000'))),  # pages
+    ('journal_size_limit', int(os.getenv('DB_JOURNAL_SIZE_LIMIT', '67108864'))),  # WAL truncated to 64 MB after checkpoints
+]
+
+# Free pages returned to the filesystem per maintenance pass
+DB_VACUUM_PAGES = int(os.getenv('DB_VACUUM_PAGES', '500'))
+
+# Rows per transaction when backfilling the epoch columns
+DB_BACKFILL_BATCH = int(os.getenv('DB_BACKFILL_BATCH', '2000'))
+
+# Idle connections kept per thread
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+
+_pool = threading.local()
+_stats_lock = threading.Lock()
+_stats = {'opens': 0, 'reuses': 0, 'releases': 0, 'discards': 0, 'wait_seconds': 0.0}
+
+
+class PooledConnection:
+    """sqlite3 connection that goes back to its thread's pool on close().
+
+    Behaves like a sqlite3.Connection. Used as a context manager it commits
+    on success, rolls back on error and is always returned to the pool.
+    """
+
+    def __init__(self, conn, path):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_released', False)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+    def close(self):
+        """Return the connection to the pool (uncommitted work is rolled back)"""
+        if self._released:
+            return
+        object.__setattr__(self, '_released', True)
+        _release(self._conn, self._path)
+
+
+def _open(path):
+    conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
+    for name, value in DB_PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
     return conn
 
+
+def _release(conn, path):
+    idle = getattr(_pool, 'idle', None)
+    if idle is None:
+        idle = _pool.idle = []
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        keep = path == DATABASE and len(idle) < DB_POOL_SIZE
+    except sqlite3.Error:
+        keep = False
+    if keep:
+        idle.append((path, conn))
+    else:
+        conn.close()
+    with _stats_lock:
+        _stats['releases' if keep else 'discards'] += 1
+
+
+def get_db():
+    """Get a pooled database connection; close() or a with-block returns it"""
+    started = time.perf_counter()
+    idle = getattr(_pool, 'idle', None) or []
+    conn = None
+    while idle and conn is None:
+        path, candidate = idle.pop()
+        if path == DATABASE:
+            conn = candidate
+        else:
+            candidate.close()
+    reused = conn is not None
+    if conn is None:
+        conn = _open(DATABASE)
+    with _stats_lock:
+        _stats['reuses' if reused else 'opens'] += 1
+        _stats['wait_seconds'] += time.perf_counter() - started
+    return PooledConnection(conn, DATABASE)
+
+
+# Timestamps are stored as ISO text in several shapes (naive UTC from
+# CURRENT_TIMESTAMP, Chicago-offset from the app). Each one gets an integer
+# UTC epoch shadow column that range filters and ORDER BY can use directly;
+# naive values are read as UTC, the same as SQLite's datetime().
+EPOCH_COLUMNS = {
+    'checkouts': [('checked_out_at', 'checked_out_ts'), ('checked_in_at', 'checked_in_ts')],
+    'reservations': [('reserved_datetime', 'reserved_ts'), ('end_datetime', 'end_ts')],
+    'notes': [('created_at', 'created_ts'), ('expires_at', 'expires_ts')],
+    'cleanliness_inspections': [('inspected_at', 'inspected_ts')],
+    'quarterly_inspections': [('inspected_at', 'inspected_ts')],
+}
+
+
+def _epoch_sql(column, row=''):
+    return f"CAST(strftime('%s', {row}{column}) AS INTEGER)"
+
+
+def _epoch_column_steps():
+    """ALTERs plus triggers that keep each *_ts column in step with its text column on every write"""
+    steps = []
+    for table, columns in EPOCH_COLUMNS.items():
+        sources = ', '.join(src for src, _ in columns)
+        assign = ', '.join(f'{ts} = {_epoch_sql(src, "NEW.")}' for src, ts in columns)
+        steps += [f'ALTER TABLE {table} ADD COLUMN {ts} INTEGER' for _, ts in columns]
+        steps += [
+            f'''CREATE TRIGGER IF NOT EXISTS {table}_epoch_insert AFTER INSERT ON {table}
+                BEGIN UPDATE {table} SET {assign} WHERE rowid = NEW.rowid; END''',
+            f'''CREATE TRIGGER IF NOT EXISTS {table}_epoch_update AFTER UPDATE OF {sources} ON {table}
+                BEGIN UPDATE {table} SET {assign} WHERE rowid = NEW.rowid; END''',
+        ]
+    return steps
+
+
+def backfill_epoch_columns(conn, batch=None):
+    """Fill the *_ts columns for existing rows, committing every `batch` rows so kiosks are never blocked long"""
+    batch = batch or DB_BACKFILL_BATCH
+    for table, columns in EPOCH_COLUMNS.items():
+        assign = ', '.join(f'{ts} = {_epoch_sql(src)}' for src, ts in columns)
+        last = 0
+        while True:
+            rowids = conn.execute(
+                f'SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?', (last, batch)
+            ).fetchall()
+            if not rowids:
+                break
+            conn.execute(f'UPDATE {table} SET {assign} WHERE rowid BETWEEN ? AND ?', (last + 1, rowids[-1][0]))
+            conn.commit()
+            last = rowids[-1][0]
+
+
+# Dashboard categories seeded into the fob_categories registry, in display
+# order: (category, payload key, sort mode, is vehicle). 'name' sorts
+# naturally by vehicle name, 'status' puts checked-out items first. Vehicles
+# get inspections, barns transfers and inspection QR codes.
+DEFAULT_CATEGORIES = [
+    ('Squad Cars', 'squad_cars', 'name', 1),
+    ('CID Vehicles', 'cid_vehicles', 'name', 1),
+    ('Specialized Services Vehicles', 'specialized_vehicles', 'name', 1),
+    ('Other Vehicles', 'other_vehicles', 'name', 1),
+    ('Pool Cars', 'pool_cars', 'name', 1),
+    ('Admin Cars', 'admin_cars', 'name', 1),
+    ('Equipment', 'equipment', 'status', 0),
+    ('Key Rings', 'key_rings', 'status', 0),
+]
+
+
+def natural_sort_key(name):
+    """Text key that sorts numbers naturally ("Unit 2" before "Unit 10").
+
+    Digit runs are zero-padded so the key compares correctly as plain text,
+    in Python or in an SQL ORDER BY. Stored in key_fobs.sort_key.
+    """
+    return re.sub(r'[0-9]+', lambda m: m.group().zfill(10), (name or '').lower())
+
+
+def backfill_sort_keys(conn):
+    """Compute key_fobs.sort_key for every fob"""
+    rows = conn.execute('SELECT id, vehicle_name FROM key_fobs').fetchall()
+    conn.executemany('UPDATE key_fobs SET sort_key = ? WHERE id = ?',
+                     [(natural_sort_key(row['vehicle_name']), row['id']) for row in rows])
+
+
+def seed_categories(conn):
+    conn.executemany('''
+        INSERT OR IGNORE INTO fob_categories (name, payload_key, position, sort_mode, is_vehicle)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(name, key, position, mode, vehicle)
+          for position, (name, key, mode, vehicle) in enumerate(DEFAULT_CATEGORIES)])
+
+
+# When a reservation stops occupying its fob. One without an end time holds
+# just its start minute. Indexed per fob, so "what overlaps [start, end)"
+# is a range seek over reservations that have not finished before `start`.
+RESERVATION_POINT_SECONDS = 60
+RESERVATION_UNTIL_SQL = f'COALESCE(end_ts, reserved_ts + {RESERVATION_POINT_SECONDS})'
+
+# Hot-path SQL the app runs, kept here so check_query_plans() explains the
+# same statements the routes execute.
+
+# A fob with its open checkout and holder; callers append the WHERE clause
+FOB_LOOKUP_SQL = '''
+    SELECT kf.*, c.id as checkout_id, c.checked_out_at,
+           u.first_name, u.last_name, u.id as user_id
+    FROM key_fobs kf
+    LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
+    LEFT JOIN users u ON c.user_id = u.id
+'''
+
+# The first upcoming reservation on a fob whose display window has opened
+SHOWN_RESERVATION_SQL = '''
+    SELECT r.*, u.first_name, u.last_name
+    FROM reservations r
+    LEFT JOIN users u ON r.user_id = u.id
+    WHERE r.fob_id = ? AND r.reserved_ts > ? AND r.reserved_ts - r.display_hours_before * 3600 <= ?
+    ORDER BY r.reserved_ts ASC LIMIT 1
+'''
+
+# Reservations on any of {placeholders} fobs overlapping [start_ts, end_ts),
+# except reservation id `?` (NULL excludes nothing)
+RESERVATION_CONFLICTS_SQL = f'''
+    SELECT r.id, r.fob_id, r.reserved_datetime, r.end_datetime, r.reserved_for_name,
+           u.first_name, u.last_name, kf.vehicle_name
+    FROM reservations r
+    JOIN key_fobs kf ON r.fob_id = kf.id
+    LEFT JOIN users u ON r.user_id = u.id
+    WHERE r.fob_id IN ({{placeholders}})
+      AND {RESERVATION_UNTIL_SQL} > ? AND r.reserved_ts < ?
+      AND r.id IS NOT ?
+    ORDER BY kf.vehicle_name, r.reserved_ts
+'''
+
+# One page of checkout history, newest first; {conditions} are the filters
+# and keyset cursor as ' AND ...' clauses
+HISTORY_PAGE_SQL = '''
+    SELECT 
+        c.id,
+        c.checked_out_ts,
+        u.first_name || " " || u.last_name as user_name,
+        kf.vehicle_name,
+        c.checked_out_at,
+        c.checked_in_at,
+        c.kiosk_id
+    FROM checkouts c
+    JOIN users u ON c.user_id = u.id
+    JOIN key_fobs kf ON c.fob_id = kf.id
+    WHERE 1=1{conditions}
+    ORDER BY c.checked_out_ts DESC, c.id DESC LIMIT ?
+'''
+
+# Keyset conditions for the history page after a cursor row. Checkouts whose
+# checked_out_at the trigger could not parse have a NULL checked_out_ts; they
+# sort after every dated row (NULL is lowest), newest id first.
+HISTORY_AFTER_SQL = ' AND ((c.checked_out_ts, c.id) < (?, ?) OR c.checked_out_ts IS NULL)'
+HISTORY_AFTER_UNDATED_SQL = ' AND c.checked_out_ts IS NULL AND c.id < ?'
+
+
+# Queries on the scan, status and admin paths that must stay index-backed.
+# (name, sql, example params) - check_query_plans() fails any that full-scan a table.
+HOT_QUERIES = [
+    ('fob lookup by fob_id', FOB_LOOKUP_SQL + 'WHERE kf.fob_id = ? COLLATE NOCASE AND kf.is_active = 1', ('x',)),
+    ('shown reservation for fob', SHOWN_RESERVATION_SQL, (1, 0, 0)),
+    ('reservation conflicts', RESERVATION_CONFLICTS_SQL.format(placeholders='?,?'), (1, 2, 0, 0, None)),
+    ('admin recent history', HISTORY_PAGE_SQL.format(conditions=''), (51,)),
+    ('history page after cursor', HISTORY_PAGE_SQL.format(conditions=HISTORY_AFTER_SQL), (0, 0, 51)),
+    ('history page after undated cursor', HISTORY_PAGE_SQL.format(conditions=HISTORY_AFTER_UNDATED_SQL), (0, 51)),
+    ('history page for date range',
+     HISTORY_PAGE_SQL.format(conditions=' AND c.checked_out_ts >= ? AND c.checked_out_ts < ?'), (0, 86400, 51)),
+    ('open checkout for fob',
+     'SELECT * FROM checkouts WHERE fob_id = ? AND checked_in_at IS NULL', (1,)),
+    ('open checkouts for user',
+     'SELECT fob_id FROM checkouts WHERE checked_in_at IS NULL AND user_id IN (?)', (1,)),
+    ('vehicle recent history', '''
+        SELECT u.first_name, c.checked_out_at FROM checkouts c
+        JOIN users u ON c.user_id = u.id
+        WHERE c.fob_id = ? ORDER BY c.checked_out_at DESC LIMIT 10
+     ''', (1,)),
+    ('history date range', '''
+        SELECT kf.vehicle_name, c.checked_out_at FROM checkouts c
+        JOIN users u ON c.user_id = u.id
+        JOIN key_fobs kf ON c.fob_id = kf.id
+        WHERE c.checked_out_ts >= ? AND c.checked_out_ts < ?
+        ORDER BY c.checked_out_ts DESC
+     ''', (0, 86400)),
+    ('inspections date range', '''
+        SELECT i.*, kf.vehicle_name FROM cleanliness_inspections i
+        JOIN key_fobs kf ON i.fob_id = kf.id
+        WHERE i.inspected_ts >= ? AND i.inspected_ts < ?
+        ORDER BY i.inspected_ts DESC
+     ''', (0, 86400)),
+    ('past reservations for fob', '''
+        SELECT r.*, kf.vehicle_name FROM reservations r
+        LEFT JOIN users u ON r.user_id = u.id
+        JOIN key_fobs kf ON r.fob_id = kf.id
+        WHERE r.reserved_ts IS NOT NULL AND r.reserved_ts <= ? AND r.reserved_ts >= ? AND r.fob_id = ?
+        ORDER BY r.reserved_ts DESC LIMIT 25
+     ''', (0, 0, 1)),
+    ('past reservations for user', '''
+        SELECT r.*, kf.vehicle_name FROM reservations r
+        JOIN key_fobs kf ON r.fob_id = kf.id
+        WHERE r.reserved_ts IS NOT NULL AND r.reserved_ts <= ? AND r.user_id = ?
+        ORDER BY r.reserved_ts DESC LIMIT 25
+     ''', (0, 1)),
+    ('upcoming reservations', '''
+        SELECT r.id FROM reservations r
+        WHERE r.reserved_ts > ? OR r.end_ts > ?
+     ''', (0, 0)),
+    ('admin active reservations', '''
+        SELECT r.*, kf.vehicle_name FROM reservations r
+        LEFT JOIN users u ON r.user_id = u.id
+        JOIN key_fobs kf ON r.fob_id = kf.id
+        WHERE r.reserved_ts > ? OR r.end_ts > ?
+        ORDER BY +r.reserved_ts ASC
+     ''', (0, 0)),
+    ('reservations for fob', '''
+        SELECT r.*, u.first_name FROM reservations r
+        LEFT JOIN users u ON r.user_id = u.id
+        WHERE r.fob_id = ? ORDER BY r.reserved_datetime ASC
+     ''', (1,)),
+    ('note for fob', 'SELECT * FROM notes WHERE fob_id = ?', (1,)),
+    ('holdings for user', '''
+        SELECT c.id, kf.vehicle_name FROM checkouts c JOIN key_fobs kf ON c.fob_id = kf.id
+        WHERE c.user_id = ? AND c.checked_in_at IS NULL
+        ORDER BY c.checked_out_at
+     ''', (1,)),
+    ('due notes', 'SELECT id, fob_id, expires_at FROM notes WHERE expires_ts <= ?', (0,)),
+    ('next note expiry', 'SELECT MIN(expires_ts) FROM notes WHERE expires_ts > ?', (0,)),
+    ('user by card', 'SELECT * FROM users WHERE card_id = ? COLLATE NOCASE', ('x',)),
+    ('cleanliness inspections for fob',
+     'SELECT * FROM cleanliness_inspections WHERE fob_id = ? ORDER BY inspected_at DESC', (1,)),
+    ('quarterly inspections for fob',
+     'SELECT * FROM quarterly_inspections WHERE fob_id = ? ORDER BY inspected_at DESC', (1,)),
+    ('pending assignment for fob', '''
+        SELECT id FROM inspection_assignments
+        WHERE fob_id = ? AND inspection_type = ? AND completed_at IS NULL
+     ''', (1, 'cleanliness')),
+    ('assignments due for reminder', '''
+        SELECT id FROM inspection_assignments
+        WHERE due_date >= ? AND due_date < ? AND completed_at IS NULL AND reminder_sent = 0
+     ''', ('2026-01-01', '2026-01-02')),
+    ('vehicle assignments for fob',
+     'SELECT * FROM vehicle_assignments WHERE fob_id = ?', (1,)),
+]
+
+# Small tables that may be scanned whole (one row per fob / admin)
+FULL_SCAN_ALLOWED = {'key_fobs', 'kf', 'admin_users'}
+
+
+def hot_queries():
+    """HOT_QUERIES plus the status board reads, whose SQL lives in status_model"""
+    from status_model import FOB_QUERY, RESERVATION_QUERY  # status_model imports this module
+    return HOT_QUERIES + [
+        ('status board fobs', FOB_QUERY, ()),
+        ('status board fob refresh', FOB_QUERY + ' AND kf.id IN (?)', (1,)),
+        ('status board reservations', RESERVATION_QUERY, (0, 0)),
+        ('status board reservation refresh', RESERVATION_QUERY + ' AND r.fob_id IN (?)', (0, 0, 1)),
+    ]
+
+
+def check_query_plans(conn=None):
+    """Return (query name, plan step) for every hot query that full-scans a table"""
+    own = conn is None
+    if own:
+        conn = get_db()
+    failures = []
+    try:
+        for name, sql, params in hot_queries():
+            for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params):
+                detail = row['detail']
+                words = detail.split()
+                # "SCAN c" is a full table scan. "SCAN c USING INDEX ..." walks a whole
+                # index in order, which is only cheap when a LIMIT stops it early.
+                if words[0] != 'SCAN' or words[1] in FULL_SCAN_ALLOWED:
+                    continue
+                if 'USING' not in words or 'LIMIT' not in sql.upper():
+                    failures.append((name, detail))
+    finally:
+        if own:
+            conn.close()
+    return failures
+
+
+def maintain_db():
+    """Online maintenance that never takes an exclusive lock.
+
+    A PASSIVE checkpoint copies what it can from the WAL without waiting on
+    readers or writers, and a bounded incremental vacuum frees a few hundred
+    pages at a time so kiosk writes are only ever delayed briefly.
+    """
+    with get_db() as conn:
+        busy, wal_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if freelist and conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            conn.execute(f'PRAGMA incremental_vacuum({min(freelist, DB_VACUUM_PAGES)})').fetchall()
+    return {'wal_pages': wal_pages, 'checkpointed': checkpointed, 'busy': bool(busy),
+            'freed_pages': min(freelist, DB_VACUUM_PAGES) if freelist else 0}
+
+
+def pool_stats():
+    """Connection pool counters"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['wait_seconds'] = round(stats['wait_seconds'], 6)
+    stats['idle_this_thread'] = len(getattr(_pool, 'idle', None) or [])
+    return stats
+
 def init_db():
     """Initialize the database with our tables"""
     conn = get_db()
@@ -264,6 +676,87 @@ def run_migrations():
                 FOREIGN KEY (fob_id) REFERENCES key_fobs (id)
             )
         '''),
+        # One-time rebuild so free pages can be reclaimed online with incremental_vacuum
+        ('010_enable_incremental_vacuum', [
+            'PRAGMA auto_vacuum = INCREMENTAL',
+            'VACUUM',
+        ]),
+        # Indexes for the hot query paths (see hot_queries / check_query_plans)
+        ('011_add_hot_path_indexes', [
+            # Open checkouts are a tiny slice of an ever-growing table
+            'CREATE INDEX IF NOT EXISTS idx_checkouts_open_fob ON checkouts (fob_id) WHERE checked_in_at IS NULL',
+            'CREATE INDEX IF NOT EXISTS idx_checkouts_open_user ON checkouts (user_id) WHERE checked_in_at IS NULL',
+            'CREATE INDEX IF NOT EXISTS idx_checkouts_fob_out ON checkouts (fob_id, checked_out_at)',
+            'CREATE INDEX IF NOT EXISTS idx_checkouts_user_out ON checkouts (user_id, checked_out_at)',
+            'CREATE INDEX IF NOT EXISTS idx_checkouts_out ON checkouts (checked_out_at)',
+            'CREATE INDEX IF NOT EXISTS idx_reservations_fob_start ON reservations (fob_id, reserved_datetime, end_datetime)',
+            'CREATE INDEX IF NOT EXISTS idx_reservations_start ON reservations (reserved_datetime)',
+            'CREATE INDEX IF NOT EXISTS idx_cleanliness_fob_at ON cleanliness_inspections (fob_id, inspected_at)',
+            'CREATE INDEX IF NOT EXISTS idx_cleanliness_at ON cleanliness_inspections (inspected_at)',
+            'CREATE INDEX IF NOT EXISTS idx_quarterly_fob_at ON quarterly_inspections (fob_id, inspected_at)',
+            'CREATE INDEX IF NOT EXISTS idx_quarterly_at ON quarterly_inspections (inspected_at)',
+            'CREATE INDEX IF NOT EXISTS idx_assignments_pending_due ON inspection_assignments (due_date) WHERE completed_at IS NULL',
+            'CREATE INDEX IF NOT EXISTS idx_assignments_pending_fob ON inspection_assignments (fob_id, inspection_type) WHERE completed_at IS NULL',
+            'CREATE INDEX IF NOT EXISTS idx_vehicle_assignments_fob ON vehicle_assignments (fob_id)',
+            # Scans look cards and fobs up case-insensitively
+            'CREATE INDEX IF NOT EXISTS idx_users_card_nocase ON users (card_id COLLATE NOCASE)',
+            'CREATE INDEX IF NOT EXISTS idx_key_fobs_fob_nocase ON key_fobs (fob_id COLLATE NOCASE)',
+            'ANALYZE',
+        ]),
+        # Integer UTC epoch shadows of the text timestamps, kept in sync by triggers
+        ('012_add_epoch_timestamp_columns', [
+            'ALTER TABLE notes ADD COLUMN expires_at TEXT',
+            *_epoch_column_steps(),
+            backfill_epoch_columns,
+            'CREATE INDEX IF NOT EXISTS idx_checkouts_out_ts ON checkouts (checked_out_ts)',
+            'CREATE INDEX IF NOT EXISTS idx_reservations_start_ts ON reservations (reserved_ts)',
+            'CREATE INDEX IF NOT EXISTS idx_reservations_end_ts ON reservations (end_ts)',
+            'CREATE INDEX IF NOT EXISTS idx_cleanliness_ts ON cleanliness_inspections (inspected_ts)',
+            'CREATE INDEX IF NOT EXISTS idx_quarterly_ts ON quarterly_inspections (inspected_ts)',
+            'ANALYZE',
+        ]),
+        # Filtered past-reservation lists on the admin page
+        ('013_add_reservation_range_indexes', [
+            'CREATE INDEX IF NOT EXISTS idx_reservations_fob_ts ON reservations (fob_id, reserved_ts)',
+            'CREATE INDEX IF NOT EXISTS idx_reservations_user_ts ON reservations (user_id, reserved_ts)',
+        ]),
+        # Interval lookups for reservation conflicts and the free-vehicle finder
+        ('014_add_reservation_interval_index', [
+            f'CREATE INDEX IF NOT EXISTS idx_reservations_fob_until ON reservations (fob_id, {RESERVATION_UNTIL_SQL})',
+        ]),
+        # Natural-sort keys stored per fob and the category registry, so the
+        # dashboard sorts on edit instead of on every request
+        ('015_add_fob_sort_keys_and_categories', [
+            'ALTER TABLE key_fobs ADD COLUMN sort_key TEXT',
+            backfill_sort_keys,
+            '''CREATE TABLE IF NOT EXISTS fob_categories (
+                name TEXT PRIMARY KEY,
+                payload_key TEXT UNIQUE NOT NULL,
+                position INTEGER NOT NULL,
+                sort_mode TEXT NOT NULL DEFAULT 'name' CHECK (sort_mode IN ('name', 'status')),
+                is_vehicle INTEGER NOT NULL DEFAULT 0
+            )''',
+            seed_categories,
+            'CREATE INDEX IF NOT EXISTS idx_key_fobs_category_sort ON key_fobs (category, sort_key)',
+        ]),
+        # Note-expiry sweeper: due notes and the next expiry straight from an index
+        ('016_add_note_expiry_index', [
+            'CREATE INDEX IF NOT EXISTS idx_notes_expires_ts ON notes (expires_ts) WHERE expires_ts IS NOT NULL',
+        ]),
+        # Offline kiosk journal: each replayed operation once per idempotency key
+        ('017_add_kiosk_ops', [
+            '''CREATE TABLE IF NOT EXISTS kiosk_ops (
+                op_key TEXT PRIMARY KEY,
+                kiosk_id TEXT,
+                op TEXT NOT NULL,
+                fob_id INTEGER,
+                occurred_at TEXT,
+                status TEXT NOT NULL CHECK (status IN ('applied', 'duplicate', 'conflict', 'rejected')),
+                message TEXT,
+                replayed_at TEXT NOT NULL
+            )''',
+            'CREATE INDEX IF NOT EXISTS idx_kiosk_ops_status ON kiosk_ops (status, replayed_at)',
+        ]),
     ]
     
     for name, sql in migrations:
@@ -277,7 +770,10 @@ def run_migrations():
                 if isinstance(sql, list):
                     for s in sql:
                         try:
-                            conn.execute(s)
+                            if callable(s):
+                                s(conn)  # data migration step, e.g. a batched backfill
+                            else:
+                                conn.execute(s)
                         except Exception as e:
                             print(f"  Step failed (may already exist): {e}")
                 else:
@@ -295,5 +791,13 @@ def run_migrations():
     conn.close()
 
 if __name__ == '__main__':
+    import sys
     init_db()
     run_migrations()
+    if '--check-plans' in sys.argv:
+        failures = check_query_plans()
+        for name, detail in failures:
+            print(f"FULL SCAN in '{name}': {detail}")
+        total = len(hot_queries())
+        print(f"Query plans: {total - len({n for n, _ in failures})}/{total} hot queries index-backed")
+        sys.exit(1 if failures else 0)
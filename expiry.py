@@ -0,0 +1,69 @@
+"""Timers that run background work exactly when something is next due.
+
+Expired notes used to be deleted by the dashboard page itself, so a plain
+GET could write to the database while kiosks were checking out, and
+reservation display windows only reached the board when some unrelated
+mutation triggered a broadcast. Both are now driven by a DueTimer: the job
+does what is due and reports the next due time, and the timer sleeps until
+then. Scheduling something sooner re-arms the timer; a superseded timer
+wakes up and exits.
+"""
+import threading
+import time
+
+
+class DueTimer:
+    """Run `job` at the earliest scheduled due time (epoch seconds)"""
+
+    def __init__(self, job, start_task, sleep, name, clock=time.time):
+        self._job = job                # does what is due; returns the next due time or None
+        self._start_task = start_task  # socketio.start_background_task
+        self._sleep = sleep            # socketio.sleep
+        self.name = name
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._due = None               # time the armed timer fires, None if idle
+        self._generation = 0           # bumped whenever a timer is superseded
+        self.stats = {'runs': 0, 'rearms': 0, 'errors': 0}
+
+    @property
+    def due(self):
+        with self._lock:
+            return self._due
+
+    def schedule(self, due):
+        """Make sure the job runs no later than `due`; returns immediately"""
+        if due is None:
+            return
+        with self._lock:
+            if self._due is not None and self._due <= due:
+                return
+            if self._due is not None:
+                self.stats['rearms'] += 1
+            self._due = due
+            self._generation += 1
+            generation = self._generation
+        self._start_task(self._run, generation, due)
+
+    def _run(self, generation, due):
+        delay = due - self._clock()
+        if delay > 0:
+            self._sleep(delay)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._due = None
+        self.run_now()
+
+    def run_now(self):
+        """Run the job immediately and arm the timer for whatever is due next"""
+        with self._lock:
+            self.stats['runs'] += 1
+        try:
+            next_due = self._job()
+        except Exception as e:
+            print(f"Error in {self.name}: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+            next_due = self._clock() + 60  # try again shortly
+        self.schedule(next_due)
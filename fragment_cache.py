@@ -0,0 +1,35 @@
+"""Cache of rendered HTML fragments for the dashboard page.
+
+Wall displays reload the dashboard often while most categories have not
+changed. Each fragment is stored with the stamp it was rendered at and is
+reused until the caller's stamp for it moves.
+"""
+import threading
+
+
+class FragmentCache:
+    """Rendered fragments keyed by name, valid while their stamp is unchanged"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # name -> (stamp, html)
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, name, stamp, render):
+        """HTML for `name` at `stamp`; on a miss render() returns (stamp, html) read together"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == stamp:
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+        stamp, html = render()
+        with self._lock:
+            self._entries[name] = (stamp, html)
+        return html
+
+    def snapshot_stats(self):
+        with self._lock:
+            total = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats, fragments=len(self._entries),
+                        hit_rate=round(self.stats['hits'] / total, 3) if total else None)
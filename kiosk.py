@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 import time
-from database import get_db
+from database import get_db, natural_sort_key
 from datetime import datetime
 
 class KioskApp:
@@ -83,8 +83,8 @@ class KioskApp:
         
         conn = get_db()
         try:
-            conn.execute('INSERT INTO key_fobs (fob_id, vehicle_name, category, location) VALUES (?, ?, ?,?)',
-                        (fob_id, vehicle_name, category, location))
+            conn.execute('INSERT INTO key_fobs (fob_id, vehicle_name, sort_key, category, location) VALUES (?, ?, ?, ?, ?)',
+                        (fob_id, vehicle_name, natural_sort_key(vehicle_name), category, location))
             conn.commit()
             fob = conn.execute('SELECT * FROM key_fobs WHERE fob_id = ?', (fob_id,)).fetchone()
             conn.close()
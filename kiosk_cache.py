@@ -0,0 +1,141 @@
+"""Kiosk-local copy of the user and fob directory.
+
+Every badge tap used to cost a 'scan' lookup and then a 'user' or 'fob'
+lookup over HTTP. The kiosk now keeps every user and fob in memory, keyed
+case-insensitively by card_id / fob_id like the server's COLLATE NOCASE
+lookups. It is loaded from /api/directory at startup and kept current by
+the server's directory_changed Socket.IO pushes, so recognizing a scan
+never touches the network.
+"""
+import base64
+import threading
+
+import requests
+import socketio
+
+
+class DirectoryCache:
+    """Users by card_id and fobs by fob_id, both case-insensitive"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}        # users.id -> row
+        self._fobs = {}         # key_fobs.id -> row
+        self._user_keys = {}    # card_id.lower() -> users.id
+        self._fob_keys = {}     # fob_id.lower() -> key_fobs.id
+        self.server = None      # server instance the seq belongs to
+        self.seq = None         # last directory_changed seq applied; None until loaded
+        self.etag = None
+        self.stats = {'hits': 0, 'misses': 0, 'loads': 0, 'deltas': 0, 'gaps': 0}
+
+    @property
+    def ready(self):
+        return self.seq is not None
+
+    def load(self, data, etag=None):
+        """Replace the directory with a full /api/directory payload"""
+        with self._lock:
+            self._users, self._fobs, self._user_keys, self._fob_keys = {}, {}, {}, {}
+            for user in data['users']:
+                self._put(self._users, self._user_keys, 'card_id', user)
+            for fob in data['fobs']:
+                self._put(self._fobs, self._fob_keys, 'fob_id', fob)
+            self.server, self.seq, self.etag = data['server'], data['seq'], etag
+            self.stats['loads'] += 1
+
+    def apply(self, delta):
+        """Apply a directory_changed push; returns False if one was missed and a reload is needed"""
+        with self._lock:
+            if self.seq is None or delta['server'] != self.server:
+                self.stats['gaps'] += 1
+                return False
+            if delta['seq'] <= self.seq:
+                return True  # already in the copy we loaded
+            if delta['base'] != self.seq:
+                self.stats['gaps'] += 1
+                return False
+            for user in delta['users']:
+                self._put(self._users, self._user_keys, 'card_id', user)
+            for fob in delta['fobs']:
+                self._put(self._fobs, self._fob_keys, 'fob_id', fob)
+            self.seq = delta['seq']
+            self.stats['deltas'] += 1
+            return True
+
+    @staticmethod
+    def _put(rows, keys, field, row):
+        old = rows.get(row['id'])
+        if old and old[field] and keys.get(old[field].lower()) == row['id']:
+            del keys[old[field].lower()]
+        rows[row['id']] = row
+        if not row[field]:
+            return
+        key = row[field].lower()
+        current = rows.get(keys.get(key))
+        # An id shared by several rows resolves to an active one, like the server lookups
+        if current is None or current['id'] == row['id'] or row['is_active'] or not current['is_active']:
+            keys[key] = row['id']
+
+    def _get(self, rows, keys, identifier):
+        with self._lock:
+            row = rows.get(keys.get((identifier or '').lower()))
+            self.stats['hits' if row else 'misses'] += 1
+            return dict(row) if row else None
+
+    def user(self, card_id):
+        """Active user with this card, or None"""
+        user = self._get(self._users, self._user_keys, card_id)
+        return user if user and user['is_active'] else None
+
+    def fob(self, fob_id):
+        """Active fob with this fob_id (identity only), or None"""
+        fob = self._get(self._fobs, self._fob_keys, fob_id)
+        return fob if fob and fob['is_active'] else None
+
+    def scan(self, identifier):
+        """('user' | 'fob', row) for a scanned id, or (None, None); users win, like /api/lookup 'scan'"""
+        user = self._get(self._users, self._user_keys, identifier)
+        if user:
+            return 'user', user
+        fob = self._get(self._fobs, self._fob_keys, identifier)
+        return ('fob', fob) if fob else (None, None)
+
+
+class DirectorySync:
+    """Keeps a DirectoryCache current: full load on (re)connect, pushed deltas in between"""
+
+    def __init__(self, cache, transport):
+        self.cache = cache
+        self.transport = transport
+        self.client = socketio.Client(reconnection=True, logger=False)
+        self.client.on('connect', self.refresh)
+        self.client.on('directory_changed', self._on_changed)
+
+    def start(self):
+        """Load the directory and connect in the background; returns immediately"""
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        self.refresh()
+        credentials = base64.b64encode(':'.join(self.transport.auth).encode()).decode()
+        try:
+            # retry=True keeps trying in the background until the server is up
+            self.client.connect(f'{self.transport.server_url}?kiosk=1', headers={'Authorization': f'Basic {credentials}'},
+                                wait_timeout=5, retry=True)
+        except Exception as e:
+            # Scans fall back to /api/scan/resolve until a load succeeds
+            print(f"Directory sync unavailable: {e}")
+
+    def refresh(self):
+        """Fetch /api/directory unless the copy we hold is still current"""
+        try:
+            headers = {'If-None-Match': self.cache.etag} if self.cache.etag else {}
+            response = self.transport.get('/api/directory', headers=headers)
+            if response.status_code == 200:
+                self.cache.load(response.json(), response.headers.get('ETag'))
+        except requests.exceptions.RequestException as e:
+            print(f"Directory refresh failed: {e}")
+
+    def _on_changed(self, delta):
+        if not self.cache.apply(delta):
+            self.refresh()
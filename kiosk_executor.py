@@ -0,0 +1,113 @@
+"""Run the kiosk's server calls off the Tk main loop.
+
+Every lookup and checkout used to run inside a Tk event handler, so a slow
+server froze the screen and scanner keystrokes piled up unread. TkExecutor
+runs the calls on worker threads and hands results back to the Tk thread
+through a queue polled with root.after; Tk itself is only touched from the
+main thread.
+
+run() keeps the handlers' straight-line code: like a modal dialog's
+wait_window, it waits in a nested event loop, so the screen keeps redrawing
+and keystrokes keep arriving while the request is in flight.
+"""
+import queue
+import time
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+# How often results are collected while anything is in flight
+POLL_MS = 15
+# Waits shorter than this don't flash the progress indicator
+BUSY_DELAY_MS = 200
+
+
+class TkExecutor:
+    """Worker threads for blocking calls, with results delivered on the Tk thread"""
+
+    def __init__(self, root, guard=None, workers=2, on_busy=None, on_idle=None):
+        self.root = root
+        self.guard = guard        # widget that holds the input grab while the UI waits (mouse clicks are held off)
+        self.on_busy = on_busy    # on_busy(True/False) when the progress indicator should show or hide
+        self.on_idle = on_idle    # called when the last in-flight run() returns
+        self.in_flight = 0        # run() calls still waiting
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kiosk-io')
+        self._results = queue.SimpleQueue()
+        self._outstanding = 0     # submitted calls whose result hasn't been delivered
+        self._busy_shown = False
+        self.stats = {'runs': 0, 'submits': 0, 'errors': 0, 'max_wait_ms': 0.0}
+
+    def submit(self, fn, *args, on_done=None, **kwargs):
+        """Start fn(*args, **kwargs) on a worker; on_done(result, error) runs on the Tk thread afterwards"""
+        self.stats['submits'] += 1
+        future = self._pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self._results.put((on_done, f)))
+        self._outstanding += 1
+        if self._outstanding == 1:
+            self.root.after(POLL_MS, self._poll)
+        return future
+
+    def _poll(self):
+        while True:
+            try:
+                on_done, future = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._outstanding -= 1
+            error = future.exception()
+            if error is not None:
+                self.stats['errors'] += 1
+            if on_done:
+                try:
+                    on_done(None if error else future.result(), error)
+                except Exception as e:
+                    print(f"Error handling background result: {e}")
+        if self._outstanding:
+            self.root.after(POLL_MS, self._poll)
+
+    def run(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) on a worker; returns its result or raises its exception, keeping the UI live"""
+        done = tk.BooleanVar(self.root, False)
+        outcome = {}
+
+        def finished(result, error):
+            outcome['result'], outcome['error'] = result, error
+            done.set(True)
+
+        self.stats['runs'] += 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        grabbed = self._hold_input()
+        if self.on_busy:
+            self.root.after(BUSY_DELAY_MS, self._show_busy)
+        try:
+            self.submit(fn, *args, on_done=finished, **kwargs)
+            self.root.wait_variable(done)
+        finally:
+            self.in_flight -= 1
+            if grabbed:
+                self.guard.grab_release()
+            self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], (time.perf_counter() - start) * 1000)
+            if not self.in_flight:
+                if self._busy_shown:
+                    self._busy_shown = False
+                    self.on_busy(False)
+                if self.on_idle:
+                    self.on_idle()
+        if outcome['error'] is not None:
+            raise outcome['error']
+        return outcome['result']
+
+    def _hold_input(self):
+        """Route input to the guard while waiting, unless a dialog already holds the grab"""
+        if self.guard is None or self.root.grab_current() is not None:
+            return False
+        try:
+            self.guard.grab_set()
+        except tk.TclError:
+            return False  # window not viewable yet
+        return True
+
+    def _show_busy(self):
+        if self.in_flight and not self._busy_shown:
+            self._busy_shown = True
+            self.on_busy(True)
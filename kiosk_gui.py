@@ -9,11 +9,20 @@ import pytz
 import threading
 import requests
 import os
+from kiosk_cache import DirectoryCache, DirectorySync
+from kiosk_journal import OfflineJournal, JournalReplayer
+from kiosk_transport import KioskTransport
+from kiosk_executor import TkExecutor
+from collections import deque
 
 # Server configuration
 SERVER_URL = os.getenv('SERVER_URL', 'http://localhost:5000')
 KIOSK_USER = os.getenv('KIOSK_USER', 'kiosk')
 KIOSK_PASS = os.getenv('KIOSK_PASS', 'change-this-in-production')
+KIOSK_JOURNAL_PATH = os.getenv('KIOSK_JOURNAL_PATH', 'kiosk_journal.db')  # offline operations waiting for the server
+
+# How long a scan's /api/scan/resolve answer may stand in for the handler's follow-up lookup
+RESOLVE_REUSE_SECONDS = 5
 
 
 class KioskGUI:
@@ -33,6 +42,16 @@ class KioskGUI:
         self.bulk_checkout_mode = False
         self.bulk_items = []
         self.add_new_mode = False
+        self.status_etag = None      # ETag of the last /api/status seen, for cheap health checks
+        self.equipment_cache = None  # (ETag, equipment list) from /api/list/equipment
+        self.transport = KioskTransport(SERVER_URL, (KIOSK_USER, KIOSK_PASS))  # pooled session for every server call
+        self.directory = DirectoryCache()  # users and fobs for resolving scans locally
+        DirectorySync(self.directory, self.transport).start()
+        self.journal = OfflineJournal(KIOSK_JOURNAL_PATH)
+        self.replayer = JournalReplayer(self.journal, self.transport, kiosk_id)
+        self.replayer.start()
+        self.fob_states = {}  # key_fobs.id -> last fob lookup, with journaled changes applied
+        self.resolved = None  # (scan, type, data, time) from the last /api/scan/resolve of a scan
 
 
         # Create main window
@@ -43,6 +62,7 @@ class KioskGUI:
         self.root.bind('<F12>', self.exit_fullscreen)
         self.root.bind('<F11>', self.enter_fullscreen)
         self.root.bind('<Escape>', self.emergency_reset)
+        self.root.bind('<F9>', lambda e: self.transport.dump_latency())  # server latency per endpoint, to stdout
     
         # Create fonts
         self.title_font = font.Font(family='Arial', size=48, weight='bold')
@@ -81,6 +101,22 @@ class KioskGUI:
         )
         self.instructions_label.pack(pady=(10, 20))
 
+        # Offline journal status, refreshed by check_timeout_loop
+        self.sync_label = tk.Label(
+            self.root,
+            text="",
+            font=self.small_font,
+            fg='#ff9800',
+            bg='black'
+        )
+        self.sync_label.pack(pady=(0, 10))
+
+        # Server calls run on worker threads; scans made meanwhile wait their turn in scan_queue
+        self.scan_queue = deque()
+        self.processing_scan = False
+        self.executor = TkExecutor(self.root, guard=self.entry, on_busy=self.show_busy,
+                                   on_idle=lambda: self.root.after_idle(self.process_scans))
+
         # Bind keyboard input
         self.root.bind('<Key>', self.on_key_press)
         self.scan_buffer = ""
@@ -111,6 +147,9 @@ class KioskGUI:
         self.unavailable_mode = False
         self.pending_unavailable_fob = None
         self.add_new_mode = False
+        self.status_etag = None      # ETag of the last /api/status seen, for cheap health checks
+        self.equipment_cache = None  # (ETag, equipment list) from /api/list/equipment
+        self.scan_queue.clear()
         
         # Return to welcome
         self.show_welcome()
@@ -118,26 +157,42 @@ class KioskGUI:
 
     def notify_server(self):
         """Notify server that status changed"""
-        try:
-            requests.post(
-                f'{SERVER_URL}/api/notify',
-                auth=(KIOSK_USER, KIOSK_PASS),
-                timeout=1,
-                verify=True
-            )
-        except:
-            pass  # Fail silently if server unavailable
+        # Fire and forget; failures are ignored if the server is unavailable
+        self.executor.submit(self.transport.post, '/api/notify')
+
+    def server_post(self, path, **kwargs):
+        """POST to the server on a worker thread; the UI stays live until the response arrives"""
+        return self.executor.run(self.transport.post, path, **kwargs)
+
+    def server_get(self, path, **kwargs):
+        """GET from the server on a worker thread; the UI stays live until the response arrives"""
+        return self.executor.run(self.transport.get, path, **kwargs)
+
+    def show_busy(self, busy):
+        """Progress state while a server call is slow to answer"""
+        self.root.config(cursor='watch' if busy else '')
+        if busy:
+            self.sync_label.config(text="Contacting server…", fg='#2196F3')
+        else:
+            self.update_sync_label()
+
+    def update_sync_label(self):
+        pending = self.journal.pending_count()
+        self.sync_label.config(text=f"Offline • {pending} change(s) will sync when the server is back" if pending else "",
+                               fg='#ff9800')
     
     def check_server_available(self):
         """Check if server is reachable"""
         try:
-            response = requests.get(
-                f'{SERVER_URL}/api/status',
-                auth=(KIOSK_USER, KIOSK_PASS),
-                timeout=1,
-                verify=False
+            # Unchanged status comes back as an empty 304
+            headers = {'If-None-Match': self.status_etag} if self.status_etag else {}
+            response = self.server_get(
+                '/api/status',
+                headers=headers
             )
-            return response.status_code == 200
+            if response.status_code == 200:
+                self.status_etag = response.headers.get('ETag')
+            return response.status_code in (200, 304)
         except:
             return False
 
@@ -149,19 +204,43 @@ class KioskGUI:
             requests.exceptions.RequestException
         ))
 
+    def journal_offline(self, op, payload, holder=None):
+        """Queue a mutation in the offline journal and show its effect locally until it replays"""
+        self.journal.append(op, payload)
+        state = self.fob_states.setdefault(payload['fob_id'], {})
+        if op in ('checkout', 'barns_transfer'):
+            first_name, last_name = holder or ('The', 'Barns')
+            state.update(checkout_id='offline', user_id=payload.get('user_id'),
+                         first_name=first_name, last_name=last_name)
+        elif op == 'checkin':
+            state.update(checkout_id=None, user_id=None, first_name=None, last_name=None)
+        elif op == 'mark_unavailable':
+            state['is_available'] = 0
+            if payload.get('reason'):
+                state['note'] = {'note_text': f"UNAVAILABLE: {payload['reason']}"}
+        return True, None
+
+    def offline_fob(self, fob_id):
+        """(found, fob) from the directory and the last known state, for lookups while offline"""
+        fob = self.directory.fob(fob_id)
+        if not fob:
+            return False, None
+        view = {'checkout_id': None, 'user_id': None, 'first_name': None, 'last_name': None,
+                'checked_out_at': None, 'is_available': 1, 'note': None, 'reservation': None}
+        view.update(fob)
+        view.update(self.fob_states.get(fob['id'], {}))
+        return True, view
+
     def register_user_api(self, card_id, first_name, last_name):
         """Register a new user via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/user/register',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/user/register',
                 json={
                     'card_id': card_id,
                     'first_name': first_name,
                     'last_name': last_name
-                },
-                timeout=5,
-                verify=False
+                }
             )
 
             if response.status_code == 201:
@@ -176,17 +255,14 @@ class KioskGUI:
     def register_equipment_api(self, fob_id, vehicle_name, category, location):
         """Register new equipment via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/equipment/register',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/equipment/register',
                 json={
                     'fob_id': fob_id,
                     'vehicle_name': vehicle_name,
                     'category': category,
                     'location': location
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 201:
                 data = response.json()
@@ -201,18 +277,19 @@ class KioskGUI:
             return False, str(e)
 
     def checkout_api(self, user_id, fob_id):
-            """Checkout via API"""
+            """Checkout via API (journaled while offline)"""
+            payload = {'user_id': user_id, 'fob_id': fob_id}
+            holder = (self.current_user['first_name'], self.current_user['last_name']) if self.current_user else None
+            if self.journal.pending_count():
+                return self.journal_offline('checkout', payload, holder)  # keep order behind queued changes
             try:
-                response = requests.post(
-                    f'{SERVER_URL}/api/checkout',
-                    auth=(KIOSK_USER, KIOSK_PASS),
+                response = self.server_post(
+                    '/api/checkout',
                     json={
                         'user_id': user_id,
                         'fob_id': fob_id,
                         'kiosk_id': self.kiosk_id
-                    },
-                    timeout=5,
-                    verify=False
+                    }
                 )
                 if response.status_code == 201:
                     return True, None
@@ -221,21 +298,20 @@ class KioskGUI:
                     return False, error_msg
             except Exception as e:
                 if self.is_network_error(e):
-                    self.show_offline_screen()
-                    return False, None
+                    return self.journal_offline('checkout', payload, holder)
                 return False, str(e)
     
     def checkin_api(self, fob_id):
-            """Check in via API"""
+            """Check in via API (journaled while offline)"""
+            fob = self.directory.fob(fob_id)
+            if fob and self.journal.pending_count():
+                return self.journal_offline('checkin', {'fob_id': fob['id']})
             try:
-                response = requests.post(
-                    f'{SERVER_URL}/api/checkin',
-                    auth=(KIOSK_USER, KIOSK_PASS),
+                response = self.server_post(
+                    '/api/checkin',
                     json={
                         'fob_id': fob_id
-                    },
-                    timeout=5,
-                    verify=False
+                    }
                 )
                 if response.status_code == 200:
                     return True, None
@@ -244,24 +320,26 @@ class KioskGUI:
                     return False, error_msg
             except Exception as e:
                 if self.is_network_error(e):
+                    if fob:
+                        return self.journal_offline('checkin', {'fob_id': fob['id']})
                     self.show_offline_screen()
                     return False, None
                 return False, str(e)
 
 
     def mark_unavailable_api(self, fob_id, user_id, reason=''):
-        """Mark equipment as unavailable via API"""
+        """Mark equipment as unavailable via API (journaled while offline)"""
+        payload = {'fob_id': fob_id, 'user_id': user_id, 'reason': reason}
+        if self.journal.pending_count():
+            return self.journal_offline('mark_unavailable', payload)
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/mark_unavailable',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/mark_unavailable',
                 json={
                     'fob_id': fob_id,
                     'user_id': user_id,
                     'reason': reason
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 200:
                 return True, None
@@ -270,22 +348,18 @@ class KioskGUI:
                 return False, error_msg
         except Exception as e:
             if self.is_network_error(e):
-                self.show_offline_screen()
-                return False, None
+                return self.journal_offline('mark_unavailable', payload)
             return False, str(e)
 
     def mark_available_api(self, fob_id, user_id):
         """Mark equipment as available via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/mark_available',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/mark_available',
                 json={
                     'fob_id': fob_id,
                     'user_id': user_id
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 200:
                 return True, None
@@ -301,15 +375,13 @@ class KioskGUI:
     def bulk_checkout_api(self, user_id, fob_ids):
         """Bulk checkout multiple items via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/bulk_checkout',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/bulk_checkout',
                 json={
                     'user_id': user_id,
                     'fob_ids': fob_ids,
                     'kiosk_id': self.kiosk_id
-                },
-                timeout=10
+                }
             )
             if response.status_code == 201:
                 data = response.json()
@@ -324,17 +396,16 @@ class KioskGUI:
             return False, str(e)
     
     def barns_transfer_api(self, fob_id):
-        """Transfer to The Barns via API"""
+        """Transfer to The Barns via API (journaled while offline)"""
+        if self.journal.pending_count():
+            return self.journal_offline('barns_transfer', {'fob_id': fob_id})
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/barns_transfer',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/barns_transfer',
                 json={
                     'fob_id': fob_id,
                     'kiosk_id': self.kiosk_id
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 200:
                 return True, None
@@ -343,22 +414,18 @@ class KioskGUI:
                 return False, error_msg
         except Exception as e:
             if self.is_network_error(e):
-                self.show_offline_screen()
-                return False, None
+                return self.journal_offline('barns_transfer', {'fob_id': fob_id})
             return False, str(e)
     
     def replace_card_api(self, user_id, new_card_id):
         """Replace user's card via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/user/replace_card',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/user/replace_card',
                 json={
                     'user_id': user_id,
                     'new_card_id': new_card_id
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 200:
                 return True, None
@@ -374,15 +441,12 @@ class KioskGUI:
     def replace_fob_api(self, equipment_id, new_fob_id):
         """Replace fob ID via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/equipment/replace_fob',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/equipment/replace_fob',
                 json={
                     'equipment_id': equipment_id,
                     'new_fob_id': new_fob_id
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 200:
                 return True, None
@@ -399,14 +463,11 @@ class KioskGUI:
     def delete_note_api(self, fob_id):
         """Delete note via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/note/delete',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/note/delete',
                 json={
                     'fob_id': fob_id
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 200:
                 return True, None
@@ -423,17 +484,14 @@ class KioskGUI:
     def add_note_api(self, fob_id, note_text, expires_at=None, created_by='kiosk'):
         """Add note via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/note/add',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            response = self.server_post(
+                '/api/note/add',
                 json={
                     'fob_id': fob_id,
                     'note_text': note_text,
                     'expires_at': expires_at,
                     'created_by': created_by
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 201:
                 return True, None
@@ -447,21 +505,60 @@ class KioskGUI:
             return False, str(e)
 
     def lookup_api(self, lookup_type, identifier):
-        """Look up user, fob, or scan via API"""
+        """Look up user, fob, or scan via API.
+
+        Users and scans resolve from the local directory once it is loaded.
+        Fobs the directory doesn't know are answered locally too; known fobs
+        still go to the server for their live checkout, note and reservation,
+        except while offline changes are queued, when the local view is used.
+        Scans and fobs that do go to the server use /api/scan/resolve, whose
+        answer to a scan also serves the handler's follow-up lookup, so each
+        scan costs at most one request.
+        """
+        if self.directory.ready:
+            if lookup_type == 'scan':
+                found_type, row = self.directory.scan(identifier)
+                return (True, row) if row else (False, None)
+            if lookup_type == 'user':
+                user = self.directory.user(identifier)
+                return (True, user) if user else (False, None)
+            if lookup_type == 'fob' and not self.directory.fob(identifier):
+                return False, None
+            if lookup_type == 'fob' and self.journal.pending_count():
+                return self.offline_fob(identifier)
+        resolved, self.resolved = self.resolved, None
+        if (resolved and resolved[:2] == (identifier, lookup_type) and resolved[2].get('is_active')
+                and time.monotonic() - resolved[3] < RESOLVE_REUSE_SECONDS):
+            return True, resolved[2]  # answered with the scan a moment ago
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/lookup',
-                auth=(KIOSK_USER, KIOSK_PASS),
+            if lookup_type in ('scan', 'fob'):
+                response = self.server_post('/api/scan/resolve', json={'id': identifier})
+                if response.status_code != 200:
+                    return False, response.json().get('error', 'Unknown error')
+                data = response.json()
+                if not data.get('found'):
+                    return False, None
+                if lookup_type == 'scan':
+                    self.resolved = (identifier, data['type'], data['data'], time.monotonic())
+                    return True, data['data']
+                if data['type'] == 'fob':
+                    if not data['data']['is_active']:
+                        return False, None
+                    self.fob_states.pop(data['data']['id'], None)  # the server is current again
+                    return True, data['data']
+                # A card shares this id and wins the scan; look the fob up by itself
+            response = self.server_post(
+                '/api/lookup',
                 json={
                     'type': lookup_type,
                     'id': identifier
-                },
-                timeout=5,
-                verify=False
+                }
             )
             if response.status_code == 200:
                 data = response.json()
                 if data.get('found'):
+                    if lookup_type == 'fob':
+                        self.fob_states.pop(data['data']['id'], None)  # the server is current again
                     return True, data.get('data')
                 else:
                     return False, None
@@ -470,6 +567,8 @@ class KioskGUI:
                 return False, error_msg
         except Exception as e:
             if self.is_network_error(e):
+                if lookup_type == 'fob' and self.directory.ready:
+                    return self.offline_fob(identifier)
                 self.show_offline_screen()
                 return False, 'OFFLINE'
             return False, str(e)
@@ -477,12 +576,9 @@ class KioskGUI:
     def search_users_api(self, search_text):
         """Search users via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/search/users',
-                auth=(KIOSK_USER, KIOSK_PASS),
-                json={'search': search_text},
-                timeout=5,
-                verify=False
+            response = self.server_post(
+                '/api/search/users',
+                json={'search': search_text}
             )
             if response.status_code == 200:
                 data = response.json()
@@ -499,12 +595,9 @@ class KioskGUI:
     def search_equipment_api(self, search_text):
         """Search equipment via API"""
         try:
-            response = requests.post(
-                f'{SERVER_URL}/api/search/equipment',
-                auth=(KIOSK_USER, KIOSK_PASS),
-                json={'search': search_text},
-                timeout=5,
-                verify=False
+            response = self.server_post(
+                '/api/search/equipment',
+                json={'search': search_text}
             )
             if response.status_code == 200:
                 data = response.json()
@@ -521,15 +614,19 @@ class KioskGUI:
     def list_equipment_api(self):
         """List all equipment via API"""
         try:
-            response = requests.get(
-                f'{SERVER_URL}/api/list/equipment',
-                auth=(KIOSK_USER, KIOSK_PASS),
-                timeout=5,
-                verify=False
+            headers = {'If-None-Match': self.equipment_cache[0]} if self.equipment_cache else {}
+            response = self.server_get(
+                '/api/list/equipment',
+                headers=headers
             )
+            if response.status_code == 304:
+                return True, list(self.equipment_cache[1])
             if response.status_code == 200:
                 data = response.json()
-                return True, data.get('equipment', [])
+                equipment = data.get('equipment', [])
+                if response.headers.get('ETag'):
+                    self.equipment_cache = (response.headers['ETag'], equipment)
+                return True, equipment
             else:
                 error_msg = response.json().get('error', 'Unknown error')
                 return False, error_msg
@@ -2005,10 +2102,22 @@ class KioskGUI:
             self.scan_buffer = ""
             
             if scan_data:
-                self.process_scan(scan_data)
+                self.scan_queue.append(scan_data)
+                self.process_scans()
         elif event.char.isprintable():
             # Add to buffer
             self.scan_buffer += event.char
+
+    def process_scans(self):
+        """Handle queued scans in order, unless a scan or server call is already in progress"""
+        if self.processing_scan or self.executor.in_flight:
+            return  # picked up again when it finishes
+        self.processing_scan = True
+        try:
+            while self.scan_queue:
+                self.process_scan(self.scan_queue.popleft())
+        finally:
+            self.processing_scan = False
     def process_scan(self, scan_data):
         """Process a scanned card or fob"""
         # Check if we're in replace mode - bypass lookup for new card/fob
@@ -2904,7 +3013,9 @@ class KioskGUI:
 
     def check_timeout_loop(self):
         """Check for session timeout"""
-        if (self.current_user or self.replace_mode or self.note_mode or self.pending_fob) and self.last_scan_time:
+        if self.executor.in_flight:
+            pass  # don't time a session out from under a request in progress
+        elif (self.current_user or self.replace_mode or self.note_mode or self.pending_fob) and self.last_scan_time:
             elapsed = (datetime.now() - self.last_scan_time).total_seconds()
             if elapsed > self.scan_timeout:
                 self.show_error("Session timeout")
@@ -2914,6 +3025,9 @@ class KioskGUI:
                 self.replace_item = None
                 self.last_scan_time = None
                 self.note_mode = False
+
+        if not self.executor.in_flight:
+            self.update_sync_label()
       
         # Check again in 1 second
         self.root.after(1000, self.check_timeout_loop)
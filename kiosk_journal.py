@@ -0,0 +1,132 @@
+"""Durable offline journal for kiosk operations.
+
+When the server can't be reached, checkouts, checkins, Barns transfers and
+unavailable marks are written to a local SQLite journal instead of being
+refused. Each entry gets an idempotency key and the kiosk's clock time.
+JournalReplayer sends the journal to /api/journal/replay in order once the
+server answers again, and records what the server made of each entry:
+applied, duplicate (already in that state), conflict (someone else changed
+the fob in the meantime) or rejected.
+"""
+import json
+import sqlite3
+import threading
+import uuid
+
+import requests
+
+from temporal import local_now
+
+# Entries sent per replay request
+REPLAY_BATCH = 50
+
+
+class OfflineJournal:
+    """Append-only queue of kiosk operations waiting for the server"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.execute('PRAGMA synchronous = FULL')  # an entry must survive a power cut
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS journal (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op_key TEXT UNIQUE NOT NULL,
+                    op TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    occurred_at TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    message TEXT,
+                    replayed_at TEXT
+                )
+            ''')
+
+    def append(self, op, payload):
+        """Journal an operation; returns its idempotency key"""
+        key = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute('INSERT INTO journal (op_key, op, payload, occurred_at) VALUES (?, ?, ?, ?)',
+                               (key, op, json.dumps(payload), local_now().isoformat()))
+        return key
+
+    def pending(self, limit=REPLAY_BATCH):
+        """Oldest entries not yet accepted by the server, in journal order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT op_key, op, payload, occurred_at FROM journal WHERE status = 'pending' ORDER BY seq LIMIT ?",
+                (limit,)).fetchall()
+        return [{'key': row['op_key'], 'op': row['op'], 'payload': json.loads(row['payload']),
+                 'occurred_at': row['occurred_at']} for row in rows]
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal WHERE status = 'pending'").fetchone()[0]
+
+    def record(self, results):
+        """Store the server's result for each replayed entry"""
+        now = local_now().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany('UPDATE journal SET status = ?, message = ?, replayed_at = ? WHERE op_key = ?',
+                                   [(r['status'], r['message'], now, r['key']) for r in results])
+
+    def problems(self, limit=20):
+        """Most recent entries the server did not apply cleanly"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT op, payload, occurred_at, status, message FROM journal
+                WHERE status IN ('conflict', 'rejected') OR (status = 'applied' AND message IS NOT NULL)
+                ORDER BY seq DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+
+class JournalReplayer:
+    """Background thread that drains the journal whenever the server answers"""
+
+    def __init__(self, journal, transport, kiosk_id, interval=5):
+        self.journal = journal
+        self.transport = transport
+        self.kiosk_id = kiosk_id
+        self.interval = interval
+        self._wake = threading.Event()
+        self.stats = {'replays': 0, 'applied': 0, 'duplicate': 0, 'conflict': 0, 'rejected': 0}
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def wake(self):
+        """Try a replay now instead of at the next interval"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.replay()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                pass  # still offline; try again next interval
+            except Exception as e:
+                # Includes HTTP errors: the server is up but refused the batch, so say so rather than retry silently
+                print(f"Journal replay error: {e}")
+
+    def replay(self):
+        """Send pending entries in order until the journal is empty; returns how many were sent"""
+        sent = 0
+        while True:
+            ops = self.journal.pending()
+            if not ops:
+                return sent
+            response = self.transport.post('/api/journal/replay', json={'kiosk_id': self.kiosk_id, 'ops': ops})
+            response.raise_for_status()
+            results = response.json()['results']
+            self.journal.record(results)
+            self.stats['replays'] += 1
+            for result in results:
+                self.stats[result['status']] = self.stats.get(result['status'], 0) + 1
+                if result['status'] != 'applied' or result['message']:
+                    print(f"Offline {result['status']}: {result['message']}")
+            sent += len(results)
@@ -0,0 +1,145 @@
+"""Pooled HTTP transport for the kiosk's calls to the server.
+
+Every kiosk API method used to call requests.post/get directly, paying a
+new TCP (and TLS) handshake per call. KioskTransport keeps one Session
+with a keep-alive connection pool, applies per-endpoint timeouts, retries
+calls that are safe to repeat with jittered exponential backoff, and keeps
+a latency histogram per endpoint that can be dumped while the kiosk runs.
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds to wait for each endpoint; anything not listed gets DEFAULT_TIMEOUT
+DEFAULT_TIMEOUT = 5
+ENDPOINT_TIMEOUTS = {
+    '/api/notify': 1,
+    '/api/status': 1,
+    '/api/bulk_checkout': 10,
+    '/api/directory': 10,
+    '/api/journal/replay': 10,
+}
+
+# POSTs that change nothing (or are keyed for replay) and may be retried like GETs
+IDEMPOTENT_POSTS = {'/api/lookup', '/api/search/users', '/api/search/equipment', '/api/journal/replay'}
+
+# Extra attempts for idempotent calls, and the first backoff in seconds (doubled per attempt)
+RETRIES = 2
+BACKOFF = 0.1
+RETRY_STATUSES = {502, 503, 504}
+
+# Upper bounds (ms) of the latency histogram buckets; slower calls land in the last, open bucket
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class KioskTransport:
+    """One keep-alive session for all kiosk requests, with retries and latency stats"""
+
+    def __init__(self, server_url, auth, verify=False, pool_size=4, retries=RETRIES, backoff=BACKOFF,
+                 sleep=time.sleep):
+        self.server_url = server_url.rstrip('/')
+        self.auth = auth
+        self.verify = verify
+        self.retries = retries
+        self.backoff = backoff
+        self._sleep = sleep
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._latency = {}  # path -> histogram and counters
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def request(self, method, path, **kwargs):
+        """Send a request to `path` on the server; raises requests exceptions like requests.request"""
+        kwargs.setdefault('timeout', ENDPOINT_TIMEOUTS.get(path, DEFAULT_TIMEOUT))
+        kwargs.setdefault('verify', self.verify)  # per call: Session.verify loses to REQUESTS_CA_BUNDLE
+        retryable = method == 'GET' or path in IDEMPOTENT_POSTS
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, self.server_url + path, **kwargs)
+            except requests.exceptions.ConnectionError:
+                # Includes connect timeouts; a read timeout is not retried, the
+                # server may still be working on it and the caller has waited enough
+                self._observe(path, start, error=True)
+                if not retryable or attempt >= self.retries:
+                    raise
+            except requests.exceptions.RequestException:
+                self._observe(path, start, error=True)
+                raise
+            else:
+                self._observe(path, start)
+                if not (retryable and response.status_code in RETRY_STATUSES and attempt < self.retries):
+                    return response
+            attempt += 1
+            with self._lock:
+                self._stats(path)['retries'] += 1
+            # Full jitter keeps kiosks that lost the server together from retrying in step
+            self._sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _stats(self, path):
+        stats = self._latency.get(path)
+        if stats is None:
+            stats = self._latency[path] = {'count': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                           'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+        return stats
+
+    def _observe(self, path, start, error=False):
+        elapsed = (time.perf_counter() - start) * 1000
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed <= bound), len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            stats = self._stats(path)
+            stats['count'] += 1
+            stats['errors'] += error
+            stats['total_ms'] += elapsed
+            stats['max_ms'] = max(stats['max_ms'], elapsed)
+            stats['buckets'][bucket] += 1
+
+    def latency_report(self):
+        """Per-endpoint counts, average/max and bucket-estimated p50/p95 in ms"""
+        with self._lock:
+            snapshot = {path: dict(stats, buckets=list(stats['buckets'])) for path, stats in self._latency.items()}
+        report = {}
+        for path, stats in sorted(snapshot.items()):
+            labels = [f'<={bound}ms' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+            report[path] = {
+                'count': stats['count'],
+                'errors': stats['errors'],
+                'retries': stats['retries'],
+                'avg_ms': round(stats['total_ms'] / stats['count'], 1) if stats['count'] else None,
+                'max_ms': round(stats['max_ms'], 1),
+                'p50_ms': self._percentile(stats, 0.50),
+                'p95_ms': self._percentile(stats, 0.95),
+                'buckets': dict(zip(labels, stats['buckets'])),
+            }
+        return report
+
+    @staticmethod
+    def _percentile(stats, fraction):
+        """Upper bound of the bucket holding the given fraction of calls (the max for the open bucket)"""
+        if not stats['count']:
+            return None
+        seen = 0
+        for i, count in enumerate(stats['buckets']):
+            seen += count
+            if seen >= fraction * stats['count']:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else round(stats['max_ms'], 1)
+
+    def dump_latency(self):
+        """Print the latency report, one line per endpoint"""
+        print(f"{'endpoint':<28}{'calls':>7}{'errors':>8}{'retries':>9}{'avg':>9}{'p50':>8}{'p95':>8}{'max':>9}")
+        for path, stats in self.latency_report().items():
+            print(f"{path:<28}{stats['count']:>7}{stats['errors']:>8}{stats['retries']:>9}"
+                  f"{stats['avg_ms']:>9}{stats['p50_ms']:>8}{stats['p95_ms']:>8}{stats['max_ms']:>9}")
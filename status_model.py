@@ -0,0 +1,517 @@
+"""In-process model of the dashboard status board.
+
+The model loads every active fob, its open checkout, note and upcoming
+reservations from the database once, then keeps itself current by
+re-reading only the fobs a mutation touched. /api/status and the
+WebSocket broadcasts are served from memory instead of re-running the
+full fob/checkout/user join on every scan.
+"""
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+from database import natural_sort_key
+from temporal import local_now, parse_stored, format_local
+
+
+# Dashboard categories in display order, from the fob_categories registry
+CATEGORY_QUERY = 'SELECT name, payload_key, sort_mode FROM fob_categories ORDER BY position'
+
+FOB_QUERY = '''
+    SELECT
+        kf.id,
+        kf.fob_id,
+        kf.vehicle_name,
+        kf.category,
+        kf.location,
+        kf.is_available,
+        kf.sort_key,
+        u.first_name,
+        u.last_name,
+        c.checked_out_at,
+        c.id as checkout_id
+    FROM key_fobs kf
+    LEFT JOIN checkouts c ON kf.id = c.fob_id AND c.checked_in_at IS NULL
+    LEFT JOIN users u ON c.user_id = u.id
+    WHERE kf.is_active = 1
+'''
+
+# Reservations that have not finished yet; the display window is applied
+# in memory at read time so the board stays correct as time passes.
+RESERVATION_QUERY = '''
+    SELECT r.*, u.first_name, u.last_name, kf.id as fob_table_id
+    FROM reservations r
+    LEFT JOIN users u ON r.user_id = u.id
+    JOIN key_fobs kf ON r.fob_id = kf.id
+    WHERE (
+          r.reserved_ts > ?
+          OR r.end_ts > ?
+      )
+'''
+
+
+def _format_fob(row):
+    """Build the base dashboard row for a fob from the FOB_QUERY result"""
+    key = dict(row)
+    if key['sort_key'] is None:
+        # Fob written outside the app; sort_key is normally set on insert and edit
+        key['sort_key'] = natural_sort_key(key['vehicle_name'])
+    if key['checked_out_at']:
+        key['checked_out_at'] = format_local(key['checked_out_at'], '%b %d, %Y %H:%M')
+    return key
+
+
+def _format_note(row):
+    """Return (note dict, expiry) - notes with no usable expiry never expire"""
+    note = dict(row)
+    expires = None
+    if note.get('expires_at'):
+        try:
+            expires = datetime.fromisoformat(note['expires_at'])
+            if expires.tzinfo is None:
+                expires = None
+        except ValueError:
+            expires = None
+    return note, expires
+
+
+def _format_reservation(row):
+    """Return a reservation entry with its parsed window, or None if unparseable"""
+    start = parse_stored(row['reserved_datetime'])
+    if start is None:
+        return None
+    end = parse_stored(row['end_datetime']) if row['end_datetime'] else None
+    hours = row['display_hours_before'] or 0
+    res = dict(row)
+    return {
+        'start': start,
+        'end': end,
+        'display_from': start - timedelta(hours=hours) if hours else None,
+        'row': res,
+        # Card format and list format used by the dashboard
+        'card': dict(res,
+                     reserved_datetime=format_local(res['reserved_datetime'], '%b %d, %Y %H:%M', naive='keep'),
+                     end_datetime=format_local(res['end_datetime'], '%b %d, %Y %H:%M', naive='keep') if res['end_datetime'] else None),
+        'listing': dict(res,
+                        reserved_datetime=format_local(res['reserved_datetime'], '%a, %b %d at %I:%M %p', naive='keep')),
+    }
+
+
+def _is_visible(entry, now):
+    """Reservation is shown from display_hours_before its start until it ends"""
+    if not (entry['start'] > now or (entry['end'] is not None and entry['end'] > now)):
+        return False
+    return entry['display_from'] is None or entry['display_from'] <= now
+
+
+class StatusModel:
+    """Dashboard status kept in memory and updated one fob at a time"""
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._lock = threading.RLock()
+        self._fobs = {}          # key_fobs.id -> base row
+        self._notes = {}         # key_fobs.id -> (note, expires)
+        self._reservations = {}  # key_fobs.id -> reservation entries sorted by start
+        self._categories = []    # (category, payload key) in display order
+        self._modes = {}         # category -> sort mode
+        self._order = {}         # category -> sorted key_fobs.ids
+        self._dirty = set()      # categories whose order must be rebuilt
+        self._category_versions = {}  # category -> bumped whenever its rows change
+        self._stamps = {}        # category (None = whole board) -> (version, time it next changes on its own)
+        self.writes = 0          # bumped on every refresh, for ETags on data beyond the board
+        self._fob_writes = {}    # key_fobs.id -> writes when that fob was last refreshed
+        self._all_written = 0    # writes at the last full load or user rename (may touch any fob)
+        self._loaded = False
+        self.version = 0
+        self._emitted = 0        # version last sent to dashboards
+        self._pending = set()    # fobs changed since the last delta
+        self._reordered = set()  # categories whose order changed since the last delta
+        self._needs_full = False # a full reload happened; deltas can't describe it
+        self._timeline = []      # heap of (epoch seconds, key_fobs.id, generation) for time-driven changes
+        self._timeline_gen = {}  # key_fobs.id -> generation of its current timeline entries
+        self._timeline_live = {}  # key_fobs.id -> how many current-generation entries are still in the heap
+        self._live_total = 0
+        self.on_timeline = None  # called with the time of newly scheduled transitions
+        self.stats = {'full_loads': 0, 'fob_refreshes': 0, 'snapshots': 0,
+                      'consistency_checks': 0, 'consistency_repairs': 0, 'transitions': 0,
+                      'timeline_compactions': 0}
+
+    def _read(self, conn, fob_ids=None):
+        """Read fobs, notes and reservations, optionally limited to some fobs"""
+        now = int(local_now().timestamp())
+        fob_query, note_query, res_query = FOB_QUERY, 'SELECT * FROM notes', RESERVATION_QUERY
+        params = []
+        if fob_ids is not None:
+            placeholders = ','.join('?' * len(fob_ids))
+            fob_query += f' AND kf.id IN ({placeholders})'
+            note_query += f' WHERE fob_id IN ({placeholders})'
+            res_query += f' AND r.fob_id IN ({placeholders})'
+            params = list(fob_ids)
+
+        fobs = {row['id']: _format_fob(row) for row in conn.execute(fob_query, params)}
+        notes = {row['fob_id']: _format_note(row) for row in conn.execute(note_query, params)}
+        reservations = {}
+        for row in conn.execute(res_query, [now, now] + params):
+            entry = _format_reservation(row)
+            if entry:
+                reservations.setdefault(row['fob_table_id'], []).append(entry)
+        for entries in reservations.values():
+            entries.sort(key=lambda e: e['start'])
+        return fobs, notes, reservations
+
+    def load(self):
+        """Load the whole board from the database"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                categories = conn.execute(CATEGORY_QUERY).fetchall()
+                fobs, notes, reservations = self._read(conn)
+            finally:
+                conn.close()
+            self._categories = [(row['name'], row['payload_key']) for row in categories]
+            self._modes = {row['name']: row['sort_mode'] for row in categories}
+            self._fobs, self._notes, self._reservations = fobs, notes, reservations
+            self._order = {}
+            self._dirty = set(self._modes)
+            self._touch(self._modes)
+            self.writes += 1
+            self._all_written = self.writes
+            self._needs_full = self._loaded
+            self._loaded = True
+            self.version += 1
+            self.stats['full_loads'] += 1
+            self._rebuild_timeline()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def refresh_fobs(self, fob_ids):
+        """Re-read the given fobs after a mutation; returns the ids that changed"""
+        fob_ids = {int(f) for f in fob_ids if f is not None}
+        if not fob_ids:
+            return set()
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return fob_ids
+            conn = self._connect()
+            try:
+                fobs, notes, reservations = self._read(conn, fob_ids)
+            finally:
+                conn.close()
+
+            changed = set()
+            resorted = {}
+            touched = set()
+            for fid in fob_ids:
+                old = self._fobs.get(fid)
+                new = fobs.get(fid)
+                if old != new:
+                    for row in (old, new):
+                        if row and row['category'] in self._modes and row['category'] not in resorted:
+                            resorted[row['category']] = list(self._sorted_ids(row['category']))
+                    changed.add(fid)
+                if self._notes.get(fid) != notes.get(fid):
+                    changed.add(fid)
+                if self._entries_key(self._reservations.get(fid)) != self._entries_key(reservations.get(fid)):
+                    changed.add(fid)
+                if fid in changed:
+                    touched.update(row['category'] for row in (old, new) if row)
+                self._store(self._fobs, fid, new)
+                self._store(self._notes, fid, notes.get(fid))
+                self._store(self._reservations, fid, reservations.get(fid))
+            self._dirty.update(resorted)
+            self._touch(touched)
+            self.writes += 1
+            now = local_now()
+            for fid in fob_ids:
+                self._fob_writes[fid] = self.writes
+                self._schedule(fid, now)
+            for category, before in resorted.items():
+                if self._sorted_ids(category) != before:
+                    self._reordered.add(category)
+            if changed:
+                self.version += 1
+                self._pending.update(changed)
+            self.stats['fob_refreshes'] += len(fob_ids)
+        return changed
+
+    def refresh_users(self, user_ids):
+        """Re-read the fobs currently held by the given users (e.g. after a rename)"""
+        user_ids = [int(u) for u in user_ids if u is not None]
+        if not user_ids:
+            return set()
+        with self._lock:
+            # Past checkouts on any fob show the user's name
+            self.writes += 1
+            self._all_written = self.writes
+        conn = self._connect()
+        try:
+            placeholders = ','.join('?' * len(user_ids))
+            rows = conn.execute(f'''
+                SELECT fob_id FROM checkouts
+                WHERE checked_in_at IS NULL AND user_id IN ({placeholders})
+            ''', user_ids).fetchall()
+        finally:
+            conn.close()
+        return self.refresh_fobs(row['fob_id'] for row in rows)
+
+    def _touch(self, categories):
+        for category in set(categories):
+            self._category_versions[category] = self._category_versions.get(category, 0) + 1
+
+    def _transitions(self, fid, now):
+        """Future times the fob's row changes without a mutation: reservation display, start, end, note expiry"""
+        for entry in self._reservations.get(fid, ()):
+            for t in (entry['display_from'], entry['start'], entry['end']):
+                if t is not None and t > now:
+                    yield t
+        note = self._notes.get(fid)
+        if note and note[1] is not None and note[1] > now:
+            yield note[1]
+
+    def _next_change(self, fob_ids, now):
+        """Earliest future time one of the fobs' rows changes without a mutation, or None"""
+        return min((t for fid in fob_ids for t in self._transitions(fid, now)), default=None)
+
+    def _schedule(self, fid, now):
+        """Replace the fob's timeline entries with its upcoming transitions"""
+        generation = self._timeline_gen.get(fid, 0) + 1
+        self._timeline_gen[fid] = generation
+        times = [t.timestamp() for t in self._transitions(fid, now)]
+        for t in times:
+            heapq.heappush(self._timeline, (t, fid, generation))
+        self._live_total += len(times) - self._timeline_live.get(fid, 0)
+        self._timeline_live[fid] = len(times)
+        # Superseded entries stay in the heap until they surface; a fob with
+        # something weeks ahead would add a set on every write, so drop them
+        # once they outnumber the live ones
+        if len(self._timeline) > 2 * self._live_total + 64:
+            self._timeline = [e for e in self._timeline if e[2] == self._timeline_gen.get(e[1])]
+            heapq.heapify(self._timeline)
+            self.stats['timeline_compactions'] += 1
+        if times and self.on_timeline:
+            self.on_timeline(min(times))
+
+    def _rebuild_timeline(self):
+        now = local_now()
+        self._timeline = []
+        self._timeline_gen = {}
+        self._timeline_live = {}
+        self._live_total = 0
+        for fid in set(self._reservations) | set(self._notes):
+            self._schedule(fid, now)
+
+    def next_transition(self):
+        """Epoch seconds of the next time-driven change on the board, or None"""
+        with self._lock:
+            self._ensure_loaded()
+            timeline = self._timeline
+            while timeline and timeline[0][2] != self._timeline_gen.get(timeline[0][1]):
+                heapq.heappop(timeline)  # superseded by a later refresh of that fob
+            return timeline[0][0] if timeline else None
+
+    def advance(self):
+        """Apply every transition that is due: the fobs go into the next delta.
+
+        Returns the fobs whose rows changed. Finished reservations are dropped
+        from memory on the way.
+        """
+        now = local_now()
+        now_ts = now.timestamp()
+        with self._lock:
+            self._ensure_loaded()
+            timeline = self._timeline
+            fired = set()
+            while timeline and timeline[0][0] <= now_ts:
+                t, fid, generation = heapq.heappop(timeline)
+                if generation == self._timeline_gen.get(fid):
+                    fired.add(fid)
+                    self._timeline_live[fid] -= 1
+                    self._live_total -= 1
+            fired &= set(self._fobs)
+            for fid in fired:
+                entries = [e for e in self._reservations.get(fid, ())
+                           if e['start'] > now or (e['end'] is not None and e['end'] > now)]
+                self._store(self._reservations, fid, entries)
+            if fired:
+                self._touch(self._fobs[fid]['category'] for fid in fired)
+                self._pending.update(fired)
+                self.version += 1
+                self.stats['transitions'] += len(fired)
+            return fired
+
+    def categories(self):
+        """(category, payload key) pairs in display order"""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._categories)
+
+    def category_stamp(self, category):
+        """Value that changes whenever the category's rendered rows would.
+
+        That is a mutation touching the category, or time reaching the next
+        reservation display window, start or end, or note expiry in it.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self._stamp(category, self._category_versions.get(category, 0),
+                               lambda: self._sorted_ids(category))
+
+    def status_stamp(self):
+        """Like category_stamp() for the whole snapshot() payload"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._stamp(None, self.version, lambda: set(self._reservations) | set(self._notes))
+
+    def fob_stamp(self, fob_id):
+        """Counter that moves whenever anything shown for the fob may have changed"""
+        with self._lock:
+            return max(self._fob_writes.get(fob_id, 0), self._all_written)
+
+    def _stamp(self, key, version, fob_ids):
+        now = local_now()
+        stamp = self._stamps.get(key)
+        if stamp is None or stamp[0] != version or (stamp[1] is not None and stamp[1] <= now):
+            stamp = (version, self._next_change(fob_ids(), now))
+            self._stamps[key] = stamp
+        return stamp
+
+    def category_rows(self, category):
+        """(stamp, rendered rows) for one category, read together"""
+        with self._lock:
+            stamp = self.category_stamp(category)
+            now = local_now()
+            return stamp, [self._render(fid, now) for fid in self._sorted_ids(category)]
+
+    @staticmethod
+    def _store(mapping, key, value):
+        if value:
+            mapping[key] = value
+        else:
+            mapping.pop(key, None)
+
+    @staticmethod
+    def _entries_key(entries):
+        return [e['row'] for e in entries or []]
+
+    def _prune(self, now):
+        """Drop reservations that have finished; they can never be shown again"""
+        for fid in list(self._reservations):
+            entries = [e for e in self._reservations[fid]
+                       if e['start'] > now or (e['end'] is not None and e['end'] > now)]
+            self._store(self._reservations, fid, entries)
+
+    def _regroup(self):
+        """Rebuild the order of every dirty category in one pass over the fobs"""
+        groups = {category: [] for category in self._dirty}
+        for fid, row in self._fobs.items():
+            ids = groups.get(row['category'])
+            if ids is not None:
+                ids.append(fid)
+        fobs = self._fobs
+        for category, ids in groups.items():
+            if self._modes[category] == 'status':
+                ids.sort(key=lambda fid: (fobs[fid]['checkout_id'] is None, fobs[fid]['sort_key']))
+            else:
+                ids.sort(key=lambda fid: fobs[fid]['sort_key'])
+            self._order[category] = ids
+        self._dirty.clear()
+
+    def _sorted_ids(self, category):
+        if self._dirty:
+            self._regroup()
+        return self._order[category]
+
+    def _render(self, fid, now):
+        """Dashboard row for one fob with its visible note and reservation"""
+        key = dict(self._fobs[fid])
+        del key['sort_key']
+        key['reservation'] = None
+        for entry in self._reservations.get(fid, ()):
+            if _is_visible(entry, now):
+                key['reservation'] = entry['card']
+                break
+        note = self._notes.get(fid)
+        key['note'] = note[0] if note and (note[1] is None or note[1] > now) else None
+        return key
+
+    def _active_reservations(self, now):
+        visible = [entry for entries in self._reservations.values()
+                   for entry in entries if _is_visible(entry, now)]
+        visible.sort(key=lambda e: e['row']['reserved_datetime'])
+        return [entry['listing'] for entry in visible]
+
+    def snapshot(self):
+        """Full status payload for /api/status and status_update broadcasts"""
+        now = local_now()
+        with self._lock:
+            self._ensure_loaded()
+            status = {}
+            for category, payload_key in self._categories:
+                status[payload_key] = [self._render(fid, now) for fid in self._sorted_ids(category)]
+            status['active_reservations'] = self._active_reservations(now)
+            status['seq'] = self.version
+            self.stats['snapshots'] += 1
+            return status
+
+    def take_delta(self):
+        """Changes since the last delta as a fob_changed payload.
+
+        Returns None when a full reload happened and clients need a fresh
+        snapshot instead. Dashboards apply a delta when its base is at or
+        below the seq they hold and ask for a resync when there is a gap.
+        """
+        now = local_now()
+        with self._lock:
+            if self._needs_full:
+                delta = None
+            else:
+                delta = {
+                    'base': self._emitted,
+                    'seq': self.version,
+                    'fobs': [self._render(fid, now) for fid in sorted(self._pending)
+                             if fid in self._fobs and self._fobs[fid]['category'] in self._modes],
+                    'removed': sorted(fid for fid in self._pending
+                                      if fid not in self._fobs or self._fobs[fid]['category'] not in self._modes),
+                    'order': {category: self._sorted_ids(category) for category in sorted(self._reordered)},
+                }
+            self._emitted = self.version
+            self._pending.clear()
+            self._reordered.clear()
+            self._needs_full = False
+            return delta
+
+    def check_consistency(self, repair=True):
+        """Compare the in-memory board with a fresh read; returns mismatched fob ids"""
+        with self._lock:
+            self._ensure_loaded()
+            self._prune(local_now())
+            conn = self._connect()
+            try:
+                fobs, notes, reservations = self._read(conn)
+            finally:
+                conn.close()
+            ids = set(fobs) | set(self._fobs) | set(notes) | set(self._notes) \
+                | set(reservations) | set(self._reservations)
+            mismatched = sorted(
+                fid for fid in ids
+                if fobs.get(fid) != self._fobs.get(fid)
+                or notes.get(fid) != self._notes.get(fid)
+                or self._entries_key(reservations.get(fid)) != self._entries_key(self._reservations.get(fid))
+            )
+            self.stats['consistency_checks'] += 1
+            if mismatched and repair:
+                self._fobs, self._notes, self._reservations = fobs, notes, reservations
+                self._order = {}
+                self._dirty = set(self._modes)
+                self._touch(self._modes)
+                self.version += 1
+                self.writes += 1
+                self._all_written = self.writes
+                self._needs_full = True
+                self.stats['consistency_repairs'] += 1
+                self._rebuild_timeline()
+            return mismatched
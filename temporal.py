@@ -0,0 +1,101 @@
+"""Local time and stored-timestamp formatting.
+
+All local times are America/Chicago. Timestamps are stored as ISO text in
+two shapes: naive UTC from SQLite's CURRENT_TIMESTAMP and Chicago-offset
+values written by the app. Renderings are memoized per (value, format)
+because the board and admin pages show the same timestamps again and
+again; one-pass exports parse with parse_timestamp and render_local
+instead, which share one strftime per local hour.
+
+`naive` says how an offset-less value is read: 'utc' converts it to local
+time like SQLite's datetime() does; 'keep' formats it as stored.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+LOCAL_TZ = ZoneInfo('America/Chicago')
+
+# Distinct (value, format) renderings kept in memory
+TIME_CACHE_SIZE = int(os.environ.get('TIME_CACHE_SIZE', '65536'))
+
+
+def local_now():
+    return datetime.now(LOCAL_TZ)
+
+
+def localize(naive):
+    """Attach Chicago time to a naive wall-clock datetime (form input, date filters)"""
+    return naive.replace(tzinfo=LOCAL_TZ)
+
+
+def local_day_start_ts(date_str, days=0):
+    """Epoch seconds at Chicago midnight of a YYYY-MM-DD date (plus `days`), for the *_ts range filters"""
+    return int(localize(datetime.strptime(date_str, '%Y-%m-%d') + timedelta(days=days)).timestamp())
+
+
+def parse_timestamp(value, naive='utc'):
+    """Datetime for a stored timestamp, or None if it isn't one.
+
+    Aware values keep their stored offset so differences and comparisons
+    are exact across DST changes; naive ones are read as UTC or left naive
+    according to `naive`.
+    """
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None and naive == 'utc':
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def parse_stored(value, naive='utc'):
+    """parse_timestamp, memoized for values the board reads on every reload"""
+    return parse_timestamp(value, naive)
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def _hour_template(wall_hour, fmt):
+    """`fmt` rendered for a wall-clock hour, with the minute and second left as placeholders"""
+    return wall_hour.strftime(fmt.replace('%M', '\x01M').replace('%S', '\x01S'))
+
+
+def render_local(dt, fmt):
+    """strftime `fmt` for a parsed datetime, in local time if it is aware"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(LOCAL_TZ)
+    if '%z' in fmt or '%Z' in fmt or '%f' in fmt:
+        return dt.strftime(fmt)
+    # Chicago offsets are whole hours, so every timestamp in a local hour
+    # shares one strftime call and only the minute and second differ
+    text = _hour_template(datetime(dt.year, dt.month, dt.day, dt.hour), fmt)
+    return text.replace('\x01M', '%02d' % dt.minute).replace('\x01S', '%02d' % dt.second)
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def format_local(value, fmt, naive='utc'):
+    """Stored timestamp rendered with strftime `fmt`; unparseable values come back unchanged"""
+    dt = parse_timestamp(value, naive)
+    return value if dt is None else render_local(dt, fmt)
+
+
+def format_rows(rows, formats, naive='utc'):
+    """Rows as dicts with each field in `formats` ({field: fmt}) rendered in local time"""
+    fields = list(formats.items())
+    result = []
+    for row in rows:
+        row = dict(row)
+        for field, fmt in fields:
+            if row[field]:
+                row[field] = format_local(row[field], fmt, naive)
+        result.append(row)
+    return result
+
+
+def cache_stats():
+    """lru_cache counters for the parse, format and hour-template caches"""
+    return {name: func.cache_info()._asdict()
+            for name, func in (('parse', parse_stored), ('format', format_local), ('hour', _hour_template))}